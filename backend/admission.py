@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from database import WORKER_THREADS, max_connections
+from execution_scheduler import SCHEDULER_MAX_CONCURRENT, SCHEDULER_MAX_QUEUE
+from instrumentation import admission_queue_wait
+
+logger = logging.getLogger(__name__)
+
+# Admission control configuration from environment variables
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_TARGET = float(os.environ.get("ADMISSION_TARGET_MS", "20")) / 1000  # queue wait allowed while overloaded
+ADMISSION_INTERVAL = float(os.environ.get("ADMISSION_INTERVAL_MS", "500")) / 1000  # queue must drain this often to count as healthy
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", "10"))  # seconds a request of a class that is never shed may queue
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "64"))  # waiting requests per route class
+
+# Default budgets. Critical, standard and telemetry requests hold a database connection while they run, so
+# they split the connection pool between them; evaluations give theirs back while queued and running in the
+# execution scheduler, so they get its capacity, out of the worker threads the other classes leave free
+_CONNECTIONS = max_connections()
+_CRITICAL_BUDGET = max(1, _CONNECTIONS // 2)
+_STANDARD_BUDGET = max(1, _CONNECTIONS // 3)
+_TELEMETRY_BUDGET = max(1, _CONNECTIONS - _CRITICAL_BUDGET - _STANDARD_BUDGET)
+_EVALUATION_BUDGET = max(1, min(SCHEDULER_MAX_CONCURRENT + SCHEDULER_MAX_QUEUE, WORKER_THREADS - _CONNECTIONS))
+
+# Route classes, highest priority first: (name, concurrent requests, shed under pressure, status when rejected)
+ROUTE_CLASSES = (
+    ("critical", int(os.environ.get("ADMISSION_CRITICAL_CONCURRENCY", str(_CRITICAL_BUDGET))), False, 503),
+    ("evaluation", int(os.environ.get("ADMISSION_EVALUATION_CONCURRENCY", str(_EVALUATION_BUDGET))), False, 503),
+    ("standard", int(os.environ.get("ADMISSION_STANDARD_CONCURRENCY", str(_STANDARD_BUDGET))), True, 503),
+    ("telemetry", int(os.environ.get("ADMISSION_TELEMETRY_CONCURRENCY", str(_TELEMETRY_BUDGET))), True, 429),
+)
+
+# First match wins; (route class, method or None for any, path pattern). Unmatched routes are "standard".
+ROUTE_RULES = (
+    ("exempt", "GET", r"/(health|metrics(/spans)?|admission/status)?"),
+    ("telemetry", "POST", r"/analyze-emotion(/.*)?"),
+    ("telemetry", "POST", r"/sessions/[^/]+/emotions/?"),
+    ("telemetry", "POST", r"/user-state/?"),
+    ("evaluation", "POST", r"/questions/[^/]+/(test|batch-test)"),
+    ("evaluation", "POST", r"/judge0/execute"),
+    ("critical", None, r"/sessions/[^/]+/questions/[^/]+(/autosave)?"),
+    ("critical", "POST", r"/sessions/[^/]+/questions/?"),
+)
+COMPILED_RULES = [(name, method, re.compile(pattern)) for name, method, pattern in ROUTE_RULES]
+
+
+class AdmissionRejected(Exception):
+    """A request was shed or timed out waiting for its route class budget."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RouteBudget:
+    """
+    Concurrency budget of one route class, with a CoDel-style queue.
+
+    Requests over the budget wait in FIFO order. The queue counts as
+    overloaded when it has not drained within ADMISSION_INTERVAL; from then
+    on, a sheddable class lets requests wait at most ADMISSION_TARGET and
+    sheds the rest at dequeue, so a standing queue cannot build up however
+    long the flood lasts. Classes that are never shed wait up to
+    ADMISSION_MAX_WAIT.
+    """
+
+    def __init__(self, name: str, limit: int, sheddable: bool, status_code: int, max_queue: int = ADMISSION_QUEUE_SIZE):
+        self.name = name
+        self.limit = max(1, limit)
+        self.sheddable = sheddable
+        self.status_code = status_code
+        self.max_queue = max_queue
+        self._active = 0
+        # (future resolved on admission, time enqueued, expiry timer)
+        self._waiters: Deque[Tuple[asyncio.Future, float, asyncio.TimerHandle]] = deque()
+        self._last_empty = time.monotonic()
+        self._service_time = 0.1  # moving average of seconds per request, for Retry-After estimates
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "timeouts": 0}
+
+    def overloaded(self, now: float) -> bool:
+        """CoDel's signal: requests have been queueing without a break for a whole interval."""
+        return bool(self._waiters) and now - self._last_empty > ADMISSION_INTERVAL
+
+    def _max_wait(self, now: float) -> float:
+        if not self.sheddable:
+            return ADMISSION_MAX_WAIT
+        return ADMISSION_TARGET if self.overloaded(now) else ADMISSION_INTERVAL
+
+    def _rejection(self, message: str) -> AdmissionRejected:
+        retry_after = max(1, math.ceil(self._service_time * (len(self._waiters) + 1) / self.limit))
+        return AdmissionRejected(message, self.status_code, retry_after)
+
+    async def acquire(self, pressure: bool = False):
+        """
+        Wait for a slot in the budget.
+
+        pressure means a higher-priority class is overloaded; a sheddable
+        class then rejects whatever does not fit without queueing it.
+
+        Raises:
+            AdmissionRejected: when the request is shed or waits too long
+        """
+        now = time.monotonic()
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._last_empty = now
+            self.stats["admitted"] += 1
+            admission_queue_wait.observe(0.0, self.name)
+            return
+        if len(self._waiters) >= self.max_queue or (self.sheddable and pressure):
+            self.stats["shed"] += 1
+            raise self._rejection(f"Too many {self.name} requests")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (future, now, loop.call_later(self._max_wait(now), self._expire, future))
+        if not self._waiters:
+            self._last_empty = now  # the queue was empty until this request
+        self._waiters.append(entry)
+        self.stats["queued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The client went away; give back a slot granted in the meantime
+            entry[2].cancel()
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            elif future.done() and not future.cancelled() and future.exception() is None:
+                self.release(0.0)
+            raise
+
+    def _expire(self, future: asyncio.Future):
+        for entry in self._waiters:
+            if entry[0] is future:
+                self._waiters.remove(entry)
+                break
+        if not self._waiters:
+            self._last_empty = time.monotonic()
+        if not future.done():
+            self.stats["timeouts"] += 1
+            future.set_exception(self._rejection(f"Timed out waiting for a {self.name} slot"))
+
+    def release(self, elapsed: float):
+        """Return a slot and admit queued requests, shedding those that waited past the current limit."""
+        self._active -= 1
+        self._service_time += 0.2 * (elapsed - self._service_time)
+        now = time.monotonic()
+        while self._waiters and self._active < self.limit:
+            future, enqueued, timer = self._waiters.popleft()
+            timer.cancel()
+            if future.done():
+                continue
+            sojourn = now - enqueued
+            if sojourn > self._max_wait(now):
+                self.stats["shed"] += 1
+                future.set_exception(self._rejection(f"Too many {self.name} requests"))
+                continue
+            self._active += 1
+            self.stats["admitted"] += 1
+            admission_queue_wait.observe(sojourn, self.name)
+            future.set_result(None)
+        if not self._waiters:
+            self._last_empty = now
+
+    def status(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "sheddable": self.sheddable,
+            "overloaded": self.overloaded(time.monotonic()),
+            **self.stats,
+        }
+
+
+class AdmissionController:
+    """Route class budgets of one worker process; a class is under pressure while any higher one is overloaded."""
+
+    def __init__(self, enabled: bool = ADMISSION_ENABLED):
+        self.enabled = enabled
+        self.budgets: List[RouteBudget] = [
+            RouteBudget(name, limit, sheddable, status_code) for name, limit, sheddable, status_code in ROUTE_CLASSES
+        ]
+        self._by_name = {budget.name: budget for budget in self.budgets}
+
+    def classify(self, method: str, path: str) -> str:
+        for name, rule_method, pattern in COMPILED_RULES:
+            if (rule_method is None or rule_method == method) and pattern.fullmatch(path):
+                return name
+        return "standard"
+
+    def budget_for(self, method: str, path: str) -> Optional[RouteBudget]:
+        return self._by_name.get(self.classify(method, path))
+
+    async def admit(self, budget: RouteBudget):
+        now = time.monotonic()
+        pressure = False
+        for other in self.budgets:
+            if other is budget:
+                break
+            if other.overloaded(now):
+                pressure = True
+                break
+        await budget.acquire(pressure)
+
+    def status(self) -> Dict:
+        return {"enabled": self.enabled, "classes": {budget.name: budget.status() for budget in self.budgets}}
+
+
+async def _send_rejection(send, error: AdmissionRejected):
+    body = json.dumps({"detail": str(error)}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": error.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware holding each HTTP request to its route class budget.
+
+    Requests are classified by method and path before routing. Telemetry
+    (emotion frames, user state) is shed first with 429, standard routes with
+    503, while evaluation and session question writes only queue. Add it
+    inside CORSMiddleware so rejections carry CORS headers.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        budget = self.controller.budget_for(scope["method"], scope["path"])
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.admit(budget)
+        except AdmissionRejected as e:
+            await _send_rejection(send, e)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release(time.monotonic() - started)
+
+
+# Create a singleton instance
+admission_controller = AdmissionController()
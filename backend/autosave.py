@@ -0,0 +1,302 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, add_missing_columns
+from models import SessionQuestion
+from edit_timeline import edit_timeline
+
+logger = logging.getLogger(__name__)
+
+# Autosave configuration from environment variables
+AUTOSAVE_DEBOUNCE = float(os.environ.get("AUTOSAVE_DEBOUNCE", "2"))  # seconds without edits before a buffer is written
+AUTOSAVE_MAX_DELAY = float(os.environ.get("AUTOSAVE_MAX_DELAY", "30"))  # longest edits wait while typing continues
+AUTOSAVE_FLUSH_INTERVAL = float(os.environ.get("AUTOSAVE_FLUSH_INTERVAL", "1"))  # seconds between flusher checks
+AUTOSAVE_IDLE_EVICT = float(os.environ.get("AUTOSAVE_IDLE_EVICT", "600"))  # seconds before a clean buffer is dropped
+AUTOSAVE_MAX_CODE_SIZE = int(os.environ.get("AUTOSAVE_MAX_CODE_SIZE", "200000"))  # characters
+
+# (session id, question id), as in the session question routes
+BufferKey = Tuple[int, int]
+
+
+class AutosaveConflict(Exception):
+    """
+    Patches were made against a revision other than the server's current one.
+
+    lost_revision is set when acknowledged edits up to that revision were
+    never written because a concurrent update replaced the code first.
+    """
+
+    def __init__(self, revision: int, lost_revision: Optional[int] = None):
+        if lost_revision is not None:
+            message = (f"Unsaved edits up to revision {lost_revision} were lost to a concurrent update; "
+                       f"code is at revision {revision}, fetch it and reapply the edits")
+        else:
+            message = f"Code is at revision {revision}; fetch it and reapply the edits"
+        super().__init__(message)
+        self.revision = revision
+        self.lost_revision = lost_revision
+
+
+def ensure_autosave_columns():
+    """Add the code revision column to session question tables created before autosave."""
+    add_missing_columns((SessionQuestion.code_revision,))
+
+
+def apply_patches(code: str, patches: Iterable) -> str:
+    """
+    Apply (start, end, text) replacements in order, each against the result of the previous one.
+
+    Raises:
+        ValueError: if a patch range falls outside the code
+    """
+    for patch in patches:
+        if not 0 <= patch.start <= patch.end <= len(code):
+            raise ValueError(f"Patch range [{patch.start}, {patch.end}) is outside the code (length {len(code)})")
+        code = code[:patch.start] + patch.text + code[patch.end:]
+    return code
+
+
+class CodeBuffer:
+    """The latest code of one session question, ahead of the database by any unflushed edits."""
+
+    __slots__ = ("session_question_id", "code", "language", "revision", "persisted_revision",
+                 "dirty_since", "last_edit", "evicted", "lock", "flush_lock")
+
+    def __init__(self, session_question_id: int, code: str, language: Optional[str], revision: int):
+        self.session_question_id = session_question_id
+        self.code = code
+        self.language = language
+        self.revision = revision
+        self.persisted_revision = revision
+        self.dirty_since: Optional[float] = None
+        self.last_edit = time.monotonic()
+        self.evicted = False  # dropped from AutosaveBuffers; patches must get the buffer again
+        self.lock = threading.Lock()
+        # Held for a whole flush so two flushes never race on the same expected revision
+        self.flush_lock = threading.Lock()
+
+    def state(self, include_code: bool = False) -> Dict:
+        with self.lock:
+            return {
+                "revision": self.revision,
+                "persisted_revision": self.persisted_revision,
+                "length": len(self.code),
+                "language": self.language,
+                "code": self.code if include_code else None,
+            }
+
+
+class AutosaveBuffers:
+    """
+    In-memory code buffers that coalesce autosave patches per session question.
+
+    Patches only touch memory. A background task writes a buffer once edits
+    pause for AUTOSAVE_DEBOUNCE seconds, or after AUTOSAVE_MAX_DELAY while
+    they continue, and submissions flush it first. Writes are conditional on
+    the revision last written, so a concurrent full update is detected
+    rather than overwritten; the edits that lost are reported to the next
+    patch of that session question.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[BufferKey, CodeBuffer] = {}
+        # Session question id -> (last revision whose edits were lost, monotonic time), until the next patch
+        self._lost: Dict[int, Tuple[int, float]] = {}
+        self._lost_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"patches": 0, "patched_chars": 0, "flushes": 0, "conflicts": 0}
+
+    def get(self, db: Session, session_id: int, question_id: int) -> Optional[CodeBuffer]:
+        """The buffer for a session question, loaded from the database on first use."""
+        key = (session_id, question_id)
+        with self._lock:
+            buffer = self._buffers.get(key)
+        if buffer is not None:
+            return buffer
+        row = db.query(
+            SessionQuestion.id, SessionQuestion.code_submitted, SessionQuestion.code_revision, SessionQuestion.language
+        ).filter(
+            SessionQuestion.session_id == session_id,
+            SessionQuestion.question_id == question_id
+        ).first()
+        if row is None:
+            return None
+        with self._lock:
+            # Another request may have loaded it meanwhile
+            return self._buffers.setdefault(key, CodeBuffer(row.id, row.code_submitted or "", row.language, row.code_revision or 0))
+
+    def _evict(self, key: BufferKey, buffer: CodeBuffer):
+        """Drop a buffer; called with self._lock and then buffer.lock held (self._lost_lock is taken last)."""
+        buffer.evicted = True
+        if self._buffers.get(key) is buffer:
+            del self._buffers[key]
+
+    def patch(self, buffer: CodeBuffer, base_revision: int, patches: list, language: Optional[str] = None) -> Optional[int]:
+        """
+        Apply patches made against base_revision; returns the new revision.
+
+        Returns None without applying anything when the buffer was evicted
+        after it was fetched; get it again and retry.
+
+        Raises:
+            AutosaveConflict: if base_revision is not the current revision, or
+                edits of this session question were lost since the last patch
+            ValueError: if a patch is out of range or the code grows past AUTOSAVE_MAX_CODE_SIZE
+        """
+        with buffer.lock:
+            if buffer.evicted:
+                return None
+            with self._lost_lock:
+                lost = self._lost.pop(buffer.session_question_id, None)
+            if lost is not None:
+                raise AutosaveConflict(buffer.revision, lost_revision=lost[0])
+            if base_revision != buffer.revision:
+                raise AutosaveConflict(buffer.revision)
+            code = apply_patches(buffer.code, patches)
+            if len(code) > AUTOSAVE_MAX_CODE_SIZE:
+                raise ValueError(f"Code exceeds {AUTOSAVE_MAX_CODE_SIZE} characters")
+            edit_timeline.record(buffer.session_question_id, buffer.code, patches, buffer.revision + 1)
+            buffer.code = code
+            buffer.revision += 1
+            if language:
+                buffer.language = language
+            now = time.monotonic()
+            buffer.last_edit = now
+            if buffer.dirty_since is None:
+                buffer.dirty_since = now
+            self.stats["patches"] += 1
+            self.stats["patched_chars"] += sum(len(p.text) for p in patches)
+            return buffer.revision
+
+    def discard(self, session_id: int, question_id: int) -> Optional[int]:
+        """Drop a buffer whose code is being replaced outright; returns its revision."""
+        key = (session_id, question_id)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                return None
+            with buffer.lock:
+                self._evict(key, buffer)
+                return buffer.revision
+
+    def _flush_buffer(self, db: Session, key: BufferKey, buffer: CodeBuffer) -> bool:
+        """Write a dirty buffer; returns False when the stored revision moved underneath it."""
+        with buffer.flush_lock:
+            with buffer.lock:
+                if buffer.dirty_since is None:
+                    return True
+                code, language, revision = buffer.code, buffer.language, buffer.revision
+                expected = buffer.persisted_revision
+            updated = db.query(SessionQuestion).filter(
+                SessionQuestion.id == buffer.session_question_id,
+                func.coalesce(SessionQuestion.code_revision, 0) == expected
+            ).update({
+                SessionQuestion.code_submitted: code,
+                SessionQuestion.code_revision: revision,
+                SessionQuestion.language: language,
+            }, synchronize_session=False)
+            db.commit()
+            if not updated:
+                # Replaced by a full update (or another worker); the next patch reloads and is told what was lost
+                with self._lock:
+                    with buffer.lock:
+                        lost_revision = buffer.revision
+                        with self._lost_lock:
+                            self._lost[buffer.session_question_id] = (lost_revision, time.monotonic())
+                        self._evict(key, buffer)
+                self.stats["conflicts"] += 1
+                logger.warning(f"Autosave for session question {buffer.session_question_id} lost a write conflict "
+                               f"at revision {lost_revision}; discarded its unsaved edits")
+                return False
+            with buffer.lock:
+                buffer.persisted_revision = revision
+                if buffer.revision == revision:
+                    buffer.dirty_since = None
+            self.stats["flushes"] += 1
+            try:
+                edit_timeline.persist(db, buffer.session_question_id)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error writing edit timeline for session question {buffer.session_question_id}: {str(e)}")
+            return True
+
+    def flush(self, db: Session, session_question_id: int) -> bool:
+        """Write a session question's pending edits now, e.g. before a submission is evaluated."""
+        with self._lock:
+            items = [(key, b) for key, b in self._buffers.items() if b.session_question_id == session_question_id]
+        return all(self._flush_buffer(db, key, buffer) for key, buffer in items)
+
+    def flush_due(self, force: bool = False) -> int:
+        """Write buffers whose debounce or maximum delay has passed (all dirty ones when force); returns the count."""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, buffer in list(self._buffers.items()):
+                if buffer.dirty_since is None:
+                    # Checked again under the buffer lock, as a patch may be landing on it right now
+                    with buffer.lock:
+                        idle = buffer.dirty_since is None and now - buffer.last_edit > AUTOSAVE_IDLE_EVICT
+                        if idle:
+                            self._evict(key, buffer)
+                    if idle:
+                        edit_timeline.close(buffer.session_question_id)
+                    continue
+                if force or now - buffer.last_edit >= AUTOSAVE_DEBOUNCE or now - buffer.dirty_since >= AUTOSAVE_MAX_DELAY:
+                    due.append((key, buffer))
+        with self._lost_lock:
+            for session_question_id, (_, lost_at) in list(self._lost.items()):
+                if now - lost_at > AUTOSAVE_IDLE_EVICT:
+                    del self._lost[session_question_id]
+        if not due:
+            return 0
+        db = SessionLocal()
+        try:
+            for key, buffer in due:
+                try:
+                    self._flush_buffer(db, key, buffer)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error flushing autosave for session question {buffer.session_question_id}: {str(e)}")
+        finally:
+            db.close()
+        return len(due)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(AUTOSAVE_FLUSH_INTERVAL)
+            try:
+                await run_in_threadpool(self.flush_due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Autosave flush failed: {str(e)}")
+
+    def start(self):
+        """Start the background flush task on the running event loop."""
+        if self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Cancel the background flush task and write every pending edit."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush_due, True)
+
+
+# Create a singleton instance
+autosave_buffers = AutosaveBuffers()
@@ -0,0 +1,89 @@
+"""
+Benchmark emotion model inference on CPU.
+
+Reports per-frame latency and throughput for each batch size, using either
+face crops from a directory of images or random crops of the right shape.
+
+Usage:
+    python -m benchmarks.bench_emotion_model --backend onnx --model models/emotion-ferplus-8.onnx
+    python -m benchmarks.bench_emotion_model --backend onnx --model models/emotion-ferplus-8.onnx --quantized
+    python -m benchmarks.bench_emotion_model --backend opencv --model models/emotion-ferplus-8.onnx --threads 2
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import statistics
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_model import load_emotion_model, EMOTION_MODEL_PATH
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_faces(faces_dir=None, count=256, size=96):
+    """Load grayscale face crops, or generate random crops when no directory is given."""
+    if faces_dir:
+        faces = []
+        for name in sorted(os.listdir(faces_dir)):
+            img = cv2.imread(os.path.join(faces_dir, name), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                faces.append(img)
+        return faces
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (size, size), dtype=np.uint8) for _ in range(count)]
+
+
+def bench_batch_size(model, faces, batch_size, rounds):
+    """Time model.predict over the corpus in batches, returning per-batch latencies in seconds."""
+    latencies = []
+    for _ in range(rounds):
+        for start in range(0, len(faces) - batch_size + 1, batch_size):
+            batch = faces[start:start + batch_size]
+            t0 = time.perf_counter()
+            model.predict(batch)
+            latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion model CPU inference benchmark")
+    parser.add_argument("--backend", default="onnx", choices=["demo", "onnx", "opencv"])
+    parser.add_argument("--model", default=EMOTION_MODEL_PATH, help="Path to the ONNX model")
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads")
+    parser.add_argument("--quantized", action="store_true", help="Use the int8-quantized model")
+    parser.add_argument("--faces", help="Directory of face crop images")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Comma-separated batch sizes")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the corpus per batch size")
+    args = parser.parse_args()
+
+    model = load_emotion_model(args.backend, args.model, args.threads, args.quantized)
+    if model.name != args.backend:
+        logger.error(f"Could not load the {args.backend} backend")
+        sys.exit(1)
+
+    faces = load_faces(args.faces)
+    logger.info(f"Backend: {model.name}, threads: {args.threads}, quantized: {args.quantized}, faces: {len(faces)}")
+
+    # Warm up so one-time graph initialisation is not measured
+    model.predict(faces[:1])
+
+    logger.info(f"{'batch':>6} {'p50 ms/frame':>14} {'p99 ms/frame':>14} {'frames/sec':>12}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        if batch_size > len(faces):
+            continue
+        latencies = sorted(bench_batch_size(model, faces, batch_size, args.rounds))
+        per_frame = [l / batch_size * 1000 for l in latencies]
+        p99 = per_frame[min(int(len(per_frame) * 0.99), len(per_frame) - 1)]
+        throughput = batch_size * len(latencies) / sum(latencies)
+        logger.info(f"{batch_size:>6} {statistics.median(per_frame):>14.3f} {p99:>14.3f} {throughput:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
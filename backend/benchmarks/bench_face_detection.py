@@ -0,0 +1,111 @@
+"""
+Benchmark the face detection fast path against the original full-frame scan.
+
+Frames are read from a directory of images or a recorded video, in order, so
+that consecutive frames behave like a live webcam stream.
+
+Usage:
+    python -m benchmarks.bench_face_detection --frames path/to/frames/
+    python -m benchmarks.bench_face_detection --video path/to/recording.mp4
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_detection import FaceDetector
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_frames(frames_dir=None, video_path=None, limit=None):
+    """Load the frame corpus as grayscale images."""
+    frames = []
+    if frames_dir:
+        names = sorted(n for n in os.listdir(frames_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            img = cv2.imread(os.path.join(frames_dir, name), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                frames.append(img)
+            if limit and len(frames) >= limit:
+                break
+    elif video_path:
+        capture = cv2.VideoCapture(video_path)
+        while True:
+            ok, img = capture.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+            if limit and len(frames) >= limit:
+                break
+        capture.release()
+    return frames
+
+
+def run_baseline(frames):
+    """The original pipeline: full-resolution scan with a fine scale step."""
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    detected = 0
+    start = time.perf_counter()
+    for gray in frames:
+        faces = cascade.detectMultiScale(gray, 1.1, 4)
+        if len(faces) > 0:
+            detected += 1
+    return time.perf_counter() - start, detected
+
+
+def run_fast_path(frames, **detector_kwargs):
+    """The downscaled pipeline with per-session ROI tracking."""
+    detector = FaceDetector(**detector_kwargs)
+    detected = 0
+    start = time.perf_counter()
+    for gray in frames:
+        if detector.detect(gray, session_id="benchmark"):
+            detected += 1
+    return time.perf_counter() - start, detected, detector.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detection throughput benchmark")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--frames", help="Directory of frame images, processed in name order")
+    source.add_argument("--video", help="Video file to read frames from")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of frames to load")
+    parser.add_argument("--width", type=int, default=None, help="Working width for the fast path")
+    parser.add_argument("--scale-factor", type=float, default=None, help="Scale factor for the fast path")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.video, args.limit)
+    if not frames:
+        logger.error("No frames loaded")
+        sys.exit(1)
+
+    detector_kwargs = {}
+    if args.width is not None:
+        detector_kwargs["working_width"] = args.width
+    if args.scale_factor is not None:
+        detector_kwargs["scale_factor"] = args.scale_factor
+
+    height, width = frames[0].shape[:2]
+    logger.info(f"Loaded {len(frames)} frames at {width}x{height}")
+
+    base_time, base_detected = run_baseline(frames)
+    fast_time, fast_detected, stats = run_fast_path(frames, **detector_kwargs)
+
+    logger.info(f"{'pipeline':<12} {'frames/sec':>12} {'faces found':>12}")
+    logger.info(f"{'before':<12} {len(frames) / base_time:>12.1f} {base_detected:>12}")
+    logger.info(f"{'after':<12} {len(frames) / fast_time:>12.1f} {fast_detected:>12}")
+    logger.info(f"Speedup: {base_time / fast_time:.2f}x "
+                f"(ROI hits: {stats['roi_hits']}, full scans: {stats['full_scans']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Microbenchmarks for backend hot paths.
+
+Times output comparison, LLM JSON cleanup, facial expression analysis of a
+single frame and session report building. Report building runs against a
+throwaway SQLite database, so no MySQL server is needed.
+
+Usage:
+    python -m benchmarks.bench_micro --output micro.json
+    python -m benchmarks.bench_micro --only report --snapshots 5000
+    python -m benchmarks.reporting micro-baseline.json micro.json
+"""
+import os
+import sys
+import time
+import base64
+import random
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.reporting import new_report, summarize, write_report
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ("compare", "clean_json", "emotion", "report")
+
+
+def time_op(func, iterations, warmup=3):
+    """Run func repeatedly, returning (per-call latencies in seconds, elapsed seconds)."""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+
+def bench_compare(report, iterations):
+    from output_compare import canonicalize, compile_expected, outputs_match
+
+    cases = [
+        ("array", "[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]", "[1,2,3,4,5,6,7,8,9,10]\n", "python"),
+        ("array_cpp", "[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]", "1 2 3 4 5 6 7 8 9 10\n", "cpp"),
+        ("float", "0.3333333", "0.33333333\n", "javascript"),
+        ("text", "Hello World", "Hello World\n", "java"),
+    ]
+    for name, expected, actual, language in cases:
+        compiled = canonicalize(expected, language)
+        latencies, elapsed = time_op(lambda: outputs_match(compiled, actual, language), iterations)
+        report["results"][f"compare.{name}"] = summarize(latencies, elapsed)
+
+    test_cases = [{"input": str(i), "output": f"[{i}, {i + 1}, {i + 2}]"} for i in range(50)]
+    latencies, elapsed = time_op(lambda: compile_expected(test_cases, "python"), max(iterations // 50, 10))
+    report["results"]["compare.compile_expected_50"] = summarize(latencies, elapsed)
+
+
+def bench_clean_json(report, iterations):
+    from services import clean_json_response
+    from benchmarks.fake_ollama import make_question
+
+    fenced = make_question("difficulty: medium")
+    wrapped = "Sure! Here is your question:\n" + fenced.replace("```json", "").replace("```", "") + "\nGood luck!"
+    for name, text in (("fenced", fenced), ("prose_wrapped", wrapped)):
+        latencies, elapsed = time_op(lambda: clean_json_response(text), iterations)
+        report["results"][f"clean_json_response.{name}"] = summarize(latencies, elapsed)
+
+
+def bench_emotion(report, iterations, image_path=None):
+    import cv2
+    import numpy as np
+    from services import analyze_facial_expression
+
+    if image_path:
+        frame = cv2.imread(image_path)
+    else:
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", frame)
+    image_data = "data:image/jpeg;base64," + base64.b64encode(encoded.tobytes()).decode()
+
+    latencies, elapsed = time_op(lambda: analyze_facial_expression(image_data), iterations)
+    report["results"]["analyze_facial_expression"] = summarize(latencies, elapsed)
+
+    # Consecutive frames of one session exercise face tracking and frame deduplication
+    latencies, elapsed = time_op(lambda: analyze_facial_expression(image_data, session_id="bench"), iterations)
+    report["results"]["analyze_facial_expression.session"] = summarize(latencies, elapsed)
+
+
+def bench_report(report, iterations, questions, snapshots):
+    import main
+    from database import SessionLocal
+    from models import InterviewSession, SessionQuestion, EmotionSnapshot, QuestionTable
+
+    db = SessionLocal()
+    try:
+        question_ids = [row.id for row in db.query(QuestionTable.id).limit(questions).all()]
+        session = InterviewSession(session_name="Benchmark session")
+        db.add(session)
+        db.flush()
+        rng = random.Random(0)
+        for order, question_id in enumerate(question_ids):
+            db.add(SessionQuestion(
+                session_id=session.id, question_id=question_id, order_index=order,
+                code_submitted="print(input())", language="python",
+                passed_tests=rng.randint(0, 3), total_tests=3, duration=rng.randint(60, 900)
+            ))
+        db.add_all([
+            EmotionSnapshot(
+                session_id=session.id,
+                attention_level=rng.random(), positivity_level=rng.random(), arousal_level=rng.random(),
+                dominant_emotion=rng.choice(["neutral", "happy", "surprised", "sad"]),
+                face_detected=True, question_id=rng.choice(question_ids) if question_ids else None
+            )
+            for _ in range(snapshots)
+        ])
+        db.commit()
+
+        latencies, elapsed = time_op(lambda: main.generate_session_report(session.id, db), iterations)
+        report["results"][f"session_report.{snapshots}_snapshots"] = summarize(latencies, elapsed)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend microbenchmarks")
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="Run only these benchmarks")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per benchmark (divided for slow ones)")
+    parser.add_argument("--image", help="Webcam frame to use for the emotion benchmark")
+    parser.add_argument("--questions", type=int, default=5, help="Questions in the report session")
+    parser.add_argument("--snapshots", type=int, default=1000, help="Emotion snapshots in the report session")
+    parser.add_argument("--database-url", help="Database for the report benchmark (default: temporary SQLite file)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    # The app connects at import time, so point it at a local database and
+    # unreachable external services before anything imports it
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("JUDGE0_API_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("QUESTION_POOL_ENABLED", "false")
+    os.environ.setdefault("INSTRUMENTATION_ENABLED", "false")
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    selected = args.only or BENCHMARKS
+    report = new_report("micro", {k: v for k, v in vars(args).items() if k != "output"})
+    if "compare" in selected:
+        bench_compare(report, args.iterations)
+    if "clean_json" in selected:
+        bench_clean_json(report, args.iterations)
+    if "emotion" in selected:
+        bench_emotion(report, max(args.iterations // 20, 20), args.image)
+    if "report" in selected:
+        bench_report(report, max(args.iterations // 100, 10), args.questions, args.snapshots)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare question list serialization before and after the serialization layer.
+
+"legacy" reproduces the old list endpoint path: hydrate full ORM objects,
+overwrite their datetimes with ISO strings, validate them into response
+models, then run FastAPI's jsonable_encoder and json.dumps. "projected" is
+the current path: select only the response columns, validate the rows with a
+prebuilt TypeAdapter and serialize with pydantic-core. The end-to-end
+benchmark requests GET /questions/ through the app with the page cache off.
+
+Usage:
+    python -m benchmarks.bench_serialization --questions 2000 --page-sizes 10,100 --output serialization.json
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_micro import time_op
+from benchmarks.reporting import new_report, summarize, write_report
+
+logger = logging.getLogger(__name__)
+
+
+def seed(db, count):
+    from models import QuestionTable
+
+    existing = db.query(QuestionTable).count()
+    rng = random.Random(0)
+    db.add_all([
+        QuestionTable(
+            title=f"Benchmark question {i}",
+            desc="Given an array of integers, return something interesting about it. " * 4,
+            difficulty=rng.choice(["easy", "medium", "hard"]),
+            example={"input": "[1, 2, 3]", "output": "6", "explanation": "Sum of the array"},
+            constraints=["1 <= n <= 10^5", "-10^9 <= nums[i] <= 10^9"],
+            topics=["Array"],
+            test_cases=[{"input": f"[{i}, {i + 1}]", "output": str(2 * i + 1), "explanation": None} for i in range(5)],
+        )
+        for i in range(existing, count)
+    ])
+    db.commit()
+
+
+def legacy_page(db, limit):
+    from fastapi.encoders import jsonable_encoder
+    from models import QuestionTable
+    from schemas import Question
+
+    rows = db.query(QuestionTable).order_by(QuestionTable.id).limit(limit).all()
+    for row in rows:
+        if row.created_at:
+            row.created_at = row.created_at.isoformat()
+        if row.updated_at:
+            row.updated_at = row.updated_at.isoformat()
+    body = json.dumps(jsonable_encoder([Question.model_validate(row) for row in rows])).encode()
+    # The mutated objects stay in the session; expire them as the request teardown would
+    db.rollback()
+    return body
+
+
+def projected_page(db, limit):
+    from question_catalog import query_question_page
+    from serialization import QUESTION_COLUMNS, dump_questions, questions_from_rows
+
+    rows = query_question_page(db, limit=limit, columns=QUESTION_COLUMNS)
+    return dump_questions(questions_from_rows(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question list serialization benchmark")
+    parser.add_argument("--questions", type=int, default=1000, help="Questions in the database")
+    parser.add_argument("--page-sizes", default="10,100", help="Comma-separated page sizes")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--database-url", help="Database to use (default: temporary SQLite file)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("JUDGE0_API_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("QUESTION_POOL_ENABLED", "false")
+    os.environ.setdefault("INSTRUMENTATION_ENABLED", "false")
+    os.environ["QUESTION_CATALOG_CACHE_SIZE"] = "0"  # measure serialization, not the page cache
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    import main as app_module
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from question_catalog import QUESTION_CATALOG_MAX_LIMIT
+
+    report = new_report("serialization", {k: v for k, v in vars(args).items() if k != "output"})
+    db = SessionLocal()
+    try:
+        seed(db, args.questions)
+        for limit in (int(size) for size in args.page_sizes.split(",")):
+            if json.loads(legacy_page(db, limit)) != json.loads(projected_page(db, limit)):
+                logger.warning(f"Legacy and projected bodies differ for page size {limit}")
+            for name, func in (("legacy", legacy_page), ("projected", projected_page)):
+                latencies, elapsed = time_op(lambda: func(db, limit), args.iterations)
+                report["results"][f"list_page.{name}.{limit}"] = summarize(latencies, elapsed)
+    finally:
+        db.close()
+
+    with TestClient(app_module.app) as client:
+        for limit in (int(size) for size in args.page_sizes.split(",")):
+            limit = min(limit, QUESTION_CATALOG_MAX_LIMIT)
+            latencies, elapsed = time_op(lambda: client.get("/questions/", params={"limit": limit}), args.iterations)
+            report["results"][f"GET /questions/.{limit}"] = summarize(latencies, elapsed)
+
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
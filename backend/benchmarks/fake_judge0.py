@@ -0,0 +1,130 @@
+"""
+Stand-in Judge0 server for local testing and benchmarks.
+
+Implements /languages, POST /submissions and GET /submissions/{token}. A
+submission reports "Processing" until the configured latency has passed,
+then finishes with its stdin echoed as stdout, so test cases whose expected
+output equals their input pass. Source code containing COMPILE_ERROR or
+RUNTIME_ERROR finishes with that status instead.
+
+Usage:
+    python -m benchmarks.fake_judge0 --port 2358 --latency 0.5
+    JUDGE0_API_URL=http://localhost:2358 python run.py
+"""
+import re
+import json
+import time
+import uuid
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LANGUAGES = [
+    {"id": 54, "name": "C++ (GCC 9.2.0)"},
+    {"id": 62, "name": "Java (OpenJDK 13.0.1)"},
+    {"id": 63, "name": "JavaScript (Node.js 12.14.0)"},
+    {"id": 71, "name": "Python (3.8.1)"},
+]
+
+MAX_SUBMISSIONS = 100000
+
+
+class FakeJudge0Handler(BaseHTTPRequestHandler):
+    latency = 0.5
+    submissions = OrderedDict()
+    lock = threading.Lock()
+    stats = {"created": 0, "polled": 0}
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/languages":
+            self._send_json(LANGUAGES)
+            return
+        if path == "/stats":
+            self._send_json(self.stats)
+            return
+        match = re.fullmatch(r"/submissions/([\w-]+)", path)
+        if not match:
+            self._send_json({"error": "not found"}, 404)
+            return
+        with self.lock:
+            submission = self.submissions.get(match.group(1))
+            self.stats["polled"] += 1
+        if submission is None:
+            self._send_json({"error": "submission not found"}, 404)
+            return
+        self._send_json(self._result(submission))
+
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != "/submissions":
+            self._send_json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        token = str(uuid.uuid4())
+        with self.lock:
+            self.submissions[token] = {
+                "created": time.monotonic(),
+                "source_code": request.get("source_code", ""),
+                "stdin": request.get("stdin", "") or "",
+            }
+            while len(self.submissions) > MAX_SUBMISSIONS:
+                self.submissions.popitem(last=False)
+            self.stats["created"] += 1
+        self._send_json({"token": token}, 201)
+
+    def _result(self, submission):
+        if time.monotonic() - submission["created"] < self.latency:
+            return {"status": {"id": 2, "description": "Processing"}, "stdout": None, "stderr": None,
+                    "time": None, "memory": None}
+        source = submission["source_code"]
+        if "COMPILE_ERROR" in source:
+            return {"status": {"id": 6, "description": "Compilation Error"}, "stdout": None,
+                    "stderr": None, "compile_output": "error: expected ';'", "time": None, "memory": None}
+        if "RUNTIME_ERROR" in source:
+            return {"status": {"id": 11, "description": "Runtime Error (NZEC)"}, "stdout": None,
+                    "stderr": "Traceback (most recent call last)", "time": "0.01", "memory": 3000}
+        return {"status": {"id": 3, "description": "Accepted"}, "stdout": submission["stdin"] + "\n",
+                "stderr": None, "time": "0.01", "memory": 3000}
+
+
+def serve(port=2358, latency=0.5):
+    """Create the fake Judge0 server; call serve_forever() on the result."""
+    FakeJudge0Handler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeJudge0Handler)
+    logger.info(f"Fake Judge0 listening on http://127.0.0.1:{server.server_address[1]} (latency {latency}s)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Judge0 server")
+    parser.add_argument("--port", type=int, default=2358)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before a submission finishes")
+    args = parser.parse_args()
+    server = serve(args.port, args.latency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Stand-in Ollama server for local testing and benchmarks.
+
+Implements /api/tags and /api/generate (streaming and non-streaming) and
+answers every generation with a well-formed interview question in the format
+the backend prompt asks for, after a configurable delay.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11435 --latency 2.0
+    OLLAMA_URL=http://localhost:11435 python run.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PROBLEMS = [
+    ("Sum of Pairs", "Array", "Given an array of integers nums and an integer k, return the number of pairs whose sum equals k."),
+    ("Longest Unique Substring", "String", "Given a string s, return the length of the longest substring without repeating characters."),
+    ("Balanced Brackets", "Stack", "Given a string of brackets, return true if every opening bracket is closed in the correct order."),
+    ("Island Count", "Graph", "Given a grid of '1's and '0's, return the number of islands formed by adjacent land cells."),
+    ("Climbing Steps", "Dynamic Programming", "Given n steps and moves of 1 or 2 steps, return the number of distinct ways to reach the top."),
+    ("Kth Largest Element", "Heap", "Given an array nums and an integer k, return the kth largest element."),
+]
+
+# Extra sentences mixed into descriptions so successive questions are not near-duplicates
+STORY_WORDS = (
+    "warehouse robot ledger river concert satellite garden library tournament bakery orbit "
+    "harbor festival circuit mountain archive railway museum lantern market glacier canyon"
+).split()
+
+_counter = itertools.count(1)
+
+
+def make_question(prompt):
+    """Build a question JSON string for the difficulty and topic named in the prompt."""
+    difficulty_match = re.search(r"difficulty:\s*(easy|medium|hard)", prompt, re.IGNORECASE)
+    topic_match = re.search(r"topic:\s*(.+)", prompt, re.IGNORECASE)
+    difficulty = difficulty_match.group(1).lower() if difficulty_match else "medium"
+    topic = topic_match.group(1).strip() if topic_match else "any"
+
+    title, default_topic, desc = random.choice(PROBLEMS)
+    number = next(_counter)
+    question = {
+        "title": f"{title} {number}",
+        "desc": f"{desc} " + " ".join(random.choice(STORY_WORDS) for _ in range(40)),
+        "difficulty": difficulty,
+        "example": {"input": "nums = [1,2,3], k = 3", "output": "1", "explanation": "Only 1 + 2 equals 3."},
+        "constraints": ["1 <= nums.length <= 10^5"],
+        "topics": [default_topic if topic.lower() == "any" else topic],
+        "test_cases": [
+            {"input": "nums = [1,2,3], k = 3", "output": "1", "explanation": "1 + 2"},
+            {"input": "nums = [1,1,1], k = 2", "output": "3", "explanation": "Every pair"},
+            {"input": "nums = [5], k = 5", "output": "0", "explanation": "No pairs"},
+        ],
+    }
+    return "```json\n" + json.dumps(question, indent=2) + "\n```"
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    latency = 1.0
+    model = "llama3"
+    malformed_rate = 0.0
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.model}, {"name": f"{self.model}:latest"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        text = make_question(request.get("prompt", ""))
+        if random.random() < self.malformed_rate:
+            text = text[: len(text) // 2] + " ...and then the model wandered off"
+
+        if not request.get("stream", True):
+            time.sleep(self.latency)
+            self._send_json({"model": self.model, "response": text, "done": True})
+            return
+
+        # Stream NDJSON chunks of a few characters, spreading the latency across them
+        chunks = [text[i:i + 8] for i in range(0, len(text), 8)]
+        delay = self.latency / max(len(chunks), 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(delay)
+                line = json.dumps({"model": self.model, "response": chunk, "done": False}) + "\n"
+                self.wfile.write(line.encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps({"model": self.model, "response": "", "done": True}) + "\n").encode())
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client closed the stream early")
+
+
+def serve(port=11435, latency=1.0, model="llama3", malformed_rate=0.0):
+    """Run the fake Ollama server until interrupted."""
+    FakeOllamaHandler.latency = latency
+    FakeOllamaHandler.model = model
+    FakeOllamaHandler.malformed_rate = malformed_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+    logger.info(f"Fake Ollama listening on http://127.0.0.1:{server.server_address[1]} (latency {latency}s)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds per generation")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of truncated responses")
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, args.model, args.malformed_rate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
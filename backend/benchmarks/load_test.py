@@ -0,0 +1,219 @@
+"""
+Load scenarios against the running API with stand-in Judge0 and Ollama servers.
+
+By default the script starts the fake Judge0 and Ollama servers, then starts
+the app with uvicorn on a fresh SQLite database pointed at them. Each
+scenario drives N concurrent interview sessions for a fixed duration and
+records per-request latency:
+
+    snapshots   - POST /sessions/{id}/emotions/ (emotion snapshot ingestion)
+    batch_test  - POST /questions/{id}/batch-test with the session question
+    report      - GET /sessions/{id}/report
+
+Pass --base-url to load an already running server instead (for example one
+backed by MySQL in a container); it must be configured with its own Judge0
+and Ollama endpoints.
+
+Usage:
+    python -m benchmarks.load_test --sessions 20 --duration 30 --output load.json
+    python -m benchmarks.load_test --scenario report --sessions 50 --snapshots 2000
+    python -m benchmarks.reporting load-baseline.json load.json
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_judge0, fake_ollama
+from benchmarks.reporting import new_report, summarize, write_report
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("snapshots", "batch_test", "report")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMOTIONS = ["neutral", "happy", "surprised", "sad", "angry"]
+
+
+def start_in_thread(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def start_app(port, judge0_url, ollama_url, database_url, workers):
+    """Start the API with uvicorn, returning the process once /health answers."""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "JUDGE0_API_URL": judge0_url,
+        "OLLAMA_URL": ollama_url,
+        "QUESTION_POOL_ENABLED": env.get("QUESTION_POOL_ENABLED", "false"),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy within 60 seconds")
+
+
+async def setup_sessions(client, count, snapshots):
+    """Create sessions, each with one question and an optional backlog of snapshots."""
+    response = await client.get("/questions/", params={"limit": 1})
+    response.raise_for_status()
+    questions = response.json()
+    if not questions:
+        raise RuntimeError("The server has no questions to test against")
+    question_id = questions[0]["id"]
+
+    sessions = []
+    for index in range(count):
+        response = await client.post("/sessions/", json={"session_name": f"Load session {index}"})
+        response.raise_for_status()
+        session_id = response.json()["id"]
+        response = await client.post(f"/sessions/{session_id}/questions/", json={"question_id": question_id})
+        response.raise_for_status()
+        sessions.append({"id": session_id, "question_id": question_id, "session_question_id": response.json()["id"]})
+
+    if snapshots:
+        semaphore = asyncio.Semaphore(32)
+
+        async def add_snapshot(session):
+            async with semaphore:
+                await client.post(f"/sessions/{session['id']}/emotions/", json=snapshot_body(session))
+
+        await asyncio.gather(*(add_snapshot(s) for s in sessions for _ in range(snapshots)))
+    return sessions
+
+
+def snapshot_body(session):
+    return {
+        "attention_level": random.random(),
+        "positivity_level": random.random(),
+        "arousal_level": random.random(),
+        "dominant_emotion": random.choice(EMOTIONS),
+        "face_detected": True,
+        "question_id": session["question_id"],
+    }
+
+
+def make_request(scenario, client, session):
+    if scenario == "snapshots":
+        return client.post(f"/sessions/{session['id']}/emotions/", json=snapshot_body(session))
+    if scenario == "batch_test":
+        return client.post(f"/questions/{session['question_id']}/batch-test", json={
+            "code": "print(input())",
+            "language": "python",
+            "session_question_id": session["session_question_id"],
+        })
+    return client.get(f"/sessions/{session['id']}/report")
+
+
+async def run_scenario(client, scenario, sessions, duration, think_time):
+    """Drive every session in a loop for duration seconds; returns (latencies, errors, elapsed)."""
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def session_loop(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                response = await make_request(scenario, client, session)
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                errors += 1
+            if think_time:
+                await asyncio.sleep(random.uniform(0, think_time * 2))
+
+    await asyncio.gather(*(session_loop(s) for s in sessions))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run(args, base_url):
+    report = new_report("load", {k: v for k, v in vars(args).items() if k != "output"})
+    timeout = httpx.Timeout(120.0, connect=10.0)
+    limits = httpx.Limits(max_connections=args.sessions * 2, max_keepalive_connections=args.sessions * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        sessions = await setup_sessions(client, args.sessions, args.snapshots)
+        logger.info(f"Created {len(sessions)} sessions with {args.snapshots} snapshots each")
+        for scenario in args.scenario or SCENARIOS:
+            logger.info(f"Running {scenario} for {args.duration}s with {args.sessions} concurrent sessions")
+            latencies, errors, elapsed = await run_scenario(client, scenario, sessions, args.duration, args.think_time)
+            report["results"][f"{scenario}.{args.sessions}_sessions"] = summarize(latencies, elapsed, errors)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend load scenarios")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="Run only these scenarios")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent interview sessions")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds each session waits between requests")
+    parser.add_argument("--snapshots", type=int, default=200, help="Snapshots per session created before the scenarios")
+    parser.add_argument("--base-url", help="Load this running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the started server")
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn workers for the started server")
+    parser.add_argument("--database-url", help="Database for the started server (default: temporary SQLite file)")
+    parser.add_argument("--judge0-latency", type=float, default=0.2, help="Seconds the fake Judge0 takes per submission")
+    parser.add_argument("--ollama-latency", type=float, default=1.0, help="Seconds the fake Ollama takes per generation")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    servers = []
+    process = None
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            judge0 = start_in_thread(fake_judge0.serve(port=0, latency=args.judge0_latency))
+            ollama = start_in_thread(fake_ollama.serve(port=0, latency=args.ollama_latency))
+            servers = [judge0, ollama]
+            database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+            process = start_app(
+                args.port,
+                f"http://127.0.0.1:{judge0.server_address[1]}",
+                f"http://127.0.0.1:{ollama.server_address[1]}",
+                database_url,
+                args.workers
+            )
+            base_url = f"http://127.0.0.1:{args.port}"
+        report = asyncio.run(run(args, base_url))
+        write_report(report, args.output)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency summaries and JSON benchmark reports that can be compared between runs.
+
+Usage:
+    python -m benchmarks.reporting baseline.json current.json
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from typing import Any, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0, items_per_op: int = 1) -> Dict[str, Any]:
+    """Throughput and latency percentiles (in milliseconds) of a list of per-operation seconds."""
+    ordered = sorted(latencies)
+    return {
+        "operations": len(ordered),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(ordered) * items_per_op / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def new_report(kind: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Report skeleton recording what was run and where."""
+    return {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": parameters,
+        "results": {},
+    }
+
+
+def print_results(report: Dict[str, Any], out=sys.stdout):
+    out.write(f"{'benchmark':<36} {'ops':>8} {'err':>5} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}\n")
+    for name, result in report["results"].items():
+        out.write(f"{name:<36} {result['operations']:>8} {result['errors']:>5} {result['throughput_per_s']:>10.1f} "
+                  f"{result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f}\n")
+
+
+def write_report(report: Dict[str, Any], path: Optional[str]):
+    print_results(report)
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10, out=sys.stdout) -> bool:
+    """
+    Print per-benchmark changes between two reports.
+
+    Returns False if any benchmark's p99 latency regressed by more than threshold.
+    """
+    ok = True
+    out.write(f"{'benchmark':<36} {'ops/s':>20} {'p50 ms':>20} {'p99 ms':>20}\n")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            out.write(f"{name:<36} (new)\n")
+            continue
+        cells = []
+        for key in ("throughput_per_s", "p50_ms", "p99_ms"):
+            before, after = base[key], result[key]
+            change = (after - before) / before * 100 if before else 0.0
+            cells.append(f"{after:>10.3f} ({change:+6.1f}%)")
+        if base["p99_ms"] and result["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            ok = False
+            cells.append("REGRESSION")
+        out.write(f"{name:<36} " + " ".join(cells) + "\n")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p99 regression (0.10 = 10%%)")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    sys.exit(0 if compare(baseline, current, args.threshold) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import os
+import json
+import zlib
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exists, insert, and_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, add_missing_columns
+from models import ContentBlob, CodeSubmission, SessionQuestion, EditTimelineChunk, IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Blob store configuration from environment variables
+BLOB_COMPRESSION = os.environ.get("BLOB_COMPRESSION", "zstd" if zstandard else "zlib")  # none, zlib or zstd
+BLOB_COMPRESSION_LEVEL = int(os.environ.get("BLOB_COMPRESSION_LEVEL", "6"))
+BLOB_MIN_COMPRESS_SIZE = int(os.environ.get("BLOB_MIN_COMPRESS_SIZE", "128"))  # smaller blobs are stored as they are
+BLOB_CACHE_SIZE = int(os.environ.get("BLOB_CACHE_SIZE", "512"))  # decoded blobs kept per worker
+BLOB_GC_GRACE = int(os.environ.get("BLOB_GC_GRACE", "3600"))  # seconds an unreferenced blob is kept after its last put
+BLOB_GC_INTERVAL = float(os.environ.get("BLOB_GC_INTERVAL", "3600"))  # seconds between garbage collections; 0 disables
+BLOB_GC_BATCH_SIZE = 500
+BLOB_FETCH_BATCH_SIZE = 500  # hashes per query in get_many
+
+if BLOB_COMPRESSION == "zstd" and zstandard is None:
+    logger.warning("zstandard is not installed, compressing blobs with zlib instead (pip install zstandard)")
+    BLOB_COMPRESSION = "zlib"
+
+# Columns holding blob hashes; a blob referenced by none of them can be collected
+BLOB_REFERENCES = (
+    CodeSubmission.code_hash,
+    CodeSubmission.response_hash,
+    SessionQuestion.test_results_hash,
+    EditTimelineChunk.snapshot_hash,
+    EditTimelineChunk.ops_hash,
+    IdempotencyRecord.response_hash,
+)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def canonical_json(value: Any) -> bytes:
+    """Stable JSON encoding, so equal values hash to the same blob."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def compress(data: bytes, codec: str = BLOB_COMPRESSION) -> Tuple[str, bytes]:
+    """Compress data with codec; returns the codec actually used and the stored bytes."""
+    if codec == "none" or len(data) < BLOB_MIN_COMPRESS_SIZE:
+        return "none", data
+    if codec == "zstd":
+        stored = zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL).compress(data)
+    else:
+        codec, stored = "zlib", zlib.compress(data, BLOB_COMPRESSION_LEVEL)
+    # Incompressible content is not worth decompressing on every read
+    if len(stored) >= len(data):
+        return "none", data
+    return codec, stored
+
+
+def decompress(codec: str, stored: bytes) -> bytes:
+    if codec == "none":
+        return stored
+    if codec == "zlib":
+        return zlib.decompress(stored)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(stored)
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+def ensure_blob_columns():
+    """Add the blob hash columns to tables created before content blobs."""
+    add_missing_columns(BLOB_REFERENCES)
+
+
+class BlobStore:
+    """
+    Content-addressed, compressed storage for code and result payloads.
+
+    put() stores content once per SHA-256 and returns the hash for rows to
+    reference; storing the same content again only refreshes last_used_at.
+    Blobs are immutable, so decoded content is cached per worker by hash.
+    A background task collects unreferenced blobs every BLOB_GC_INTERVAL.
+    """
+
+    def __init__(self, cache_size: int = BLOB_CACHE_SIZE, gc_interval: float = BLOB_GC_INTERVAL):
+        self.cache_size = cache_size
+        self.gc_interval = gc_interval
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"puts": 0, "bytes_in": 0, "bytes_stored": 0, "hits": 0, "misses": 0, "collected": 0}
+
+    def _remember(self, blob_hash: str, data: bytes):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[blob_hash] = data
+            self._cache.move_to_end(blob_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _upsert(self, db: Session, values: Dict[str, Any]):
+        """Insert a blob, or refresh last_used_at when the hash is already stored."""
+        now = datetime.now()
+        dialect = db.get_bind().dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            db.execute(mysql_insert(ContentBlob).values(**values, last_used_at=now).on_duplicate_key_update(last_used_at=now))
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+            db.execute(sqlite_insert(ContentBlob).values(**values, last_used_at=now).on_conflict_do_update(
+                index_elements=[ContentBlob.hash], set_={"last_used_at": now}
+            ))
+        else:
+            updated = db.query(ContentBlob).filter(ContentBlob.hash == values["hash"]).update(
+                {"last_used_at": now}, synchronize_session=False
+            )
+            if not updated:
+                db.execute(insert(ContentBlob).values(**values, last_used_at=now))
+
+    def put(self, db: Session, data: bytes) -> str:
+        """
+        Store content and return its hash.
+
+        Runs in the caller's transaction, so the blob commits together with
+        the rows that reference it.
+        """
+        blob_hash = content_hash(data)
+        codec, stored = compress(data)
+        self._upsert(db, {"hash": blob_hash, "codec": codec, "size": len(data), "stored_size": len(stored), "data": stored})
+        self._remember(blob_hash, data)
+        self.stats["puts"] += 1
+        self.stats["bytes_in"] += len(data)
+        self.stats["bytes_stored"] += len(stored)
+        return blob_hash
+
+    def put_text(self, db: Session, value: str) -> str:
+        return self.put(db, value.encode("utf-8"))
+
+    def put_json(self, db: Session, value: Any) -> str:
+        return self.put(db, canonical_json(value))
+
+    def get(self, db: Session, blob_hash: Optional[str]) -> Optional[bytes]:
+        """Decoded content for a hash, or None when it is not stored."""
+        if not blob_hash:
+            return None
+        with self._lock:
+            data = self._cache.get(blob_hash)
+            if data is not None:
+                self._cache.move_to_end(blob_hash)
+                self.stats["hits"] += 1
+                return data
+        self.stats["misses"] += 1
+        row = db.query(ContentBlob.codec, ContentBlob.data).filter(ContentBlob.hash == blob_hash).first()
+        if row is None:
+            logger.warning(f"Content blob {blob_hash} is missing")
+            return None
+        data = decompress(row.codec, row.data)
+        self._remember(blob_hash, data)
+        return data
+
+    def get_many(self, db: Session, blob_hashes: Iterable[Optional[str]]) -> Dict[str, bytes]:
+        """Decoded content of several hashes, fetching the uncached ones in batched queries; missing hashes are left out."""
+        found: Dict[str, bytes] = {}
+        misses = []
+        with self._lock:
+            for blob_hash in set(filter(None, blob_hashes)):
+                data = self._cache.get(blob_hash)
+                if data is None:
+                    misses.append(blob_hash)
+                else:
+                    self._cache.move_to_end(blob_hash)
+                    found[blob_hash] = data
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(misses)
+        for start in range(0, len(misses), BLOB_FETCH_BATCH_SIZE):
+            batch = misses[start:start + BLOB_FETCH_BATCH_SIZE]
+            for row in db.query(ContentBlob.hash, ContentBlob.codec, ContentBlob.data).filter(ContentBlob.hash.in_(batch)):
+                found[row.hash] = decompress(row.codec, row.data)
+                self._remember(row.hash, found[row.hash])
+        for blob_hash in misses:
+            if blob_hash not in found:
+                logger.warning(f"Content blob {blob_hash} is missing")
+        return found
+
+    def get_text(self, db: Session, blob_hash: Optional[str]) -> Optional[str]:
+        data = self.get(db, blob_hash)
+        return data.decode("utf-8") if data is not None else None
+
+    def get_json(self, db: Session, blob_hash: Optional[str]) -> Any:
+        data = self.get(db, blob_hash)
+        return json.loads(data) if data is not None else None
+
+    def collect_garbage(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Delete blobs no row references that were not stored again within BLOB_GC_GRACE.
+
+        The grace period covers puts whose referencing rows are not committed
+        yet. Returns the number of blobs deleted.
+        """
+        cutoff = (now or datetime.now()) - timedelta(seconds=BLOB_GC_GRACE)
+        unreferenced = and_(
+            ContentBlob.last_used_at < cutoff,
+            *(~exists().where(column == ContentBlob.hash) for column in BLOB_REFERENCES)
+        )
+        collected = 0
+        while True:
+            hashes = [row.hash for row in db.query(ContentBlob.hash).filter(unreferenced).limit(BLOB_GC_BATCH_SIZE)]
+            if not hashes:
+                break
+            db.query(ContentBlob).filter(ContentBlob.hash.in_(hashes), unreferenced).delete(synchronize_session=False)
+            db.commit()
+            collected += len(hashes)
+            with self._lock:
+                for blob_hash in hashes:
+                    self._cache.pop(blob_hash, None)
+        if collected:
+            logger.info(f"Collected {collected} unreferenced content blobs")
+        self.stats["collected"] += collected
+        return collected
+
+    def _collect(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.collect_garbage(db)
+        finally:
+            db.close()
+
+    async def _gc_loop(self):
+        while True:
+            await asyncio.sleep(self.gc_interval)
+            try:
+                await run_in_threadpool(self._collect)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Blob garbage collection failed: {str(e)}")
+
+    def start(self):
+        """Start the background garbage collection task on the running event loop."""
+        if self.gc_interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._gc_loop())
+
+    async def stop(self):
+        """Cancel the background garbage collection task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Create a singleton instance
+blob_store = BlobStore()
@@ -0,0 +1,317 @@
+import os
+import re
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from database import add_missing_columns
+from models import CodeSubmission, SessionQuestion, CodeFingerprint, FingerprintFrequency
+from blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+# Similarity configuration from environment variables
+SIMILARITY_ENABLED = os.environ.get("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_KGRAM = int(os.environ.get("SIMILARITY_KGRAM", "5"))  # tokens per hashed k-gram
+SIMILARITY_WINDOW = int(os.environ.get("SIMILARITY_WINDOW", "4"))  # k-grams per winnowing window
+SIMILARITY_MAX_POSTINGS = int(os.environ.get("SIMILARITY_MAX_POSTINGS", "1000"))  # fingerprints in more submissions are boilerplate
+SIMILARITY_MIN_SCORE = float(os.environ.get("SIMILARITY_MIN_SCORE", "0.1"))  # estimated Jaccard similarity
+SIMILARITY_CANDIDATES = 5  # candidates ranked by shared fingerprints per requested result
+SIMILARITY_UPDATE_BATCH = 1000  # fingerprints per frequency update statement
+
+_FINGERPRINT_MASK = (1 << 63) - 1  # fits a signed BIGINT
+
+# Languages whose comments start with "#"; everything else is treated as C-like
+_HASH_COMMENT_LANGUAGES = {"python", "ruby", "r"}
+_HASH_COMMENTS = re.compile(r"#[^\n]*")
+_C_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+
+_TOKENS = re.compile(r"""
+    (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+  | (?P<number>0[xX][0-9a-fA-F]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<op>===|!==|==|!=|<=|>=|&&|\|\||\+\+|--|->|=>|::|<<|>>|\*\*|//|\+=|-=|\*=|/=|[-+*/%=<>!&|^~?:;,.(){}\[\]])
+""", re.X)
+
+_KEYWORDS = {
+    "python": {
+        "and", "as", "assert", "break", "class", "continue", "def", "del", "elif", "else", "except", "finally",
+        "for", "from", "global", "if", "import", "in", "is", "lambda", "nonlocal", "not", "or", "pass", "raise",
+        "return", "try", "while", "with", "yield", "None", "True", "False",
+    },
+    "javascript": {
+        "break", "case", "catch", "class", "const", "continue", "default", "delete", "do", "else", "for",
+        "function", "if", "in", "instanceof", "let", "new", "of", "return", "switch", "this", "throw", "try",
+        "typeof", "var", "while", "null", "undefined", "true", "false",
+    },
+    "java": {
+        "boolean", "break", "case", "catch", "char", "class", "continue", "default", "do", "double", "else",
+        "final", "for", "if", "import", "int", "long", "new", "private", "public", "return", "static", "switch",
+        "this", "throw", "try", "void", "while", "null", "true", "false",
+    },
+    "cpp": {
+        "auto", "bool", "break", "case", "char", "class", "const", "continue", "default", "do", "double", "else",
+        "for", "if", "include", "int", "long", "namespace", "new", "return", "static", "struct", "switch",
+        "this", "using", "void", "while", "nullptr", "true", "false",
+    },
+}
+
+
+def tokenize(code: str, language: str) -> List[str]:
+    """
+    Normalized token stream of a submission.
+
+    Comments and whitespace are dropped, and identifiers, numbers and string
+    literals are replaced by placeholders. Renaming variables or changing
+    constants does not change the stream; keywords and operators are kept.
+    """
+    language = (language or "").lower()
+    comments = _HASH_COMMENTS if language in _HASH_COMMENT_LANGUAGES else _C_COMMENTS
+    code = comments.sub(" ", code or "")
+    keywords = _KEYWORDS.get(language, set())
+    tokens = []
+    for match in _TOKENS.finditer(code):
+        kind = match.lastgroup
+        if kind == "name":
+            value = match.group()
+            tokens.append(value if value in keywords else "V")
+        elif kind == "number":
+            tokens.append("N")
+        elif kind == "string":
+            tokens.append("S")
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def _hash_kgram(tokens: List[str]) -> int:
+    digest = hashlib.blake2b("\x00".join(tokens).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & _FINGERPRINT_MASK
+
+
+def winnow(tokens: List[str], k: int = SIMILARITY_KGRAM, window: int = SIMILARITY_WINDOW) -> Set[int]:
+    """
+    Winnowing fingerprints of a token stream (Schleimer, Wilkerson and Aiken).
+
+    Every window of consecutive k-gram hashes contributes its minimum, so any
+    shared run of at least window + k - 1 tokens yields a shared fingerprint
+    while only about 2 / (window + 1) of the hashes are kept.
+    """
+    if not tokens:
+        return set()
+    if len(tokens) < k:
+        return {_hash_kgram(tokens)}
+    hashes = [_hash_kgram(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return {min(hashes)}
+    fingerprints = set()
+    selected = -1
+    for start in range(len(hashes) - window + 1):
+        # Rightmost minimum, so a window sliding past an unchanged minimum selects nothing new
+        position = min(range(start, start + window), key=lambda i: (hashes[i], -i))
+        if position != selected:
+            fingerprints.add(hashes[position])
+            selected = position
+    return fingerprints
+
+
+def fingerprint(code: str, language: str) -> Set[int]:
+    return winnow(tokenize(code, language))
+
+
+def ensure_similarity_columns():
+    """Add the fingerprint count column to code submission tables created before the similarity index."""
+    add_missing_columns((CodeSubmission.fingerprint_count,))
+
+
+def _count_frequencies(db: Session, fingerprints: List[int]):
+    rows = [{"fingerprint": f, "submissions": 1} for f in fingerprints]
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        statement = mysql_insert(FingerprintFrequency)
+        db.execute(statement.on_duplicate_key_update(submissions=FingerprintFrequency.submissions + 1), rows)
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        statement = sqlite_insert(FingerprintFrequency).on_conflict_do_update(
+            index_elements=[FingerprintFrequency.fingerprint],
+            set_={"submissions": FingerprintFrequency.submissions + 1}
+        )
+        db.execute(statement, rows)
+    else:
+        existing = {r.fingerprint for r in db.query(FingerprintFrequency.fingerprint).filter(FingerprintFrequency.fingerprint.in_(fingerprints))}
+        if existing:
+            db.query(FingerprintFrequency).filter(FingerprintFrequency.fingerprint.in_(existing)).update(
+                {FingerprintFrequency.submissions: FingerprintFrequency.submissions + 1}, synchronize_session=False
+            )
+        new_rows = [row for row in rows if row["fingerprint"] not in existing]
+        if new_rows:
+            db.execute(insert(FingerprintFrequency), new_rows)
+
+
+def unindex_submissions(db: Session, submission_ids: List[int]):
+    """
+    Delete the postings of submissions and take them out of the fingerprint frequencies.
+
+    Runs in the caller's transaction, so rows archived and later indexed
+    again by the backfill are counted once.
+    """
+    counts = db.query(CodeFingerprint.fingerprint, func.count()).filter(
+        CodeFingerprint.submission_id.in_(submission_ids)
+    ).group_by(CodeFingerprint.fingerprint).all()
+    by_count: Dict[int, List[int]] = {}
+    for fp, count in counts:
+        by_count.setdefault(count, []).append(fp)
+    for count, fingerprints in by_count.items():
+        for start in range(0, len(fingerprints), SIMILARITY_UPDATE_BATCH):
+            batch = FingerprintFrequency.fingerprint.in_(fingerprints[start:start + SIMILARITY_UPDATE_BATCH])
+            db.query(FingerprintFrequency).filter(batch).update(
+                {FingerprintFrequency.submissions: FingerprintFrequency.submissions - count}, synchronize_session=False
+            )
+            db.query(FingerprintFrequency).filter(batch, FingerprintFrequency.submissions <= 0).delete(synchronize_session=False)
+    db.query(CodeFingerprint).filter(CodeFingerprint.submission_id.in_(submission_ids)).delete(synchronize_session=False)
+
+
+def index_submission(db: Session, submission: CodeSubmission, code: str, question_id: Optional[int]) -> int:
+    """
+    Add a submission's fingerprints to the inverted index; returns how many.
+
+    Runs in the caller's transaction. Resubmitting code already indexed for
+    the same session question is skipped (counted as 0), so repeated runs of
+    unchanged code do not crowd the index.
+    """
+    if submission.code_hash:
+        duplicate = db.query(CodeSubmission.id).filter(
+            CodeSubmission.session_question_id == submission.session_question_id,
+            CodeSubmission.code_hash == submission.code_hash,
+            CodeSubmission.fingerprint_count.isnot(None),
+            CodeSubmission.id != submission.id
+        ).first()
+        if duplicate is not None:
+            submission.fingerprint_count = 0
+            return 0
+    fingerprints = sorted(fingerprint(code, submission.language))
+    if fingerprints:
+        db.execute(insert(CodeFingerprint), [
+            {"fingerprint": f, "submission_id": submission.id, "question_id": question_id} for f in fingerprints
+        ])
+        _count_frequencies(db, fingerprints)
+    submission.fingerprint_count = len(fingerprints)
+    return len(fingerprints)
+
+
+def submission_code(db: Session, submission: CodeSubmission) -> str:
+    return blob_store.get_text(db, submission.code_hash) if submission.code_hash else (submission.code or "")
+
+
+def find_similar(db: Session, submission_id: int, k: int = 10, same_question: bool = True) -> Optional[List[Dict]]:
+    """
+    Top-k submissions from other sessions sharing the most fingerprints with a submission.
+
+    Only the posting lists of the submission's own fingerprints are read,
+    skipping fingerprints found in more than SIMILARITY_MAX_POSTINGS
+    submissions, so the cost does not grow with the number of unrelated
+    submissions. Each other session question is reported once, with its
+    most similar submission. Returns None when the submission does not exist.
+    """
+    row = db.query(CodeSubmission, SessionQuestion.session_id, SessionQuestion.question_id).outerjoin(
+        SessionQuestion, SessionQuestion.id == CodeSubmission.session_question_id
+    ).filter(CodeSubmission.id == submission_id).first()
+    if row is None:
+        return None
+    submission, session_id, question_id = row
+
+    fingerprints = [r.fingerprint for r in db.query(CodeFingerprint.fingerprint).filter(CodeFingerprint.submission_id == submission_id)]
+    if not fingerprints:
+        # Skipped as a rerun, not backfilled yet, or archived and restored
+        fingerprints = sorted(fingerprint(submission_code(db, submission), submission.language))
+    if not fingerprints:
+        return []
+
+    common = {
+        r.fingerprint for r in db.query(FingerprintFrequency.fingerprint).filter(
+            FingerprintFrequency.fingerprint.in_(fingerprints),
+            FingerprintFrequency.submissions > SIMILARITY_MAX_POSTINGS
+        )
+    }
+    informative = [f for f in fingerprints if f not in common]
+    if not informative:
+        return []
+
+    shared = func.count(CodeFingerprint.fingerprint).label("shared")
+    query = db.query(CodeFingerprint.submission_id, shared).filter(
+        CodeFingerprint.fingerprint.in_(informative),
+        CodeFingerprint.submission_id != submission_id
+    )
+    if same_question and question_id is not None:
+        query = query.filter(CodeFingerprint.question_id == question_id)
+    candidates = query.group_by(CodeFingerprint.submission_id).order_by(shared.desc()).limit(k * SIMILARITY_CANDIDATES).all()
+    if not candidates:
+        return []
+
+    shared_counts = {c.submission_id: c.shared for c in candidates}
+    details = db.query(
+        CodeSubmission.id, CodeSubmission.session_question_id, CodeSubmission.language,
+        CodeSubmission.fingerprint_count, CodeSubmission.created_at,
+        SessionQuestion.session_id, SessionQuestion.question_id
+    ).outerjoin(
+        SessionQuestion, SessionQuestion.id == CodeSubmission.session_question_id
+    ).filter(CodeSubmission.id.in_(shared_counts)).all()
+
+    best: Dict[int, Dict] = {}
+    for detail in details:
+        if session_id is not None and detail.session_id == session_id:
+            continue
+        count = shared_counts[detail.id]
+        union = len(fingerprints) + (detail.fingerprint_count or count) - count
+        similarity = count / union if union else 0.0
+        if similarity < SIMILARITY_MIN_SCORE:
+            continue
+        key = detail.session_question_id if detail.session_question_id is not None else -detail.id
+        if key in best and best[key]["similarity"] >= similarity:
+            continue
+        best[key] = {
+            "submission_id": detail.id,
+            "session_id": detail.session_id,
+            "session_question_id": detail.session_question_id,
+            "question_id": detail.question_id,
+            "language": detail.language,
+            "shared_fingerprints": count,
+            "similarity": round(similarity, 4),
+            "overlap": round(count / len(informative), 4),  # share of this submission found in the other
+            "created_at": detail.created_at.isoformat() if detail.created_at else None,
+        }
+    return sorted(best.values(), key=lambda r: r["similarity"], reverse=True)[:k]
+
+
+def backfill(db: Session, batch_size: int = 500) -> int:
+    """Index submissions stored before the similarity index, oldest first; returns how many were indexed."""
+    indexed = 0
+    while True:
+        rows = db.query(CodeSubmission, SessionQuestion.question_id).outerjoin(
+            SessionQuestion, SessionQuestion.id == CodeSubmission.session_question_id
+        ).filter(CodeSubmission.fingerprint_count.is_(None)).order_by(CodeSubmission.id).limit(batch_size).all()
+        if not rows:
+            break
+        for submission, question_id in rows:
+            index_submission(db, submission, submission_code(db, submission), question_id)
+        db.commit()
+        indexed += len(rows)
+        logger.info(f"Indexed {indexed} code submissions")
+    return indexed
+
+
+if __name__ == "__main__":
+    # Usage: python code_similarity.py  (indexes code submissions stored before the similarity index)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from database import Base, engine, SessionLocal
+    Base.metadata.create_all(bind=engine)
+    ensure_similarity_columns()
+    session = SessionLocal()
+    try:
+        backfill(session)
+    finally:
+        session.close()
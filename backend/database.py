@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON, text
+from sqlalchemy import create_engine, inspect, Column, Integer, String, DateTime, JSON, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 import os
 import logging
@@ -19,34 +20,57 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "4590")
 DB_NAME = os.getenv("DB_NAME", "interviewxpert")
 DB_PORT = os.getenv("DB_PORT", "3306")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 
-# Create database URL
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Threads serving sync routes and run_in_threadpool calls (anyio's default limiter size)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "40"))
 
-logger.info(f"Connecting to MySQL database at {DB_HOST}:{DB_PORT} with user {DB_USER}")
+# Create database URL; DATABASE_URL overrides the MySQL settings (e.g. sqlite:///bench.db for benchmarks)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+if IS_SQLITE:
+    logger.info(f"Connecting to SQLite database at {SQLALCHEMY_DATABASE_URL}")
+else:
+    logger.info(f"Connecting to MySQL database at {DB_HOST}:{DB_PORT} with user {DB_USER}")
 
 # Create engine with proper error handling
 try:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        pool_pre_ping=True,  # Enable connection health checks
-        pool_recycle=3600,   # Recycle connections after 1 hour
-        pool_size=5,         # Set a reasonable pool size
-        max_overflow=10,     # Allow some overflow connections
-        echo=False           # Set to True for SQL query logging
-    )
+    if IS_SQLITE:
+        engine = create_engine(
+            SQLALCHEMY_DATABASE_URL,
+            connect_args={"check_same_thread": False},  # Sessions are used from threadpool workers
+            echo=False
+        )
+    else:
+        engine = create_engine(
+            SQLALCHEMY_DATABASE_URL,
+            pool_pre_ping=True,  # Enable connection health checks
+            pool_recycle=3600,   # Recycle connections after 1 hour
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            echo=False           # Set to True for SQL query logging
+        )
     
     # Test the connection
     with engine.connect() as conn:
         result = conn.execute(text("SELECT 1"))
         result.fetchone()
-    logger.info(f"Successfully connected to MySQL database at {DB_HOST}:{DB_PORT}")
+    logger.info(f"Successfully connected to database ({engine.dialect.name})")
 except Exception as e:
-    logger.error(f"Failed to connect to MySQL: {str(e)}")
+    logger.error(f"Failed to connect to database: {str(e)}")
     raise
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def max_connections() -> int:
+    """Connections the engine's pool opens at most: its size plus overflow."""
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        return pool.size() + pool._max_overflow  # QueuePool has no public accessor for the overflow limit
+    return DB_POOL_SIZE + DB_MAX_OVERFLOW
+
 Base = declarative_base()
 
 def get_db():
@@ -54,4 +78,34 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def add_missing_columns(columns):
+    """
+    Add model columns, and the indexes on them, that create_all skips on tables that already exist.
+
+    Added columns are nullable and have no server default, so existing rows read as NULL.
+    """
+    existing = {}
+    for column in columns:
+        column = column.expression  # accepts Column objects or mapped attributes
+        table = column.table
+        if table.name not in existing:
+            existing[table.name] = {c["name"] for c in inspect(engine).get_columns(table.name)}
+        if column.name in existing[table.name]:
+            continue
+        try:
+            with engine.begin() as conn:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            existing[table.name].add(column.name)
+            logger.info(f"Added column {table.name}.{column.name}")
+        except Exception as e:
+            logger.error(f"Error adding column {table.name}.{column.name}: {str(e)}")
+            continue
+        for index in table.indexes:
+            if column.name in index.columns:
+                try:
+                    index.create(bind=engine, checkfirst=True)
+                except Exception as e:
+                    logger.error(f"Error creating index {index.name}: {str(e)}")
@@ -0,0 +1,306 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import EditTimelineChunk, EditTimelineSegment
+from blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+# Edit timeline configuration from environment variables
+TIMELINE_ENABLED = os.environ.get("TIMELINE_ENABLED", "true").lower() == "true"
+TIMELINE_CHUNK_OPS = int(os.environ.get("TIMELINE_CHUNK_OPS", "512"))  # edits per chunk before a new snapshot
+TIMELINE_CHUNK_BYTES = int(os.environ.get("TIMELINE_CHUNK_BYTES", "32768"))  # encoded bytes per chunk
+TIMELINE_MAX_EVENTS = int(os.environ.get("TIMELINE_MAX_EVENTS", "5000"))  # events returned by one replay request
+
+# A decoded edit: (Unix time in ms, start, deleted characters, inserted text)
+Edit = Tuple[int, int, int, str]
+
+
+def encode_varint(value: int, out: bytearray):
+    """Append an unsigned LEB128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 varint at pos; returns the value and the next position."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_edit(out: bytearray, delta_ms: int, start: int, deleted: int, text: str):
+    """
+    Append one edit to an operation stream.
+
+    Each edit is four varints (milliseconds since the previous edit, start
+    offset, deleted characters, inserted UTF-8 bytes) followed by the
+    inserted bytes, so a keystroke typically costs 5 bytes.
+    """
+    encoded = text.encode("utf-8")
+    encode_varint(delta_ms, out)
+    encode_varint(start, out)
+    encode_varint(deleted, out)
+    encode_varint(len(encoded), out)
+    out += encoded
+
+
+def decode_edits(data: bytes, start_ms: int) -> Iterator[Edit]:
+    """Yield the edits of an operation stream whose times are relative to start_ms."""
+    pos = 0
+    at = start_ms
+    while pos < len(data):
+        delta, pos = decode_varint(data, pos)
+        start, pos = decode_varint(data, pos)
+        deleted, pos = decode_varint(data, pos)
+        length, pos = decode_varint(data, pos)
+        text = data[pos:pos + length].decode("utf-8")
+        pos += length
+        at += delta
+        yield at, start, deleted, text
+
+
+def apply_edit(code: str, start: int, deleted: int, text: str) -> str:
+    return code[:start] + text + code[start + deleted:]
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class TimelineChunk:
+    """A chunk being recorded: the code it starts from and the edits appended since."""
+
+    __slots__ = ("row_id", "start_ms", "last_ms", "start_revision", "end_revision", "snapshot",
+                 "ops", "op_count", "persisted_ops", "persisted_bytes", "sealed")
+
+    def __init__(self, snapshot: str, revision: int, at_ms: int):
+        self.row_id: Optional[int] = None
+        self.start_ms = at_ms
+        self.last_ms = at_ms
+        self.start_revision = revision
+        self.end_revision = revision
+        self.snapshot = snapshot
+        self.ops = bytearray()
+        self.op_count = 0
+        self.persisted_ops = -1  # op count last written; -1 until the row exists
+        self.persisted_bytes = 0  # length of ops already written as segments
+        self.sealed = False
+
+
+class EditTimeline:
+    """
+    Records the code edits of each session question for replay.
+
+    record() runs on the autosave path and only appends a few varints to the
+    open chunk in memory. persist() is called when autosave flushes: it
+    creates the row of a new chunk with its snapshot blob, then appends only
+    the edits recorded since the last flush as a segment, so the bytes
+    written grow linearly with the edits. A chunk is sealed after
+    TIMELINE_CHUNK_OPS edits or TIMELINE_CHUNK_BYTES, and the next one starts
+    from a snapshot of the code, so seeking decodes at most one chunk.
+    """
+
+    def __init__(self, enabled: bool = TIMELINE_ENABLED):
+        self.enabled = enabled
+        self._chunks: Dict[int, List[TimelineChunk]] = {}  # session question id -> unpersisted or open chunks
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()  # one writer at a time, so a chunk row is created once
+        self.stats = {"edits": 0, "chunks": 0, "bytes": 0}
+
+    def _open_chunk(self, session_question_id: int, code: str, revision: int, at_ms: int) -> TimelineChunk:
+        chunks = self._chunks.setdefault(session_question_id, [])
+        if chunks and not chunks[-1].sealed:
+            return chunks[-1]
+        chunk = TimelineChunk(code, revision, at_ms)
+        chunks.append(chunk)
+        self.stats["chunks"] += 1
+        return chunk
+
+    def record(self, session_question_id: int, code_before: str, patches: Iterable, revision: int, at_ms: Optional[int] = None):
+        """Append the patches that turned code_before into revision."""
+        if not self.enabled:
+            return
+        at_ms = at_ms if at_ms is not None else now_ms()
+        with self._lock:
+            chunk = self._open_chunk(session_question_id, code_before, revision - 1, at_ms)
+            size, count = len(chunk.ops), chunk.op_count
+            for patch in patches:
+                encode_edit(chunk.ops, max(0, at_ms - chunk.last_ms), patch.start, patch.end - patch.start, patch.text)
+                chunk.last_ms = max(chunk.last_ms, at_ms)
+                chunk.op_count += 1
+            chunk.end_revision = revision
+            self.stats["edits"] += chunk.op_count - count
+            self.stats["bytes"] += len(chunk.ops) - size
+            if chunk.op_count >= TIMELINE_CHUNK_OPS or len(chunk.ops) >= TIMELINE_CHUNK_BYTES:
+                chunk.sealed = True
+
+    def reset(self, session_question_id: int, code: str, revision: int, at_ms: Optional[int] = None):
+        """Start a new chunk from code that replaced the previous code outright."""
+        if not self.enabled:
+            return
+        at_ms = at_ms if at_ms is not None else now_ms()
+        with self._lock:
+            chunks = self._chunks.setdefault(session_question_id, [])
+            if chunks:
+                chunks[-1].sealed = True
+            self._open_chunk(session_question_id, code, revision, at_ms)
+
+    def persist(self, db: Session, session_question_id: int):
+        """Write a session question's new chunks and the edits appended since; the open chunk stays in memory to keep growing."""
+        with self._persist_lock:
+            with self._lock:
+                pending = [
+                    (chunk, chunk.op_count, bytes(chunk.ops[chunk.persisted_bytes:]), len(chunk.ops),
+                     chunk.last_ms, chunk.end_revision)
+                    for chunk in self._chunks.get(session_question_id, [])
+                    if chunk.persisted_ops != chunk.op_count
+                ]
+            if not pending:
+                return
+            next_seq = None
+            written = []
+            for chunk, op_count, new_ops, size, last_ms, end_revision in pending:
+                values = {"end_ms": last_ms, "end_revision": end_revision, "op_count": op_count}
+                row_id = chunk.row_id
+                if row_id is None:
+                    if next_seq is None:
+                        last_seq = db.query(func.max(EditTimelineChunk.seq)).filter(
+                            EditTimelineChunk.session_question_id == session_question_id
+                        ).scalar()
+                        next_seq = (last_seq or 0) + 1
+                    row = EditTimelineChunk(
+                        session_question_id=session_question_id, seq=next_seq, start_ms=chunk.start_ms,
+                        start_revision=chunk.start_revision, snapshot_hash=blob_store.put_text(db, chunk.snapshot),
+                        **values
+                    )
+                    db.add(row)
+                    db.flush()
+                    row_id = row.id
+                    next_seq += 1
+                else:
+                    db.query(EditTimelineChunk).filter(EditTimelineChunk.id == row_id).update(values, synchronize_session=False)
+                if new_ops:
+                    db.add(EditTimelineSegment(chunk_id=row_id, end_op=op_count, ops=new_ops))
+                written.append((chunk, op_count, size, row_id))
+            db.commit()
+
+            with self._lock:
+                for chunk, op_count, size, row_id in written:
+                    chunk.row_id = row_id
+                    chunk.persisted_ops = op_count
+                    chunk.persisted_bytes = size
+                    chunk.snapshot = None  # stored; only needed to create the row
+                chunks = self._chunks.get(session_question_id, [])
+                # Keep only chunks that can still grow or were not written yet
+                chunks[:] = [c for c in chunks if not (c.sealed and c.persisted_ops == c.op_count)]
+                if not chunks:
+                    self._chunks.pop(session_question_id, None)
+
+    def close(self, session_question_id: int):
+        """Stop recording into a session question's open chunk once it is written; the next edit starts a new one."""
+        with self._lock:
+            chunks = self._chunks.get(session_question_id)
+            if chunks and all(c.persisted_ops == c.op_count for c in chunks):
+                del self._chunks[session_question_id]
+
+
+def timeline_chunks(db: Session, session_question_id: int) -> List[EditTimelineChunk]:
+    return db.query(EditTimelineChunk).filter(
+        EditTimelineChunk.session_question_id == session_question_id
+    ).order_by(EditTimelineChunk.start_ms, EditTimelineChunk.seq).all()
+
+
+def chunk_edits(db: Session, chunk: EditTimelineChunk) -> Iterator[Edit]:
+    data = (blob_store.get(db, chunk.ops_hash) or b"") if chunk.ops_hash else b""
+    segments = db.query(EditTimelineSegment.ops).filter(
+        EditTimelineSegment.chunk_id == chunk.id
+    ).order_by(EditTimelineSegment.end_op)
+    return decode_edits(data + b"".join(row.ops for row in segments), chunk.start_ms)
+
+
+def delete_timeline_rows(db: Session, session_question_ids):
+    """Delete the recorded chunks and segments of the given session questions (the caller commits)."""
+    chunk_ids = select(EditTimelineChunk.id).where(EditTimelineChunk.session_question_id.in_(session_question_ids))
+    db.query(EditTimelineSegment).filter(EditTimelineSegment.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+    db.query(EditTimelineChunk).filter(
+        EditTimelineChunk.session_question_id.in_(session_question_ids)
+    ).delete(synchronize_session=False)
+
+
+def _event(edit: Edit) -> Dict:
+    at, start, deleted, text = edit
+    return {"at_ms": at, "start": start, "deleted": deleted, "text": text}
+
+
+def seek(db: Session, session_question_id: int, at_ms: Optional[int] = None, events: int = 0) -> Optional[Dict]:
+    """
+    Reconstruct the code at at_ms (after the latest edit when None).
+
+    Loads the last chunk starting at or before at_ms and applies its edits up
+    to at_ms to its snapshot. Up to `events` of the following edits are
+    returned so a player can continue from there; a chunk that starts from
+    a full replacement of the code contributes a snapshot event first.
+    Returns None when nothing was recorded before at_ms.
+    """
+    query = db.query(EditTimelineChunk).filter(EditTimelineChunk.session_question_id == session_question_id)
+    if at_ms is not None:
+        query = query.filter(EditTimelineChunk.start_ms <= at_ms)
+    chunk = query.order_by(EditTimelineChunk.start_ms.desc(), EditTimelineChunk.seq.desc()).first()
+    if chunk is None:
+        return None
+
+    code = blob_store.get_text(db, chunk.snapshot_hash) or ""
+    applied = 0
+    upcoming: List[Dict] = []
+    edits = chunk_edits(db, chunk)
+    for edit in edits:
+        if at_ms is not None and edit[0] > at_ms:
+            if events:
+                upcoming.append(_event(edit))
+            break
+        code = apply_edit(code, *edit[1:])
+        applied += 1
+
+    if len(upcoming) < events:
+        # Finish this chunk, then decode later chunks only as far as needed
+        upcoming.extend(_event(edit) for _, edit in zip(range(events - len(upcoming)), edits))
+        previous_revision = chunk.end_revision
+        later = db.query(EditTimelineChunk).filter(
+            EditTimelineChunk.session_question_id == session_question_id,
+            EditTimelineChunk.seq > chunk.seq
+        ).order_by(EditTimelineChunk.seq)
+        for following in later.yield_per(16):
+            if len(upcoming) >= events:
+                break
+            if following.start_revision != previous_revision:
+                upcoming.append({"at_ms": following.start_ms, "snapshot": blob_store.get_text(db, following.snapshot_hash) or ""})
+            following_edits = chunk_edits(db, following)
+            upcoming.extend(_event(edit) for _, edit in zip(range(events - len(upcoming)), following_edits))
+            previous_revision = following.end_revision
+
+    return {
+        "at_ms": at_ms if at_ms is not None else chunk.end_ms,
+        "code": code,
+        "chunk": chunk.seq,
+        "chunk_start_ms": chunk.start_ms,
+        "edits_applied": applied,
+        "events": upcoming[:events],
+    }
+
+
+# Create a singleton instance
+edit_timeline = EditTimeline()
@@ -0,0 +1,233 @@
+import os
+import random
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Emotion model configuration from environment variables
+EMOTION_MODEL_BACKEND = os.environ.get("EMOTION_MODEL_BACKEND", "demo")  # demo, onnx or opencv
+EMOTION_MODEL_PATH = os.environ.get("EMOTION_MODEL_PATH", "models/emotion-ferplus-8.onnx")
+EMOTION_MODEL_QUANTIZED = os.environ.get("EMOTION_MODEL_QUANTIZED", "false").lower() == "true"
+EMOTION_MODEL_QUANTIZED_PATH = os.environ.get("EMOTION_MODEL_QUANTIZED_PATH", "")  # defaults to <model>.int8.onnx
+EMOTION_MODEL_THREADS = int(os.environ.get("EMOTION_MODEL_THREADS", "1"))  # ONNX Runtime intra-op threads per worker
+# Process-wide cv2.setNumThreads for the opencv backend; unset leaves OpenCV's default for all cv2 calls
+EMOTION_MODEL_OPENCV_THREADS = os.environ.get("EMOTION_MODEL_OPENCV_THREADS")
+EMOTION_MODEL_INPUT_SIZE = int(os.environ.get("EMOTION_MODEL_INPUT_SIZE", "64"))
+EMOTION_MODEL_INPUT_SCALE = float(os.environ.get("EMOTION_MODEL_INPUT_SCALE", "1.0"))
+EMOTION_MODEL_LABELS = os.environ.get(
+    "EMOTION_MODEL_LABELS",
+    "neutral,happiness,surprise,sadness,anger,disgust,fear,contempt"
+).split(",")
+
+# Position of each model label on the valence/arousal circumplex, both in [-1, 1]
+LABEL_AFFECT = {
+    "neutral": (0.0, -0.2),
+    "happiness": (0.9, 0.5),
+    "surprise": (0.3, 0.9),
+    "sadness": (-0.7, -0.5),
+    "anger": (-0.7, 0.8),
+    "disgust": (-0.8, 0.3),
+    "fear": (-0.6, 0.7),
+    "contempt": (-0.3, 0.1),
+}
+
+# Model labels mapped onto the EmotionType values used by the API
+LABEL_TO_EMOTION = {
+    "neutral": "neutral",
+    "happiness": "happy",
+    "surprise": "neutral",
+    "sadness": "uncomfortable",
+    "anger": "uncomfortable",
+    "disgust": "uncomfortable",
+    "fear": "uncomfortable",
+    "contempt": "uncomfortable",
+}
+
+
+class EmotionModel(ABC):
+    """Base class for emotion model backends. Subclasses score batches of face crops."""
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, faces: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Score a batch of grayscale face crops.
+
+        Returns:
+            One dict per face with attention_level, positivity_level,
+            arousal_level and dominant_emotion, matching the UserState schema
+        """
+
+
+class DemoEmotionModel(EmotionModel):
+    """Random metrics biased toward positive emotions, used when no model is configured."""
+
+    name = "demo"
+
+    def predict(self, faces: List[np.ndarray]) -> List[Dict[str, Any]]:
+        emotions = ["happy", "confident", "neutral", "uncomfortable"]
+        weights = [0.4, 0.3, 0.2, 0.1]  # Bias toward positive emotions for demo
+        return [
+            {
+                "attention_level": random.uniform(0.7, 1.0),
+                "positivity_level": random.uniform(0.6, 0.9),
+                "arousal_level": random.uniform(0.65, 0.95),
+                "dominant_emotion": random.choices(emotions, weights=weights, k=1)[0],
+            }
+            for _ in faces
+        ]
+
+
+class _ClassifierModel(EmotionModel):
+    """Shared preprocessing and postprocessing for image classifiers over emotion labels."""
+
+    def __init__(self, input_size: int = EMOTION_MODEL_INPUT_SIZE, labels: Optional[List[str]] = None):
+        self.input_size = input_size
+        self.labels = labels or EMOTION_MODEL_LABELS
+
+    def _preprocess(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Resize crops to the model input and stack them into an NCHW float batch."""
+        size = (self.input_size, self.input_size)
+        batch = np.empty((len(faces), 1, self.input_size, self.input_size), dtype=np.float32)
+        for i, face in enumerate(faces):
+            batch[i, 0] = cv2.resize(face, size, interpolation=cv2.INTER_AREA)
+        if EMOTION_MODEL_INPUT_SCALE != 1.0:
+            batch *= EMOTION_MODEL_INPUT_SCALE
+        return batch
+
+    def _postprocess(self, logits: np.ndarray) -> List[Dict[str, Any]]:
+        """Turn per-label scores into UserState metrics."""
+        logits = logits.reshape(logits.shape[0], -1)[:, :len(self.labels)]
+        shifted = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(shifted)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        affect = np.array([LABEL_AFFECT.get(label, (0.0, 0.0)) for label in self.labels], dtype=np.float32)
+        valence, arousal = (probs @ affect).T
+        # Confident (low entropy) predictions on a detected face read as focused attention
+        entropy = -(probs * np.log(probs + 1e-9)).sum(axis=1) / np.log(len(self.labels))
+
+        results = []
+        for i in range(probs.shape[0]):
+            positivity = float(np.clip((valence[i] + 1) / 2, 0, 1))
+            label = self.labels[int(probs[i].argmax())]
+            dominant = LABEL_TO_EMOTION.get(label, "neutral")
+            if dominant == "neutral" and positivity >= 0.55:
+                dominant = "confident"
+            results.append({
+                "attention_level": float(np.clip(0.5 + 0.5 * (1 - entropy[i]), 0, 1)),
+                "positivity_level": positivity,
+                "arousal_level": float(np.clip((arousal[i] + 1) / 2, 0, 1)),
+                "dominant_emotion": dominant,
+            })
+        return results
+
+
+class OnnxEmotionModel(_ClassifierModel):
+    """ONNX Runtime CPU inference, optionally on an int8-quantized model."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, threads: int = EMOTION_MODEL_THREADS, quantized: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+
+        if quantized:
+            model_path = _ensure_quantized_model(model_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = model_path
+        logger.info(f"Loaded ONNX emotion model from {model_path} with {threads} intra-op threads")
+
+    def predict(self, faces: List[np.ndarray]) -> List[Dict[str, Any]]:
+        if not faces:
+            return []
+        logits = self.session.run(None, {self.input_name: self._preprocess(faces)})[0]
+        return self._postprocess(np.asarray(logits, dtype=np.float32))
+
+
+class OpenCVDnnEmotionModel(_ClassifierModel):
+    """OpenCV DNN inference on an ONNX model, for deployments without onnxruntime."""
+
+    name = "opencv"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        if threads is not None:
+            # cv2 has no per-net setting; this also applies to face detection and decoding
+            cv2.setNumThreads(threads)
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self._lock = threading.Lock()  # a Net holds per-call state
+        self.model_path = model_path
+        logger.info(f"Loaded OpenCV DNN emotion model from {model_path} with {cv2.getNumThreads()} threads")
+
+    def predict(self, faces: List[np.ndarray]) -> List[Dict[str, Any]]:
+        if not faces:
+            return []
+        batch = self._preprocess(faces)
+        with self._lock:
+            self.net.setInput(batch)
+            logits = self.net.forward()
+        return self._postprocess(logits)
+
+
+def _ensure_quantized_model(model_path: str) -> str:
+    """Return the int8 model path, quantizing the float model with dynamic quantization if needed."""
+    quantized_path = EMOTION_MODEL_QUANTIZED_PATH or model_path.replace(".onnx", ".int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info(f"Quantizing {model_path} to int8 at {quantized_path}")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def load_emotion_model(
+    backend: str = EMOTION_MODEL_BACKEND,
+    model_path: str = EMOTION_MODEL_PATH,
+    threads: int = EMOTION_MODEL_THREADS,
+    quantized: bool = EMOTION_MODEL_QUANTIZED,
+    opencv_threads: Optional[int] = int(EMOTION_MODEL_OPENCV_THREADS) if EMOTION_MODEL_OPENCV_THREADS else None,
+) -> EmotionModel:
+    """Create the configured backend, falling back to the demo model if it cannot be loaded."""
+    try:
+        if backend == "onnx":
+            return OnnxEmotionModel(model_path, threads=threads, quantized=quantized)
+        if backend == "opencv":
+            return OpenCVDnnEmotionModel(model_path, threads=opencv_threads)
+        if backend != "demo":
+            logger.warning(f"Unknown emotion model backend: {backend}, using demo model")
+    except Exception as e:
+        logger.error(f"Failed to load {backend} emotion model from {model_path}: {str(e)}")
+        logger.warning("Falling back to demo emotion model")
+    return DemoEmotionModel()
+
+
+# Model loaded once per worker process, on first use
+_emotion_model: Optional[EmotionModel] = None
+_emotion_model_lock = threading.Lock()
+
+
+def get_emotion_model() -> EmotionModel:
+    """Return the process-wide emotion model, loading it on first use."""
+    global _emotion_model
+    if _emotion_model is None:
+        with _emotion_model_lock:
+            if _emotion_model is None:
+                _emotion_model = load_emotion_model()
+    return _emotion_model
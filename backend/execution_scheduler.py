@@ -0,0 +1,262 @@
+import os
+import math
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from database import WORKER_THREADS, max_connections
+from instrumentation import execution_queue_wait
+
+logger = logging.getLogger(__name__)
+
+# Execution scheduler configuration from environment variables
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_MAX_CONCURRENT = int(os.environ.get("SCHEDULER_MAX_CONCURRENT", "4"))  # evaluations running against Judge0 at once
+SCHEDULER_SESSION_INFLIGHT = int(os.environ.get("SCHEDULER_SESSION_INFLIGHT", "1"))  # running evaluations per session
+SCHEDULER_SESSION_QUEUE = int(os.environ.get("SCHEDULER_SESSION_QUEUE", "3"))  # waiting evaluations per session and priority
+# Waiting evaluations overall. Each blocks a worker thread (but no database connection) while it waits,
+# so by default they take at most a quarter of the threads and stay below the connection pool size
+SCHEDULER_MAX_QUEUE = int(os.environ.get("SCHEDULER_MAX_QUEUE", str(max(1, min(WORKER_THREADS // 4, max_connections() - SCHEDULER_MAX_CONCURRENT)))))
+SCHEDULER_QUEUE_TIMEOUT = float(os.environ.get("SCHEDULER_QUEUE_TIMEOUT", "60"))  # seconds an evaluation may wait for a slot
+
+# Priority classes, highest first: a final submission is dispatched before any ad-hoc run
+PRIORITY_CLASSES = ("submit", "run")
+PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+
+
+class SchedulerRejected(Exception):
+    """An evaluation was not admitted, or waited too long; the client should retry after retry_after seconds."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ExecutionTicket:
+    """One evaluation waiting for, or holding, an execution slot."""
+
+    __slots__ = ("session_key", "priority", "cost", "start_tag", "seq", "granted",
+                 "enqueued_at", "started_at", "queued_position")
+
+    def __init__(self, session_key: str, priority: str, cost: float, start_tag: float, seq: int):
+        self.session_key = session_key
+        self.priority = priority
+        self.cost = cost
+        self.start_tag = start_tag
+        self.seq = seq
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.queued_position = 0  # position when enqueued; 0 when dispatched immediately
+
+    @property
+    def waited(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+
+class SessionShare:
+    """A session's scheduling state; dropped as soon as it has nothing running or waiting."""
+
+    __slots__ = ("finish_tag", "running", "waiting")
+
+    def __init__(self):
+        self.finish_tag = 0.0
+        self.running = 0
+        self.waiting = 0
+
+
+class ExecutionScheduler:
+    """
+    Fair-share admission of code evaluations to the execution backend.
+
+    Evaluations are queued per session and dispatched by start-time fair
+    queuing: each one is tagged with the virtual time at which its session's
+    earlier evaluations finish, charged by the number of test cases it runs.
+    A session that floods the queue pushes only its own tags ahead, so a
+    candidate running their first test starts at the current virtual time
+    and goes before the backlog. Priority classes are strict ("submit"
+    before "run"), at most SCHEDULER_SESSION_INFLIGHT evaluations per session
+    run at once, and SCHEDULER_MAX_CONCURRENT bounds them overall.
+
+    Callers are threadpool workers, so waiting blocks on a condition variable.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = SCHEDULER_MAX_CONCURRENT,
+        session_inflight: int = SCHEDULER_SESSION_INFLIGHT,
+        session_queue: int = SCHEDULER_SESSION_QUEUE,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: float = SCHEDULER_QUEUE_TIMEOUT,
+        enabled: bool = SCHEDULER_ENABLED,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.session_inflight = max(1, session_inflight)
+        self.session_queue = session_queue
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._waiting: List[ExecutionTicket] = []
+        self._sessions: Dict[str, SessionShare] = {}
+        self._running = 0
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._service_time = 5.0  # moving average of seconds per evaluation, for Retry-After estimates
+        self.stats = {"dispatched": 0, "queued": 0, "rejected": 0, "timeouts": 0}
+
+    @staticmethod
+    def _order(ticket: ExecutionTicket):
+        return PRIORITY_RANK.get(ticket.priority, len(PRIORITY_CLASSES)), ticket.start_tag, ticket.seq
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._service_time * (len(self._waiting) + 1) / self.max_concurrent))
+
+    def _position(self, ticket: ExecutionTicket) -> int:
+        order = self._order(ticket)
+        return 1 + sum(1 for other in self._waiting if self._order(other) < order)
+
+    def _dispatch(self):
+        """Grant free slots to the first eligible tickets; called with the lock held."""
+        granted = False
+        while self._running < self.max_concurrent:
+            eligible = [t for t in self._waiting if self._sessions[t.session_key].running < self.session_inflight]
+            if not eligible:
+                break
+            ticket = min(eligible, key=self._order)
+            self._waiting.remove(ticket)
+            share = self._sessions[ticket.session_key]
+            share.waiting -= 1
+            share.running += 1
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            ticket.granted = True
+            ticket.started_at = time.monotonic()
+            self.stats["dispatched"] += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def enqueue(self, session_key: str, priority: str = "run", cost: float = 1) -> ExecutionTicket:
+        """
+        Queue an evaluation, dispatching it at once when a slot is free.
+
+        Raises:
+            SchedulerRejected: with 429 when the session already has
+                SCHEDULER_SESSION_QUEUE evaluations of this priority waiting,
+                or 503 when the whole queue is full
+        """
+        with self._cond:
+            share = self._sessions.get(session_key)
+            # Counted per class, so a run backlog never turns away the final submission
+            queued = sum(1 for t in self._waiting if t.session_key == session_key and t.priority == priority) if share else 0
+            if queued >= self.session_queue:
+                self.stats["rejected"] += 1
+                raise SchedulerRejected(
+                    f"{queued} {priority} evaluations are already queued for this session", 429, self._retry_after()
+                )
+            if len(self._waiting) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise SchedulerRejected("The execution queue is full", 503, self._retry_after())
+            if share is None:
+                share = self._sessions[session_key] = SessionShare()
+            start_tag = max(self._virtual_time, share.finish_tag)
+            share.finish_tag = start_tag + max(cost, 1)
+            share.waiting += 1
+            ticket = ExecutionTicket(session_key, priority, max(cost, 1), start_tag, next(self._seq))
+            self._waiting.append(ticket)
+            self._dispatch()
+            if not ticket.granted:
+                ticket.queued_position = self._position(ticket)
+                self.stats["queued"] += 1
+            return ticket
+
+    def wait(self, ticket: ExecutionTicket, timeout: Optional[float] = None):
+        """
+        Block until the ticket holds a slot.
+
+        Raises:
+            SchedulerRejected: with 503 when no slot was granted within the timeout
+        """
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._cond:
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise SchedulerRejected(
+                        f"No execution slot within {self.queue_timeout:g} seconds", 503, self._retry_after()
+                    )
+                self._cond.wait(remaining)
+        execution_queue_wait.observe(ticket.waited, ticket.priority)
+
+    def release(self, ticket: ExecutionTicket):
+        """Free a ticket's slot, or withdraw it from the queue if it never got one."""
+        with self._cond:
+            share = self._sessions.get(ticket.session_key)
+            if ticket.granted:
+                self._running -= 1
+                share.running -= 1
+                elapsed = time.monotonic() - ticket.started_at
+                self._service_time += 0.2 * (elapsed - self._service_time)
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+                share.waiting -= 1
+                if share.finish_tag == ticket.start_tag + ticket.cost:
+                    # Never ran; give back its share unless later tickets were tagged after it
+                    share.finish_tag = ticket.start_tag
+            if share is not None and not share.running and not share.waiting:
+                del self._sessions[ticket.session_key]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_key: str, priority: str = "run", cost: float = 1) -> Iterator[ExecutionTicket]:
+        """Hold an execution slot for the body of a with block; see enqueue() and wait() for the errors raised."""
+        if not self.enabled:
+            ticket = ExecutionTicket(session_key, priority, cost, 0.0, 0)
+            ticket.granted = True
+            ticket.started_at = ticket.enqueued_at
+            yield ticket
+            return
+        ticket = self.enqueue(session_key, priority, cost)
+        try:
+            self.wait(ticket)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def session_status(self, session_key: str) -> Dict:
+        """Queue positions of a session's waiting evaluations, for clients to show while they wait."""
+        with self._cond:
+            share = self._sessions.get(session_key)
+            waiting = sorted((t for t in self._waiting if t.session_key == session_key), key=self._order)
+            return {
+                "running": share.running if share else 0,
+                "waiting": [
+                    {"priority": t.priority, "position": self._position(t), "waited_ms": int(t.waited * 1000)}
+                    for t in waiting
+                ],
+                "queue_length": len(self._waiting),
+                "estimated_wait_seconds": self._retry_after() if waiting else 0,
+            }
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "max_concurrent": self.max_concurrent,
+                "session_inflight": self.session_inflight,
+                "running": self._running,
+                "waiting": len(self._waiting),
+                "sessions": len(self._sessions),
+                "average_service_seconds": round(self._service_time, 3),
+                **self.stats,
+            }
+
+
+# Create a singleton instance
+execution_scheduler = ExecutionScheduler()
@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Face detection configuration from environment variables
+FACE_DETECT_WIDTH = int(os.environ.get("FACE_DETECT_WIDTH", "320"))  # working resolution (pixels wide)
+FACE_DETECT_SCALE_FACTOR = float(os.environ.get("FACE_DETECT_SCALE_FACTOR", "1.2"))
+FACE_DETECT_MIN_NEIGHBORS = int(os.environ.get("FACE_DETECT_MIN_NEIGHBORS", "4"))
+FACE_DETECT_MIN_SIZE_RATIO = float(os.environ.get("FACE_DETECT_MIN_SIZE_RATIO", "0.15"))  # of working width
+FACE_ROI_MARGIN = float(os.environ.get("FACE_ROI_MARGIN", "0.5"))  # expand previous box by 50% per side
+FACE_TRACK_TTL = float(os.environ.get("FACE_TRACK_TTL", "5"))  # seconds before a track goes stale
+FACE_TRACK_MAX_SESSIONS = int(os.environ.get("FACE_TRACK_MAX_SESSIONS", "1000"))
+
+# A face in consecutive webcam frames rarely changes size by more than this factor
+ROI_SIZE_TOLERANCE = 1.5
+
+Box = Tuple[int, int, int, int]
+
+
+class FaceDetector:
+    """
+    Haar cascade face detector tuned for webcam frames.
+
+    Frames are downscaled to a fixed working width before detection. When a
+    session id is given, the last face box for that session is remembered and
+    the next frame is first searched only inside an expanded region around it,
+    falling back to a full-frame scan on a miss.
+    """
+
+    def __init__(
+        self,
+        working_width: int = FACE_DETECT_WIDTH,
+        scale_factor: float = FACE_DETECT_SCALE_FACTOR,
+        min_neighbors: int = FACE_DETECT_MIN_NEIGHBORS,
+        min_size_ratio: float = FACE_DETECT_MIN_SIZE_RATIO,
+        roi_margin: float = FACE_ROI_MARGIN,
+        track_ttl: float = FACE_TRACK_TTL,
+        max_sessions: int = FACE_TRACK_MAX_SESSIONS,
+    ):
+        self.working_width = working_width
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size_ratio = min_size_ratio
+        self.roi_margin = roi_margin
+        self.track_ttl = track_ttl
+        self.max_sessions = max_sessions
+        # Cascade instances are not safe to share between threads
+        self._local = threading.local()
+        # session_id -> (box in working coordinates, last seen timestamp)
+        self._tracks: "OrderedDict[str, Tuple[Box, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"roi_hits": 0, "full_scans": 0}
+
+    def _get_cascade(self):
+        """Load the Haar cascade on first use in the calling thread."""
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self._local.cascade = cascade
+        return cascade
+
+    def _downscale(self, gray: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Resize a grayscale frame to the working width, returning it with the scale applied."""
+        height, width = gray.shape[:2]
+        if self.working_width <= 0 or width <= self.working_width:
+            return gray, 1.0
+        scale = self.working_width / float(width)
+        small = cv2.resize(gray, (self.working_width, int(round(height * scale))), interpolation=cv2.INTER_AREA)
+        return small, scale
+
+    def _get_track(self, session_id: Optional[str]) -> Optional[Box]:
+        if session_id is None:
+            return None
+        with self._lock:
+            track = self._tracks.get(session_id)
+            if track is None:
+                return None
+            box, last_seen = track
+            if time.time() - last_seen > self.track_ttl:
+                del self._tracks[session_id]
+                return None
+            return box
+
+    def _set_track(self, session_id: Optional[str], box: Optional[Box]):
+        if session_id is None:
+            return
+        with self._lock:
+            if box is None:
+                self._tracks.pop(session_id, None)
+                return
+            self._tracks[session_id] = (box, time.time())
+            self._tracks.move_to_end(session_id)
+            while len(self._tracks) > self.max_sessions:
+                self._tracks.popitem(last=False)
+
+    def forget(self, session_id: str):
+        """Drop the tracked face box for a session."""
+        self._set_track(session_id, None)
+
+    def _detect_full(self, small: np.ndarray) -> List[Box]:
+        """Scan the whole downscaled frame."""
+        min_side = max(int(small.shape[1] * self.min_size_ratio), 24)
+        faces = self._get_cascade().detectMultiScale(
+            small,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_side, min_side),
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def _detect_roi(self, small: np.ndarray, previous: Box) -> List[Box]:
+        """Scan only an expanded window around the previous face box."""
+        px, py, pw, ph = previous
+        height, width = small.shape[:2]
+        margin_x = int(pw * self.roi_margin)
+        margin_y = int(ph * self.roi_margin)
+        x0, y0 = max(px - margin_x, 0), max(py - margin_y, 0)
+        x1, y1 = min(px + pw + margin_x, width), min(py + ph + margin_y, height)
+        roi = small[y0:y1, x0:x1]
+        if roi.size == 0:
+            return []
+
+        # The face can only have grown or shrunk a little since the last frame,
+        # so the cascade does not need to visit the full pyramid of scales
+        min_side = max(int(min(pw, ph) / ROI_SIZE_TOLERANCE), 24)
+        max_side = int(max(pw, ph) * ROI_SIZE_TOLERANCE)
+        if min_side > min(roi.shape[:2]):
+            return []
+        faces = self._get_cascade().detectMultiScale(
+            roi,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_side, min_side),
+            maxSize=(max_side, max_side),
+        )
+        return [(int(x) + x0, int(y) + y0, int(w), int(h)) for (x, y, w, h) in faces]
+
+    def detect(self, gray: np.ndarray, session_id: Optional[str] = None) -> List[Box]:
+        """
+        Detect faces in a grayscale frame.
+
+        Args:
+            gray: The grayscale frame at its original resolution
+            session_id: Optional key used to track the face across frames
+
+        Returns:
+            Face boxes as (x, y, w, h) in original frame coordinates, largest first
+        """
+        small, scale = self._downscale(gray)
+
+        faces: List[Box] = []
+        previous = self._get_track(session_id)
+        if previous is not None:
+            faces = self._detect_roi(small, previous)
+            if faces:
+                self.stats["roi_hits"] += 1
+        if not faces:
+            faces = self._detect_full(small)
+            self.stats["full_scans"] += 1
+
+        faces.sort(key=lambda f: f[2] * f[3], reverse=True)
+        self._set_track(session_id, faces[0] if faces else None)
+
+        if scale == 1.0:
+            return faces
+        inv = 1.0 / scale
+        return [(int(x * inv), int(y * inv), int(w * inv), int(h * inv)) for (x, y, w, h) in faces]
+
+
+# Create a singleton instance
+face_detector = FaceDetector()
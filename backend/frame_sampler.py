@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Frame deduplication configuration from environment variables
+FRAME_DEDUP_ENABLED = os.environ.get("FRAME_DEDUP_ENABLED", "true").lower() == "true"
+FRAME_DEDUP_THUMB_SIZE = int(os.environ.get("FRAME_DEDUP_THUMB_SIZE", "16"))  # thumbnail side in pixels
+FRAME_DEDUP_THRESHOLD = float(os.environ.get("FRAME_DEDUP_THRESHOLD", "4.0"))  # mean abs diff in gray levels
+FRAME_DEDUP_MAX_REUSE_SECONDS = float(os.environ.get("FRAME_DEDUP_MAX_REUSE_SECONDS", "10"))
+FRAME_SAMPLER_MAX_SESSIONS = int(os.environ.get("FRAME_SAMPLER_MAX_SESSIONS", "1000"))
+
+# Adaptive sampling configuration (client capture interval hints)
+SAMPLE_INTERVAL_MIN_MS = int(os.environ.get("SAMPLE_INTERVAL_MIN_MS", "1000"))
+SAMPLE_INTERVAL_MAX_MS = int(os.environ.get("SAMPLE_INTERVAL_MAX_MS", "8000"))
+SAMPLE_STABLE_STEPS = int(os.environ.get("SAMPLE_STABLE_STEPS", "3"))  # stable results before backing off
+ANALYSIS_CAPACITY = int(os.environ.get("ANALYSIS_CAPACITY", str(os.cpu_count() or 1)))
+
+
+class _SessionState:
+    __slots__ = ("thumbnail", "result", "analyzed_at", "stable_count")
+
+    def __init__(self):
+        self.thumbnail: Optional[np.ndarray] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.analyzed_at = 0.0
+        self.stable_count = 0
+
+
+class FrameSampler:
+    """
+    Per-session frame deduplication and capture rate advice.
+
+    Each analyzed frame is reduced to a tiny grayscale thumbnail. A following
+    frame whose thumbnail is nearly identical reuses the previous result
+    instead of running detection again, as long as that result is not older
+    than the maximum reuse window. The sampler also recommends how long the
+    client should wait before sending the next frame, backing off while
+    results stay stable or the server is busy.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = FRAME_DEDUP_ENABLED,
+        thumb_size: int = FRAME_DEDUP_THUMB_SIZE,
+        threshold: float = FRAME_DEDUP_THRESHOLD,
+        max_reuse_seconds: float = FRAME_DEDUP_MAX_REUSE_SECONDS,
+        max_sessions: int = FRAME_SAMPLER_MAX_SESSIONS,
+        capacity: int = ANALYSIS_CAPACITY,
+    ):
+        self.enabled = enabled
+        self.thumb_size = thumb_size
+        self.threshold = threshold
+        self.max_reuse_seconds = max_reuse_seconds
+        self.max_sessions = max_sessions
+        self.capacity = max(capacity, 1)
+        self._sessions: "OrderedDict[str, _SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"analyzed": 0, "reused": 0}
+
+    def thumbnail(self, gray: np.ndarray) -> np.ndarray:
+        """Downsample a frame to the comparison thumbnail."""
+        return cv2.resize(gray, (self.thumb_size, self.thumb_size), interpolation=cv2.INTER_AREA)
+
+    def is_similar(self, a: np.ndarray, b: np.ndarray) -> bool:
+        """Whether two thumbnails are close enough to share an analysis result."""
+        return float(np.mean(cv2.absdiff(a, b))) <= self.threshold
+
+    def can_reuse(self, source: np.ndarray, source_at: float, thumb: np.ndarray, at: float) -> bool:
+        """Whether a frame taken at `at` may reuse the result of the frame analyzed at `source_at`."""
+        return at - source_at <= self.max_reuse_seconds and self.is_similar(source, thumb)
+
+    def _state(self, session_id: str) -> _SessionState:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = _SessionState()
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def lookup(self, session_id: str, thumb: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the previous result if this frame is nearly identical to the last analyzed one."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or state.thumbnail is None or state.result is None:
+                return None
+            if not self.can_reuse(state.thumbnail, state.analyzed_at, thumb, time.time()):
+                return None
+            state.stable_count += 1
+            self.stats["reused"] += 1
+            return state.result
+
+    def reused(self, session_id: str):
+        """Count a frame that shared a result decided outside of lookup, such as within a batch."""
+        with self._lock:
+            self._state(session_id).stable_count += 1
+            self.stats["reused"] += 1
+
+    def record(self, session_id: str, thumb: np.ndarray, result: Dict[str, Any]):
+        """Remember a freshly analyzed frame and its result."""
+        with self._lock:
+            state = self._state(session_id)
+            previous = state.result
+            if (previous is not None
+                    and previous.get("face_detected") == result.get("face_detected")
+                    and previous.get("dominant_emotion") == result.get("dominant_emotion")):
+                state.stable_count += 1
+            else:
+                state.stable_count = 0
+            state.thumbnail = thumb
+            state.result = result
+            state.analyzed_at = time.time()
+            self.stats["analyzed"] += 1
+
+    def forget(self, session_id: str):
+        """Drop the stored frame state for a session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def begin(self, count: int = 1):
+        """Mark the start of full analyses for load tracking."""
+        with self._lock:
+            self._in_flight += count
+
+    def end(self, count: int = 1):
+        """Mark the end of full analyses."""
+        with self._lock:
+            self._in_flight = max(self._in_flight - count, 0)
+
+    @property
+    def load(self) -> float:
+        """Analyses in flight relative to the configured capacity."""
+        return self._in_flight / self.capacity
+
+    def recommend_interval_ms(self, session_id: Optional[str]) -> int:
+        """
+        Suggest the delay before the client's next frame.
+
+        The interval doubles for every SAMPLE_STABLE_STEPS consecutive stable
+        results and is stretched further when more analyses are in flight than
+        the server has capacity for.
+        """
+        stable_count = 0
+        if session_id is not None:
+            with self._lock:
+                state = self._sessions.get(session_id)
+                if state is not None:
+                    stable_count = state.stable_count
+
+        interval = SAMPLE_INTERVAL_MIN_MS * (2 ** min(stable_count // max(SAMPLE_STABLE_STEPS, 1), 8))
+        load = self.load
+        if load > 1.0:
+            interval *= load
+        return int(min(interval, SAMPLE_INTERVAL_MAX_MS))
+
+
+# Create a singleton instance
+frame_sampler = FrameSampler()
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import IdempotencyRecord
+from blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+# Idempotency configuration from environment variables
+IDEMPOTENCY_ENABLED = os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "86400"))  # seconds a response is replayed to retries
+IDEMPOTENCY_PENDING_TTL = int(os.environ.get("IDEMPOTENCY_PENDING_TTL", "300"))  # seconds before an unfinished claim is abandoned
+IDEMPOTENCY_WAIT = float(os.environ.get("IDEMPOTENCY_WAIT", "30"))  # seconds a retry waits for the first request to finish
+IDEMPOTENCY_POLL_INTERVAL = 0.25  # seconds between checks on a request running in another worker
+IDEMPOTENCY_PURGE_INTERVAL = 60  # seconds between deletions of expired records
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Responses worth replaying; others (server errors, rate limits, conflicts) are retried for real
+NON_REPLAYABLE_STATUSES = {408, 409, 425, 429}
+# Response headers stored with the body, besides content-type; trace ids belong to the first request only
+REPLAYED_HEADER_PREFIX = b"x-"
+SKIPPED_HEADERS = {b"x-trace-id"}
+
+
+class StoredResponse:
+    """A response captured for replay: status, selected headers and body."""
+
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+def request_fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Database-backed TTL store of idempotent responses, shared by all workers.
+
+    A key is claimed by inserting a pending record, so exactly one worker
+    runs the request; the response body is kept as a content blob and the
+    record expires IDEMPOTENCY_TTL seconds after it completes.
+    """
+
+    def __init__(self):
+        self._last_purge = 0.0
+        self.stats = {"claimed": 0, "replayed": 0, "mismatched": 0, "purged": 0}
+
+    def _purge_expired(self, db, now: datetime):
+        if time.monotonic() - self._last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        purged = db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+        self.stats["purged"] += purged
+
+    def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        """
+        Claim a key for a new request, or report why it cannot be run.
+
+        Returns ("claimed", None), ("done", response) when a matching request
+        already completed, ("pending", None) while it is still running, or
+        ("mismatch", None) when the key was used for a different request.
+        """
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            self._purge_expired(db, now)
+            record = db.get(IdempotencyRecord, key)
+            if record is not None and record.expires_at is not None and record.expires_at.replace(tzinfo=None) < now:
+                db.delete(record)
+                db.commit()
+                record = None
+            if record is None:
+                db.add(IdempotencyRecord(
+                    key=key, request_hash=fingerprint, status="pending",
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_PENDING_TTL)
+                ))
+                try:
+                    db.commit()
+                    self.stats["claimed"] += 1
+                    return "claimed", None
+                except IntegrityError:
+                    # Another worker claimed it first
+                    db.rollback()
+                    record = db.get(IdempotencyRecord, key)
+                    if record is None:
+                        return "pending", None
+            if record.request_hash != fingerprint:
+                self.stats["mismatched"] += 1
+                return "mismatch", None
+            if record.status != "done":
+                return "pending", None
+            body = blob_store.get(db, record.response_hash) if record.response_hash else b""
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record.response_headers or []]
+            self.stats["replayed"] += 1
+            return "done", StoredResponse(record.status_code, headers, body or b"")
+        finally:
+            db.close()
+
+    def complete(self, key: str, response: StoredResponse):
+        """Store the response of a claimed request for replay."""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update({
+                "status": "done",
+                "status_code": response.status_code,
+                "response_headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.headers],
+                "response_hash": blob_store.put(db, response.body) if response.body else None,
+                "expires_at": datetime.now() + timedelta(seconds=IDEMPOTENCY_TTL),
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def release(self, key: str):
+        """Drop the claim of a request whose response is not replayed, so a retry runs it again."""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key, IdempotencyRecord.status == "pending"
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def _replayed_header(name: bytes) -> bool:
+    return name == b"content-type" or (name.startswith(REPLAYED_HEADER_PREFIX) and name not in SKIPPED_HEADERS)
+
+
+async def _send_response(send, response: StoredResponse, replayed: bool = True):
+    headers = list(response.headers) + [(b"content-length", str(len(response.body)).encode())]
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+def _error(status_code: int, detail: str, retry_after: Optional[int] = None) -> StoredResponse:
+    headers = [(b"content-type", b"application/json")]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    return StoredResponse(status_code, headers, json.dumps({"detail": detail}).encode())
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware making POST requests with an Idempotency-Key header safe to retry.
+
+    The first request with a key runs and its response is stored; retries
+    with the same key and the same method, path, query and body get that
+    response back with Idempotent-Replayed: true instead of running again,
+    while one with a different request gets 422. Concurrent duplicates in
+    this worker wait for the first one's response rather than polling the
+    store; a duplicate running in another worker is waited on for up to
+    IDEMPOTENCY_WAIT seconds, then answered with 409. Responses with server
+    errors, 408, 409, 425 or 429 are not stored, so retries run again.
+    """
+
+    def __init__(self, app, store: Optional["IdempotencyStore"] = None, enabled: bool = IDEMPOTENCY_ENABLED):
+        self.app = app
+        self.store = store or idempotency_store
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        key = next((value for name, value in scope.get("headers", []) if name == IDEMPOTENCY_HEADER), None)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _send_response(send, _error(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"), False)
+            return
+
+        # Read the body to fingerprint the request, then hand it to the app unchanged
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        fingerprint = request_fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+
+        while True:
+            leader = self._inflight.get(key)
+            if leader is None:
+                break
+            # The same key is running in this worker; share its outcome
+            stored = await asyncio.shield(leader)
+            if stored is not None:
+                fingerprint_matches, response = stored
+                if fingerprint_matches != fingerprint:
+                    await _send_response(send, _error(422, "Idempotency-Key was used for a different request"), False)
+                else:
+                    await _send_response(send, response)
+                return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT
+            while True:
+                outcome, stored = await run_in_threadpool(self.store.claim, key, fingerprint)
+                if outcome != "pending" or time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+            if outcome == "done":
+                future.set_result((fingerprint, stored))
+                await _send_response(send, stored)
+            elif outcome == "mismatch":
+                await _send_response(send, _error(422, "Idempotency-Key was used for a different request"), False)
+            elif outcome == "pending":
+                await _send_response(send, _error(409, "A request with this Idempotency-Key is still in progress",
+                                                  retry_after=max(1, int(IDEMPOTENCY_POLL_INTERVAL * 4))), False)
+            else:
+                response = await self._run(key, scope, replay_receive, send)
+                if response is not None:
+                    future.set_result((fingerprint, response))
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                future.set_result(None)
+
+    async def _run(self, key: str, scope, receive, send) -> Optional[StoredResponse]:
+        """Run a claimed request, passing its response through; returns it when it was stored for replay."""
+        status_code = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers.extend((name.lower(), value) for name, value in message.get("headers", []) if _replayed_header(name.lower()))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        if status_code >= 500 or status_code in NON_REPLAYABLE_STATUSES:
+            await run_in_threadpool(self.store.release, key)
+            return None
+        response = StoredResponse(status_code, headers, b"".join(chunks))
+        try:
+            await run_in_threadpool(self.store.complete, key, response)
+        except Exception as e:
+            logger.error(f"Error storing idempotent response for key {key}: {str(e)}")
+            await run_in_threadpool(self.store.release, key)
+        return response
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one.
+
+    The first caller runs the function; callers arriving while it runs
+    block until it finishes and get its result, or its exception raised
+    again. Nothing is cached once the call returns.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+        if not leader:
+            self.stats["shared"] += 1
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        self.stats["calls"] += 1
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+# Create singleton instances
+idempotency_store = IdempotencyStore()
+evaluation_flights = SingleFlight()
@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import random
+import bisect
+import inspect
+import logging
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Instrumentation configuration from environment variables
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "true").lower() == "true"
+INSTRUMENTATION_SPAN_BUFFER = int(os.environ.get("INSTRUMENTATION_SPAN_BUFFER", "5000"))  # finished spans kept for /metrics/spans
+INSTRUMENTATION_SPAN_LOG = os.environ.get("INSTRUMENTATION_SPAN_LOG", "")  # JSON lines file to append finished spans to
+INSTRUMENTATION_OTEL = os.environ.get("INSTRUMENTATION_OTEL", "false").lower() == "true"  # also emit spans through OpenTelemetry
+
+# Histogram buckets in seconds, wide enough for 30 s batch tests
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        # Per series: one count per bucket, then the +Inf count, then the sum
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labelvalues, series in sorted(snapshot.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labelvalues))
+            prefix = labels + "," if labels else ""
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative:g}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative:g}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+span_duration = Histogram(
+    "span_duration_seconds", "Duration of timed spans (database, Judge0, Ollama, emotion analysis).", ("span",)
+)
+execution_queue_wait = Histogram(
+    "execution_queue_wait_seconds", "Time code evaluations waited for an execution slot.", ("priority",)
+)
+admission_queue_wait = Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests queued for their route class budget.", ("route_class",)
+)
+
+
+class Span:
+    """One timed operation within a request trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "_start", "duration",
+                 "attributes", "error", "_otel")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._otel = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """
+    Lightweight span recorder.
+
+    The current span is tracked in a context variable, so spans opened while
+    handling a request (including in threadpool endpoints) become children of
+    the request span. Finished spans feed the span_duration_seconds histogram,
+    a ring buffer served as JSON, an optional JSON lines log, and optionally
+    OpenTelemetry when the opentelemetry API is installed.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = INSTRUMENTATION_ENABLED,
+        buffer_size: int = INSTRUMENTATION_SPAN_BUFFER,
+        span_log: str = INSTRUMENTATION_SPAN_LOG,
+        otel: bool = INSTRUMENTATION_OTEL,
+    ):
+        self.enabled = enabled
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+        self._finished: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._span_log = open(span_log, "a", buffering=1) if enabled and span_log else None
+        self._otel_tracer = self._load_otel_tracer() if enabled and otel else None
+
+    @staticmethod
+    def _load_otel_tracer():
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("INSTRUMENTATION_OTEL is set but opentelemetry is not installed (pip install opentelemetry-api)")
+            return None
+        return trace.get_tracer("interviewxpert")
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """Start a child of the current span without making it current."""
+        parent = self._current.get()
+        span = Span(name, parent, attributes)
+        if self._otel_tracer is not None:
+            from opentelemetry import trace
+            context = trace.set_span_in_context(parent._otel) if parent is not None and parent._otel is not None else None
+            span._otel = self._otel_tracer.start_span(name, context=context, attributes=attributes)
+        return span
+
+    def activate(self, span: Span) -> contextvars.Token:
+        """Make a span current; pass the returned token to deactivate()."""
+        return self._current.set(span)
+
+    def deactivate(self, token: contextvars.Token):
+        self._current.reset(token)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.duration = time.perf_counter() - span._start
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        span_duration.observe(span.duration, span.name)
+        if span._otel is not None:
+            if error is not None:
+                span._otel.record_exception(error)
+            span._otel.end()
+        with self._lock:
+            self._finished.append(span)
+            if self._span_log is not None:
+                self._span_log.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Time the enclosed block as a span that is current while it runs."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            self._current.reset(token)
+
+    def recent(self, limit: int = 100, trace_id: Optional[str] = None, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent finished spans, newest first."""
+        with self._lock:
+            spans = list(self._finished)
+        matches = []
+        for span in reversed(spans):
+            if trace_id is not None and span.trace_id != trace_id:
+                continue
+            if name is not None and span.name != name:
+                continue
+            matches.append(span.to_dict())
+            if len(matches) >= limit:
+                break
+        return matches
+
+
+# Create a singleton instance
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    """Shortcut for tracer.span()."""
+    return tracer.span(name, **attributes)
+
+
+def traced(name: str):
+    """Decorator timing every call of a sync or async function as a span."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Record a db.query span for every statement executed through a SQLAlchemy engine."""
+    if not tracer.enabled:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        conn.info.setdefault("_instrumentation_spans", []).append(
+            tracer.start_span("db.query", operation=operation, executemany=executemany)
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_instrumentation_spans")
+        if spans:
+            tracer.end_span(spans.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("_instrumentation_spans") if conn is not None else None
+        if spans:
+            tracer.end_span(spans.pop(), exception_context.original_exception)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = http_request_duration.render() + span_duration.render() + execution_queue_wait.render()
+    lines += admission_queue_wait.render()
+    return "\n".join(lines) + "\n"
+
+
+def _route_template(scope) -> str:
+    """Route path with parameters left as placeholders, to keep label cardinality bounded."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if scope.get("endpoint") is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    path_params = scope.get("path_params") or {}
+    if not path_params:
+        return path
+    values = {str(v): k for k, v in path_params.items()}
+    return "/".join("{" + values[part] + "}" if part in values else part for part in path.split("/"))
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware timing every HTTP request.
+
+    Each request runs inside a root span, so spans opened while handling it
+    share its trace id, which is returned in the X-Trace-Id response header.
+    Latency is recorded per method, route template and status code.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        request_span = tracer.start_span("http.request", method=scope["method"], path=scope["path"])
+        token = tracer.activate(request_span)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-trace-id", request_span.trace_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracer.deactivate(token)
+            route = _route_template(scope)
+            request_span.set_attribute("route", route)
+            request_span.set_attribute("status", status)
+            tracer.end_span(request_span, error)
+            http_request_duration.observe(request_span.duration, scope["method"], route, str(status))
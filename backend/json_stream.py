@@ -0,0 +1,105 @@
+import json
+from typing import Any, List, Optional
+
+# Characters that may appear outside of strings in a JSON document
+# (structure, numbers, and the letters of true/false/null)
+_JSON_BARE_CHARS = frozenset(' \t\n\r{}[]:,"-+.0123456789eEtrufalsn')
+
+# Text models commonly put before the JSON (markdown fences, a short preamble)
+MAX_PREAMBLE_CHARS = 2000
+MAX_OBJECT_CHARS = 50000
+
+
+class MalformedJSONStream(ValueError):
+    """Raised as soon as the streamed text can no longer become a valid JSON object."""
+
+
+class IncrementalJSONObjectParser:
+    """
+    Find the first complete JSON object in a stream of text chunks.
+
+    Text before the opening brace (such as a ```json fence) is skipped. Inside
+    the object, string and bracket state is tracked character by character so
+    the object is recognised the moment its closing brace arrives, and output
+    that cannot be JSON (stray prose, mismatched brackets, runaway length) is
+    rejected immediately instead of after the whole completion.
+    """
+
+    def __init__(self, max_preamble: int = MAX_PREAMBLE_CHARS, max_length: int = MAX_OBJECT_CHARS):
+        self.max_preamble = max_preamble
+        self.max_length = max_length
+        self._preamble = 0
+        self._buffer: List[str] = []
+        self._length = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+
+    @property
+    def started(self) -> bool:
+        return bool(self._buffer)
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Consume the next chunk of text.
+
+        Returns:
+            The complete object text once its closing brace has been seen, else None
+
+        Raises:
+            MalformedJSONStream: if the stream can no longer produce a valid object
+        """
+        if self._done:
+            return None
+
+        start = 0
+        if not self._buffer:
+            brace = chunk.find("{")
+            if brace < 0:
+                self._preamble += len(chunk)
+                if self._preamble > self.max_preamble:
+                    raise MalformedJSONStream("No JSON object found in model output")
+                return None
+            start = brace
+
+        for index in range(start, len(chunk)):
+            char = chunk[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if not self._stack or self._stack.pop() != char:
+                    raise MalformedJSONStream(f"Unexpected '{char}' in model output")
+                if not self._stack:
+                    self._buffer.append(chunk[start:index + 1])
+                    self._done = True
+                    return "".join(self._buffer)
+            elif char not in _JSON_BARE_CHARS:
+                raise MalformedJSONStream(f"Unexpected character {char!r} outside of a JSON string")
+
+        self._buffer.append(chunk[start:])
+        self._length += len(chunk) - start
+        if self._length > self.max_length:
+            raise MalformedJSONStream("JSON object in model output is too long")
+        return None
+
+
+def parse_first_object(chunks) -> Any:
+    """Parse the first JSON object from an iterable of text chunks, stopping as soon as it closes."""
+    parser = IncrementalJSONObjectParser()
+    for chunk in chunks:
+        text = parser.feed(chunk)
+        if text is not None:
+            return json.loads(text)
+    raise MalformedJSONStream("Stream ended before the JSON object was complete")
@@ -2,7 +2,9 @@ import os
 import requests
 import time
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from instrumentation import traced
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,6 +25,16 @@ REQUEST_DELAY = 0.5  # Reduced from 1.0 to 0.5 seconds between requests
 MAX_RATE_LIMIT_RETRIES = 5  # Reduced from 10 to 5
 RATE_LIMIT_BACKOFF_FACTOR = 1.5  # Reduced from 2 to 1.5 for more gradual backoff
 MAX_BACKOFF_DELAY = 10  # Maximum delay in seconds
+FAIL_FAST_WINDOW = int(os.environ.get("JUDGE0_FAIL_FAST_WINDOW", "3"))  # submissions in flight when stopping early
+RESULT_TIMEOUT = float(os.environ.get("JUDGE0_RESULT_TIMEOUT", "15"))  # seconds one batch submission may take to finish
+
+# Judge0 status IDs
+ACCEPTED_STATUS_ID = 3
+COMPILATION_ERROR_STATUS_ID = 6
+
+# Result reported for test cases that were never run because evaluation stopped early
+SKIPPED_STATUS = {"id": 0, "description": "Skipped"}
+SKIPPED_RESULT = {"status": SKIPPED_STATUS, "stdout": None, "stderr": None, "time": None, "memory": None}
 
 # Language IDs for Judge0
 LANGUAGE_IDS = {
@@ -94,6 +106,7 @@ class Judge0Service:
             logger.error(f"Error making request to Judge0 API: {str(e)}")
             raise
 
+    @traced("judge0.submit")
     def create_submission(self, code: str, language: str, stdin: str = "", retry_count: int = 0) -> Dict[str, Any]:
         """Create a new submission in Judge0."""
         try:
@@ -109,6 +122,7 @@ class Judge0Service:
             logger.error(f"Error creating submission: {str(e)}")
             raise
 
+    @traced("judge0.poll")
     def get_submission(self, token: str, retry_count: int = 0) -> Dict[str, Any]:
         """Get the results of a submission."""
         try:
@@ -125,6 +139,7 @@ class Judge0Service:
             return stdin.strip()
         return stdin
 
+    @traced("judge0.execute")
     def execute_code(self, code: str, language: str, stdin: str = "", timeout: int = 15) -> Dict[str, Any]:
         """Execute code and return the results."""
         try:
@@ -161,27 +176,53 @@ class Judge0Service:
             logger.error(f"Error executing code: {str(e)}")
             raise
             
-    def batch_execute_code(self, code: str, language: str, test_cases: List[Dict[str, str]], timeout: int = 30) -> List[Dict[str, Any]]:
-        """Execute code against multiple test cases with rate limiting."""
+    @traced("judge0.batch")
+    def batch_execute_code(
+        self,
+        code: str,
+        language: str,
+        test_cases: List[Dict[str, str]],
+        timeout: int = 30,
+        stop_on: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        window: Optional[int] = None,
+        result_timeout: float = RESULT_TIMEOUT
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute code against multiple test cases with rate limiting.
+        
+        Results are returned in completion order, each with the index of its
+        test case. When stop_on is given, the first test case runs alone as a
+        probe and the rest are submitted up to window at a time (default
+        FAIL_FAST_WINDOW); as soon as stop_on returns True for a result,
+        nothing more is submitted or polled and the remaining test cases are
+        returned with a "Skipped" status.
+        
+        timeout bounds the whole batch; a submission that has not finished
+        result_timeout seconds after it was created is reported as timed out.
+        """
         try:
-            # Create submissions for all test cases with delay between requests
+            queued = list(enumerate(test_cases))
+            in_flight_limit = 1 if stop_on else len(queued)
             submissions = []
-            for test_case in test_cases:
-                # Format input based on language
-                formatted_input = self._format_input_for_language(language, test_case.get("input", ""))
-                submission = self.create_submission(code, language, formatted_input)
-                submissions.append({
-                    "token": submission["token"],
-                    "test_case": test_case
-                })
-                time.sleep(REQUEST_DELAY)
-            
-            # Wait for all executions to complete
             results = []
-            start_time = time.time()
+            stopped = False
+            deadline = time.time() + timeout
             
-            # Optimized polling strategy
-            while submissions and time.time() - start_time < timeout:
+            while (queued or submissions) and time.time() < deadline:
+                # Create submissions up to the in-flight limit with delay between requests
+                while queued and len(submissions) < in_flight_limit:
+                    index, test_case = queued.pop(0)
+                    # Format input based on language
+                    formatted_input = self._format_input_for_language(language, test_case.get("input", ""))
+                    submission = self.create_submission(code, language, formatted_input)
+                    submissions.append({
+                        "token": submission["token"],
+                        "index": index,
+                        "test_case": test_case,
+                        "submitted_at": time.time()
+                    })
+                    time.sleep(REQUEST_DELAY)
+                
                 # Check each submission that hasn't completed yet
                 completed_submissions = []
                 
@@ -193,37 +234,73 @@ class Judge0Service:
                             result = self.get_submission(submission["token"])
                             if result["status"]["id"] not in [1, 2]:  # 1: In Queue, 2: Processing
                                 # Add the result and mark for removal
-                                results.append({
+                                test_result = {
+                                    "index": submission["index"],
                                     "test_case": submission["test_case"],
                                     "result": result
-                                })
+                                }
+                                results.append(test_result)
                                 completed_submissions.append(submission)
+                                if stop_on and stop_on(test_result):
+                                    stopped = True
+                                    break
                         except Exception as e:
                             logger.error(f"Error checking submission status: {str(e)}")
                             # Don't remove the submission, let it retry
                 
+                # Give up on submissions that have waited too long for their result
+                if not stopped:
+                    now = time.time()
+                    for submission in submissions:
+                        if submission in completed_submissions or now - submission["submitted_at"] < result_timeout:
+                            continue
+                        test_result = {
+                            "index": submission["index"],
+                            "test_case": submission["test_case"],
+                            "result": self._timed_out_result(result_timeout)
+                        }
+                        results.append(test_result)
+                        completed_submissions.append(submission)
+                        if stop_on and stop_on(test_result):
+                            stopped = True
+                            break
+                
                 # Remove completed submissions
                 for submission in completed_submissions:
                     submissions.remove(submission)
                 
+                if stopped:
+                    logger.info(f"Stopping batch early, skipping {len(submissions) + len(queued)} test cases")
+                    break
+                
+                # Widen the window once the probe has passed
+                if stop_on and not submissions and in_flight_limit == 1:
+                    in_flight_limit = window or FAIL_FAST_WINDOW
+                    continue
+                
                 # If all submissions are complete, break
-                if not submissions:
+                if not submissions and not queued:
                     break
                     
                 # Add a longer delay between polling cycles to reduce API calls
                 time.sleep(REQUEST_DELAY * 2)  # Increased from REQUEST_DELAY to REQUEST_DELAY * 2
             
-            # If we still have submissions after timeout, mark them as timed out
-            for submission in submissions:
+            if stopped:
+                # Abandon in-flight and unsubmitted test cases
+                for index, test_case in [(s["index"], s["test_case"]) for s in submissions] + queued:
+                    results.append({
+                        "index": index,
+                        "test_case": test_case,
+                        "result": dict(SKIPPED_RESULT, status=dict(SKIPPED_STATUS))
+                    })
+                return results
+            
+            # If we still have submissions after the batch deadline, mark them as timed out
+            for index, test_case in [(s["index"], s["test_case"]) for s in submissions] + queued:
                 results.append({
-                    "test_case": submission["test_case"],
-                    "result": {
-                        "status": {"id": 4, "description": "Time Limit Exceeded"},
-                        "stdout": None,
-                        "stderr": "Execution timed out",
-                        "time": timeout,
-                        "memory": None
-                    }
+                    "index": index,
+                    "test_case": test_case,
+                    "result": self._timed_out_result(timeout)
                 })
             
             return results
@@ -231,5 +308,16 @@ class Judge0Service:
             logger.error(f"Error in batch execution: {str(e)}")
             raise
 
+    @staticmethod
+    def _timed_out_result(timeout: float) -> Dict[str, Any]:
+        """Result reported for a test case that did not finish in time."""
+        return {
+            "status": {"id": 4, "description": "Time Limit Exceeded"},
+            "stdout": None,
+            "stderr": "Execution timed out",
+            "time": timeout,
+            "memory": None
+        }
+
 # Create a singleton instance
 judge0_service = Judge0Service() 
\ No newline at end of file
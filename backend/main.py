@@ -9,28 +9,66 @@ import logging
 import json
 import random
 import uuid
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Union
-from fastapi import FastAPI, HTTPException, Depends, Query, Body
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Union, Tuple
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request, WebSocket, WebSocketDisconnect, File, Form, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, ValidationError
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import insert, func, select
 from sqlalchemy.orm import Session
 import statistics
-import re
+import anyio
 
-from database import get_db, engine, Base
-from models import QuestionTable, InterviewSession, SessionQuestion, EmotionSnapshot, User, CodeSubmission as CodeSubmissionModel
+from database import get_db, engine, Base, SessionLocal, WORKER_THREADS
+from models import (
+    QuestionTable, InterviewSession, SessionQuestion, EmotionSnapshot, User, CodeSubmission as CodeSubmissionModel,
+    SessionArchive, EditTimelineChunk
+)
 from schemas import (
     Question, QuestionCreate, UserState, EmotionType, CodeSubmission, TestResult,
     InterviewSessionCreate, InterviewSession as InterviewSessionSchema,
-    InterviewSessionUpdate, InterviewSessionWithDetails, SessionQuestionCreate,
+    InterviewSessionUpdate, SessionQuestionCreate,
     SessionQuestionUpdate, SessionQuestion as SessionQuestionSchema,
-    EmotionSnapshotCreate, EmotionSnapshot as EmotionSnapshotSchema
+    EmotionSnapshotCreate, EmotionSnapshot as EmotionSnapshotSchema, InterviewSessionDetail,
+    CodeAutosave, CodeAutosaveState, FrameMeta
+)
+from services import (
+    generate_question, analyze_facial_expression, analyze_frame_bytes, analyze_frames_batch, evaluate_code_submission,
+    resolve_evaluation_mode, should_stop_evaluation, MOCK_MODE, MOCK_QUESTIONS
 )
-from services import generate_question, analyze_facial_expression, evaluate_code_submission, MOCK_MODE, MOCK_QUESTIONS
 from seed_questions import seed_questions
-from judge0_service import judge0_service
+from judge0_service import judge0_service, ACCEPTED_STATUS_ID, SKIPPED_STATUS
+from question_pool import question_pool
+from question_dedup import question_dedup_index
+from question_catalog import (
+    query_question_page, topic_rows_for, ensure_catalog_indexes, backfill_question_topics,
+    catalog_cache, QUESTION_CATALOG_MAX_LIMIT
+)
+from ollama_client import ollama_client
+from question_cache import question_cache
+from output_compare import outputs_match
+from instrumentation import InstrumentationMiddleware, instrument_engine, render_metrics, tracer
+from serialization import (
+    FastJSONResponse, QUESTION_COLUMNS, question_from_row, questions_from_rows, dump_question, dump_questions,
+    raw_json_response
+)
+from session_detail import (
+    load_session_detail, dump_session_detail, parse_list_param,
+    SESSION_INCLUDES, DEFAULT_SESSION_INCLUDES, SESSION_FIELDS, SESSION_DETAIL_MAX_SNAPSHOTS
+)
+from blob_store import blob_store, ensure_blob_columns, content_hash, canonical_json
+from autosave import autosave_buffers, ensure_autosave_columns, AutosaveConflict
+from edit_timeline import edit_timeline, timeline_chunks, delete_timeline_rows, seek as seek_timeline, TIMELINE_MAX_EVENTS
+from code_similarity import index_submission, find_similar, ensure_similarity_columns, SIMILARITY_ENABLED
+from execution_scheduler import execution_scheduler, SchedulerRejected
+from admission import AdmissionMiddleware, admission_controller
+from idempotency import IdempotencyMiddleware, evaluation_flights
+from retention import (
+    session_archiver, ensure_retention_indexes, delete_session_rows, rehydrate_session, remove_archive, unlink_archive,
+    RETENTION_DAYS
+)
 
 # Configure logging
 logging.basicConfig(
@@ -47,13 +85,23 @@ logger = logging.getLogger(__name__)
 MOCK_MODE = True
 logger.info("Running in MOCK mode - using predefined questions instead of Ollama")
 
-# Create database tables
+# Time every database statement
+instrument_engine(engine)
+
+# Create database tables and any indexes or columns missing from tables created by earlier versions
 Base.metadata.create_all(bind=engine)
+ensure_catalog_indexes()
+ensure_retention_indexes()
+ensure_blob_columns()
+ensure_autosave_columns()
+ensure_similarity_columns()
 
-# Seed the database with sample questions
+# Seed the database with sample questions and index existing questions for deduplication
 db = next(get_db())
 try:
     seed_questions(db)
+    backfill_question_topics(db)
+    question_dedup_index.rebuild(db)
 except Exception as e:
     logger.error(f"Error seeding database: {e}")
 finally:
@@ -62,9 +110,34 @@ finally:
 app = FastAPI(
     title="InterviewXpert API",
     description="API for generating and retrieving coding interview questions",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+@app.on_event("startup")
+async def start_background_workers():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    # Mock mode never calls Ollama, so there is nothing to pre-generate
+    if not MOCK_MODE:
+        question_pool.start()
+    session_archiver.start()
+    autosave_buffers.start()
+    blob_store.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await question_pool.stop()
+    await session_archiver.stop()
+    await autosave_buffers.stop()
+    await blob_store.stop()
+    await ollama_client.close()
+
+# Hold requests to their route class budgets; added before CORS so rejections carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
+# Replay responses to retried POSTs that carry an Idempotency-Key; outside admission control, so replays cost no budget
+app.add_middleware(IdempotencyMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -72,12 +145,71 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id", "X-Code-Revision", "X-Queue-Position", "X-Queue-Wait-Ms", "Retry-After", "Idempotent-Replayed"],
 )
 
+# Time every request; added last so it wraps the other middleware
+app.add_middleware(InstrumentationMiddleware)
+
 class CodeSubmission(BaseModel):
     code: str
     language: str = "javascript"
     session_question_id: Optional[int] = None
+    session_id: Optional[int] = None  # schedules the evaluation under this session when session_question_id is not sent
+    mode: Optional[str] = None  # "run" stops at the first failure, "submit" runs every test case
+
+def execution_session_key(db: Optional[Session], request: Request, session_id: Optional[int] = None,
+                          session_question_id: Optional[int] = None) -> str:
+    """The key evaluations are fair-shared by: the interview session, or the client address without one."""
+    if session_id is None and session_question_id is not None and db is not None:
+        session_id = db.query(SessionQuestion.session_id).filter(SessionQuestion.id == session_question_id).scalar()
+    if session_id is not None:
+        return f"session:{session_id}"
+    return f"client:{request.client.host if request.client else 'unknown'}"
+
+def scheduler_http_error(e: SchedulerRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def set_queue_headers(response: Response, ticket):
+    """Tell the client how far back in the execution queue the evaluation started and how long it waited."""
+    response.headers["X-Queue-Position"] = str(ticket.queued_position)
+    response.headers["X-Queue-Wait-Ms"] = str(int(ticket.waited * 1000))
+
+def find_or_create_question(db: Session, question_data: Dict[str, Any]) -> Tuple[QuestionTable, bool]:
+    """
+    Return the stored near-duplicate of a question, or insert it as a new row.
+    
+    Returns the question row and whether it was newly created. New rows are
+    added to the session and flushed but not committed; call
+    register_created_question once the caller's commit succeeds.
+    """
+    duplicate_id = question_dedup_index.find_duplicate(question_data["title"], question_data["desc"])
+    if duplicate_id is not None:
+        existing = db.query(QuestionTable).filter(QuestionTable.id == duplicate_id).first()
+        if existing is not None:
+            logger.info(f"Reusing question {duplicate_id} instead of storing near-duplicate '{question_data['title']}'")
+            return existing, False
+        # The indexed row was deleted elsewhere
+        question_dedup_index.remove(duplicate_id)
+    
+    db_question = QuestionTable(
+        title=question_data["title"],
+        desc=question_data["desc"],
+        difficulty=question_data["difficulty"],
+        example=question_data.get("example"),
+        constraints=question_data.get("constraints", []),
+        topics=question_data.get("topics", []),
+        test_cases=question_data.get("test_cases", [])
+    )
+    db.add(db_question)
+    db.flush()
+    db.add_all(topic_rows_for(db_question))
+    return db_question, True
+
+def register_created_question(db_question: QuestionTable):
+    """Index a committed new question for deduplication and drop cached catalog pages."""
+    question_dedup_index.add(db_question.id, db_question.title, db_question.desc)
+    catalog_cache.invalidate()
 
 @app.post("/questions/", response_model=Question)
 async def create_question(question: QuestionCreate = Body(...), db: Session = Depends(get_db)):
@@ -95,9 +227,13 @@ async def create_question(question: QuestionCreate = Body(...), db: Session = De
         
         logger.info(f"Processing question creation with difficulty: {difficulty}")
         
-        # Always generate new question (either from Ollama or mock data)
-        generated_question = None
-        if MOCK_MODE:
+        # Serve a pre-generated question from the pool when one is ready,
+        # otherwise generate a new one (either from Ollama or mock data)
+        topic = question.topics[0] if question.topics else None
+        generated_question = None if MOCK_MODE else question_pool.take(difficulty, topic)
+        if generated_question:
+            logger.info(f"Serving pooled question: {generated_question['title']}")
+        elif MOCK_MODE:
             # In mock mode, use a predefined question from the mock data
             mock_questions_for_difficulty = [q for q in MOCK_QUESTIONS if q["difficulty"] == difficulty]
             if mock_questions_for_difficulty:
@@ -119,64 +255,37 @@ async def create_question(question: QuestionCreate = Body(...), db: Session = De
             logger.error("Failed to generate valid question: Missing required fields")
             raise HTTPException(status_code=500, detail="Failed to generate valid question")
         
-        # Create database record with user state
-        db_question = QuestionTable(
-            title=generated_question["title"],
-            desc=generated_question["desc"],
-            difficulty=generated_question["difficulty"],
-            example=generated_question.get("example"),
-            constraints=generated_question.get("constraints", []),
-            topics=generated_question.get("topics", []),
-            test_cases=generated_question.get("test_cases", [])
-        )
+        # Create database record with user state, reusing a stored near-duplicate if there is one
+        db_question, created = find_or_create_question(db, generated_question)
         
         # Add emotion data if available
-        if question.user_state:
+        if created and question.user_state:
             db_question.attention_level = question.user_state.attention_level
             db_question.positivity_level = question.user_state.positivity_level
             db_question.arousal_level = question.user_state.arousal_level
             db_question.dominant_emotion = question.user_state.dominant_emotion
         
         # Save to database
-        db.add(db_question)
         db.commit()
         db.refresh(db_question)
+        if created:
+            register_created_question(db_question)
         
-        # Convert datetime to ISO format for response
-        if hasattr(db_question, 'created_at') and db_question.created_at:
-            db_question.created_at = db_question.created_at.isoformat()
-        if hasattr(db_question, 'updated_at') and db_question.updated_at:
-            db_question.updated_at = db_question.updated_at.isoformat()
-        
-        logger.info(f"Successfully created question with ID: {db_question.id}")
-        return db_question
+        logger.info(f"Successfully {'created' if created else 'reused'} question with ID: {db_question.id}")
+        return raw_json_response(dump_question(question_from_row(db_question)))
     except ValidationError as ve:
         logger.error(f"Validation error creating question: {str(ve)}")
         # Use a mock question if validation fails
         if MOCK_MODE:
             logger.info("Using mock question due to validation error")
-            mock_question = MOCK_QUESTIONS[0]
-            db_question = QuestionTable(
-                title=mock_question["title"],
-                desc=mock_question["desc"],
-                difficulty=mock_question["difficulty"],
-                example=mock_question["example"],
-                constraints=mock_question["constraints"],
-                topics=mock_question["topics"],
-                test_cases=mock_question["test_cases"]
-            )
-            db.add(db_question)
+            db_question, created = find_or_create_question(db, MOCK_QUESTIONS[0])
             db.commit()
             db.refresh(db_question)
+            if created:
+                register_created_question(db_question)
             
-            # Convert datetime to ISO format for response
-            if hasattr(db_question, 'created_at') and db_question.created_at:
-                db_question.created_at = db_question.created_at.isoformat()
-            if hasattr(db_question, 'updated_at') and db_question.updated_at:
-                db_question.updated_at = db_question.updated_at.isoformat()
-                
             logger.info(f"Created mock question with ID: {db_question.id}")
-            return db_question
+            return raw_json_response(dump_question(question_from_row(db_question)))
         else:
             raise HTTPException(status_code=422, detail=str(ve))
     except HTTPException as he:
@@ -193,11 +302,11 @@ def get_questions(
     skip: int = 0, 
     limit: int = 10, 
     difficulty: Optional[str] = Query(None, description="Filter questions by difficulty (easy, medium, hard)"),
+    topic: Optional[List[str]] = Query(None, description="Filter by topic; repeat to match any of several topics"),
+    cursor: Optional[int] = Query(None, description="Return questions after this id (the X-Next-Cursor of the previous page)"),
     db: Session = Depends(get_db)
 ):
     try:
-        query = db.query(QuestionTable)
-        
         # Apply difficulty filter if provided
         if difficulty:
             if difficulty.lower() not in ["easy", "medium", "hard"]:
@@ -205,20 +314,27 @@ def get_questions(
                     status_code=400, 
                     detail=f"Invalid difficulty: {difficulty}. Must be one of: easy, medium, hard"
                 )
-            query = query.filter(QuestionTable.difficulty == difficulty.lower())
+            difficulty = difficulty.lower()
+        limit = max(1, min(limit, QUESTION_CATALOG_MAX_LIMIT))
         
-        # Apply pagination
-        questions = query.offset(skip).limit(limit).all()
-        
-        # Manually convert the datetime fields to ISO format strings for serialization
-        for question in questions:
-            if hasattr(question, 'created_at') and question.created_at:
-                question.created_at = question.created_at.isoformat()
-            if hasattr(question, 'updated_at') and question.updated_at:
-                question.updated_at = question.updated_at.isoformat()
+        # Pages are cached as serialized JSON together with their next cursor
+        cache_key = catalog_cache.key(difficulty, tuple(sorted(topic or [])), cursor, skip, limit)
+        page = catalog_cache.get(cache_key)
+        if page is None:
+            # Keyset pagination when a cursor is given; skip is kept for older clients.
+            # Only the response columns are selected, without hydrating ORM objects
+            rows = query_question_page(
+                db, difficulty=difficulty, topics=topic, cursor=cursor, limit=limit, skip=skip,
+                columns=QUESTION_COLUMNS
+            )
+            questions = questions_from_rows(rows)
+            next_cursor = str(questions[-1].id) if len(questions) == limit else None
+            page = (dump_questions(questions), next_cursor, len(questions))
+            catalog_cache.set(cache_key, page)
         
-        logger.info(f"Retrieved {len(questions)} questions from database")
-        return questions
+        body, next_cursor, count = page
+        logger.info(f"Retrieved {count} questions")
+        return raw_json_response(body, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
     except HTTPException as he:
         # Re-raise HTTP exceptions
         raise he
@@ -226,22 +342,34 @@ def get_questions(
         logger.error(f"Error retrieving questions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/questions/pool/status")
+def question_pool_status():
+    """Report pre-generated question buffer sizes and pool counters."""
+    return {
+        "enabled": question_pool.enabled and not MOCK_MODE,
+        "target_size": question_pool.target_size,
+        "buffers": question_pool.sizes(),
+        "stats": question_pool.stats,
+        "ollama": ollama_client.stats
+    }
+
+@app.get("/execution/queue")
+def get_execution_queue(request: Request, session_id: Optional[int] = Query(None)):
+    """Queue positions of the caller's waiting code evaluations, plus scheduler counters."""
+    session_key = execution_session_key(None, request, session_id)
+    return {**execution_scheduler.session_status(session_key), "scheduler": execution_scheduler.status()}
+
 @app.get("/questions/{question_id}", response_model=Question)
 def get_question(question_id: int, db: Session = Depends(get_db)):
     try:
-        question = db.query(QuestionTable).filter(QuestionTable.id == question_id).first()
+        question = question_cache.get(db, question_id)
         if question is None:
             logger.warning(f"Question not found with ID: {question_id}")
             raise HTTPException(status_code=404, detail="Question not found")
         
-        # Manually convert the datetime fields to ISO format strings for serialization
-        if hasattr(question, 'created_at') and question.created_at:
-            question.created_at = question.created_at.isoformat()
-        if hasattr(question, 'updated_at') and question.updated_at:
-            question.updated_at = question.updated_at.isoformat()
-        
         logger.info(f"Retrieved question with ID: {question_id}")
-        return question
+        # The response body is serialized once per cached question
+        return raw_json_response(question.json) if question.json is not None else question
     except HTTPException as he:
         # Re-raise HTTP exceptions
         raise he
@@ -250,11 +378,17 @@ def get_question(question_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/questions/{question_id}/test", response_model=TestResult)
-async def test_code_submission(question_id: int, submission: CodeSubmission, db: Session = Depends(get_db)):
+async def test_code_submission(
+    question_id: int,
+    submission: CodeSubmission,
+    request: Request,
+    http_response: Response,
+    db: Session = Depends(get_db)
+):
     """Test a code submission against the test cases for a question."""
     try:
         # Get the question
-        question = db.query(QuestionTable).filter(QuestionTable.id == question_id).first()
+        question = question_cache.get(db, question_id)
         if question is None:
             logger.warning(f"Question not found with ID: {question_id}")
             raise HTTPException(status_code=404, detail="Question not found")
@@ -262,8 +396,22 @@ async def test_code_submission(question_id: int, submission: CodeSubmission, db:
         # Log the submission
         logger.info(f"Received code submission for question ID {question_id}, language: {submission.language}")
         
-        # Evaluate the submission
-        result = evaluate_code_submission(submission.code, submission.language, question)
+        # Evaluate the submission once the scheduler grants this session a slot; waiting
+        # blocks, so it happens on a worker thread rather than the event loop
+        session_key = execution_session_key(db, request, submission.session_id, submission.session_question_id)
+        priority = resolve_evaluation_mode(submission.mode)
+        # Nothing below uses the database; do not hold a pooled connection while waiting for a slot
+        db.close()
+        
+        def evaluate():
+            with execution_scheduler.slot(session_key, priority, len(question.test_cases or [])) as ticket:
+                return evaluate_code_submission(submission.code, submission.language, question, submission.mode), ticket
+        
+        try:
+            result, ticket = await run_in_threadpool(evaluate)
+        except SchedulerRejected as e:
+            raise scheduler_http_error(e)
+        set_queue_headers(http_response, ticket)
         
         return result
     except HTTPException as he:
@@ -274,21 +422,228 @@ async def test_code_submission(question_id: int, submission: CodeSubmission, db:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-emotion/")
-async def analyze_emotion(image_data: Dict[str, str] = Body(...)):
+async def analyze_emotion(image_data: Dict[str, Any] = Body(...)):
     """
     Analyze facial expression from a webcam image
-    Expects a base64 encoded image in the request body
+    Expects a base64 encoded image in the request body, plus an optional
+    session_id used to track the face between frames
     """
     try:
         if "image" not in image_data:
             raise HTTPException(status_code=400, detail="Image data missing")
-            
-        result = analyze_facial_expression(image_data["image"])
+        
+        session_id = image_data.get("session_id")
+        result = analyze_facial_expression(
+            image_data["image"],
+            session_id=str(session_id) if session_id is not None else None
+        )
         return result
     except Exception as e:
         logger.error(f"Error analyzing emotion: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_emotion_snapshot(session_id: int, result: Dict[str, Any], question_id: Optional[int] = None) -> EmotionSnapshot:
+    """Create an emotion snapshot row from an analysis result."""
+    return EmotionSnapshot(
+        session_id=session_id,
+        attention_level=result["attention_level"],
+        positivity_level=result["positivity_level"],
+        arousal_level=result["arousal_level"],
+        dominant_emotion=result["dominant_emotion"],
+        face_detected=result.get("face_detected", False),
+        question_id=question_id
+    )
+
+def interview_session_exists(session_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(InterviewSession.id).filter(InterviewSession.id == session_id).first() is not None
+    finally:
+        db.close()
+
+def is_persistable_emotion(result: Dict[str, Any]) -> bool:
+    """Only successful analyses of a detected face are stored as snapshots."""
+    return "error" not in result and bool(result.get("face_detected"))
+
+def persist_emotion_snapshot(session_id: int, result: Dict[str, Any], question_id: Optional[int] = None):
+    """Store one analysis result in its own short transaction."""
+    db = SessionLocal()
+    try:
+        db.add(build_emotion_snapshot(session_id, result, question_id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@app.post("/analyze-emotion/binary")
+async def analyze_emotion_binary(
+    request: Request,
+    session_id: Optional[int] = Query(None, description="Session used for face tracking and snapshot persistence"),
+    question_id: Optional[int] = Query(None, description="Question the candidate is working on"),
+    persist: bool = Query(False, description="Store the result as an emotion snapshot for the session"),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze facial expression from a raw JPEG/WebP frame
+    Expects the encoded image bytes as the request body, avoiding the
+    base64 inflation and decode of the JSON endpoint
+    """
+    frame_bytes = await request.body()
+    if not frame_bytes:
+        raise HTTPException(status_code=400, detail="Image data missing")
+    if persist and session_id is None:
+        raise HTTPException(status_code=400, detail="session_id is required to persist snapshots")
+    
+    result = await run_in_threadpool(
+        analyze_frame_bytes,
+        frame_bytes,
+        str(session_id) if session_id is not None else None
+    )
+    
+    if persist and is_persistable_emotion(result):
+        try:
+            db.add(build_emotion_snapshot(session_id, result, question_id))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error persisting emotion snapshot: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return result
+
+frame_meta_adapter = TypeAdapter(List[FrameMeta])
+
+@app.post("/analyze-emotion/batch")
+async def analyze_emotion_batch(
+    frames: List[UploadFile] = File(..., description="Encoded JPEG/WebP frames"),
+    meta: Optional[str] = Form(None, description="JSON list with one {session_id, question_id, timestamp} object per frame"),
+    persist: bool = Form(False, description="Store results as emotion snapshots for their sessions"),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze a batch of frames from one or many sessions in a single request
+    Frames are decoded and analyzed on a thread pool, and snapshots are
+    inserted with one bulk statement
+    """
+    if not frames:
+        raise HTTPException(status_code=400, detail="No frames provided")
+    
+    # Validate all metadata before reading or analyzing any frame
+    frame_meta = [FrameMeta() for _ in frames]
+    if meta:
+        try:
+            frame_meta = frame_meta_adapter.validate_json(meta)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        if len(frame_meta) != len(frames):
+            raise HTTPException(status_code=400, detail="meta must have one entry per frame")
+    
+    session_ids = [m.session_id for m in frame_meta]
+    if persist:
+        if any(sid is None for sid in session_ids):
+            raise HTTPException(status_code=400, detail="Every frame needs a session_id to persist snapshots")
+        requested = set(session_ids)
+        found = {row.id for row in db.query(InterviewSession.id).filter(InterviewSession.id.in_(requested)).all()}
+        missing = requested - found
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Interview sessions not found: {sorted(missing)}")
+    
+    frame_bytes = [await frame.read() for frame in frames]
+    results = await run_in_threadpool(
+        analyze_frames_batch,
+        frame_bytes,
+        [str(sid) if sid is not None else None for sid in session_ids],
+        [m.timestamp.timestamp() if m.timestamp is not None else None for m in frame_meta]
+    )
+    
+    if persist:
+        now = datetime.now()
+        rows = []
+        for result, m in zip(results, frame_meta):
+            if not is_persistable_emotion(result):
+                continue
+            rows.append({
+                "session_id": m.session_id,
+                "timestamp": m.timestamp or now,
+                "attention_level": result["attention_level"],
+                "positivity_level": result["positivity_level"],
+                "arousal_level": result["arousal_level"],
+                "dominant_emotion": result["dominant_emotion"],
+                "face_detected": result.get("face_detected", False),
+                "question_id": m.question_id
+            })
+        try:
+            if rows:
+                db.execute(insert(EmotionSnapshot), rows)
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error persisting emotion snapshots: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"results": results, "count": len(results)}
+
+@app.websocket("/ws/sessions/{session_id}/emotions")
+async def emotion_stream(
+    websocket: WebSocket,
+    session_id: int,
+    persist: bool = False,
+    question_id: Optional[int] = None
+):
+    """
+    Stream emotion analysis over a persistent connection
+    
+    Each binary message is one encoded JPEG/WebP frame and is answered with a
+    JSON analysis result. Text messages are JSON control messages; sending
+    {"question_id": <id>} changes the question attached to persisted snapshots.
+    """
+    await websocket.accept()
+    
+    # Database work uses a short session per call on a worker thread, so a long-lived
+    # stream neither pins a pooled connection nor blocks the event loop
+    try:
+        if not await run_in_threadpool(interview_session_exists, session_id):
+            await websocket.close(code=4404, reason="Interview session not found")
+            return
+        
+        logger.info(f"Emotion stream opened for session {session_id} (persist={persist})")
+        tracking_key = str(session_id)
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                    if "question_id" in control:
+                        question_id = control["question_id"]
+                except (ValueError, TypeError):
+                    await websocket.send_json({"error": "Invalid control message"})
+                continue
+            
+            frame_bytes = message.get("bytes")
+            if not frame_bytes:
+                continue
+            
+            result = await run_in_threadpool(analyze_frame_bytes, frame_bytes, tracking_key)
+            
+            if persist and is_persistable_emotion(result):
+                try:
+                    await run_in_threadpool(persist_emotion_snapshot, session_id, result, question_id)
+                except Exception as e:
+                    logger.error(f"Error persisting emotion snapshot: {str(e)}")
+                    result = {**result, "persist_error": str(e)}
+            
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        logger.info(f"Emotion stream closed for session {session_id}")
+
 @app.post("/user-state/")
 async def log_user_state(state: UserState, db: Session = Depends(get_db)):
     """Endpoint specifically for logging user state independent of questions"""
@@ -307,6 +662,7 @@ async def log_user_state(state: UserState, db: Session = Depends(get_db)):
         db.add(db_state)
         db.commit()
         db.refresh(db_state)
+        catalog_cache.invalidate()
         
         return {"message": "User state logged successfully", "id": db_state.id}
     except Exception as e:
@@ -322,6 +678,30 @@ def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+def metrics():
+    """Request latency and span duration histograms in Prometheus text format."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admission/status")
+def admission_status():
+    """Concurrency budgets, queues and shed counts per route class."""
+    return admission_controller.status()
+
+@app.get("/metrics/spans")
+def recent_spans(
+    trace_id: Optional[str] = None,
+    name: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Recently finished spans as JSON, newest first.
+    
+    Pass the X-Trace-Id header of a response as trace_id to see where that
+    request spent its time.
+    """
+    return tracer.recent(limit=limit, trace_id=trace_id, name=name)
+
 @app.get("/")
 def root():
     return {
@@ -350,17 +730,34 @@ def create_interview_session(
     logger.info(f"Created new interview session with id: {new_session.id}")
     return new_session
 
-@app.get("/sessions/{session_id}", response_model=InterviewSessionWithDetails)
+@app.get("/sessions/{session_id}", response_model=InterviewSessionDetail)
 def get_interview_session(
     session_id: int,
+    include: Optional[str] = Query(None, description="Comma-separated relations: questions, snapshots, summary"),
+    fields: Optional[str] = Query(None, description="Comma-separated session fields to return (id is always included)"),
+    snapshot_limit: int = Query(SESSION_DETAIL_MAX_SNAPSHOTS, ge=0, le=SESSION_DETAIL_MAX_SNAPSHOTS),
     db: Session = Depends(get_db)
 ):
-    """Get details of an interview session by ID."""
-    session = db.query(InterviewSession).filter(InterviewSession.id == session_id).first()
-    if not session:
+    """
+    Get details of an interview session by ID.
+
+    Only the most recent snapshot_limit emotion snapshots are embedded; the
+    full list is paginated at emotion_snapshots_url, and include=summary adds
+    a fixed-size downsampled timeline instead.
+    """
+    try:
+        includes = parse_list_param(include, SESSION_INCLUDES, "include")
+        selected_fields = parse_list_param(fields, SESSION_FIELDS, "fields")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if includes is None:
+        includes = set(DEFAULT_SESSION_INCLUDES)
+
+    detail = load_session_detail(db, session_id, includes, snapshot_limit)
+    if detail is None:
         raise HTTPException(status_code=404, detail="Interview session not found")
-    
-    return session
+
+    return raw_json_response(dump_session_detail(detail, includes, selected_fields))
 
 @app.delete("/sessions/{session_id}")
 def delete_interview_session(
@@ -372,16 +769,85 @@ def delete_interview_session(
     if not session:
         raise HTTPException(status_code=404, detail="Interview session not found")
     
-    # Delete associated records first (cascade delete not automatic in SQLAlchemy ORM)
-    db.query(EmotionSnapshot).filter(EmotionSnapshot.session_id == session_id).delete()
-    db.query(SessionQuestion).filter(SessionQuestion.session_id == session_id).delete()
+    # Delete associated records first (cascade delete not automatic in SQLAlchemy ORM);
+    # snapshots and code submissions go in batches since long sessions have many,
+    # all in one transaction so a failure leaves the session whole
+    try:
+        delete_session_rows(db, session_id, commit=False)
+        delete_timeline_rows(db, select(SessionQuestion.id).where(SessionQuestion.session_id == session_id))
+        db.query(SessionQuestion).filter(SessionQuestion.session_id == session_id).delete()
+        archive_file = remove_archive(db, session_id)
+        
+        # Delete the session
+        db.delete(session)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error deleting session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
     
-    # Delete the session
-    db.delete(session)
-    db.commit()
+    # The archive file goes only once no committed row refers to it
+    if archive_file is not None:
+        unlink_archive(archive_file)
     
     return {"message": f"Session {session_id} deleted successfully"}
 
+@app.get("/sessions/{session_id}/archive")
+def get_session_archive(
+    session_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the archive status of an interview session."""
+    record = db.get(SessionArchive, session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session is not archived")
+    
+    return {
+        "session_id": record.session_id,
+        "status": record.status,
+        "snapshot_count": record.snapshot_count,
+        "submission_count": record.submission_count,
+        "size_bytes": record.size_bytes,
+        "archived_at": record.archived_at.isoformat() if record.archived_at else None,
+        "rehydrated_at": record.rehydrated_at.isoformat() if record.rehydrated_at else None,
+    }
+
+@app.post("/sessions/{session_id}/rehydrate")
+def rehydrate_interview_session(
+    session_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Restore an archived session's emotion snapshots and code submissions.
+    
+    The session is archived again once it has been idle for another retention window.
+    """
+    try:
+        record = rehydrate_session(db, session_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Archive file for this session is missing")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session is not archived")
+    
+    return {
+        "session_id": session_id,
+        "status": record.status,
+        "snapshot_count": record.snapshot_count,
+        "submission_count": record.submission_count,
+        "rehydrated_at": record.rehydrated_at.isoformat(),
+        "retention_days": RETENTION_DAYS,
+    }
+
+@app.get("/retention/status")
+def get_retention_status():
+    """Get session archiver settings and counters."""
+    return {
+        "enabled": session_archiver.enabled,
+        "retention_days": session_archiver.retention_days,
+        "interval": session_archiver.interval,
+        "stats": session_archiver.stats,
+    }
+
 @app.get("/sessions/{session_id}/questions")
 def get_session_questions(
     session_id: int,
@@ -423,7 +889,7 @@ def add_question_to_session(
             raise HTTPException(status_code=404, detail=f"Session not found with ID: {session_id}")
         
         # Try to fetch the requested question
-        question = db.query(QuestionTable).filter(QuestionTable.id == question_data.question_id).first()
+        question = question_cache.get(db, question_data.question_id)
         
         # If question not found, create a new one
         if question is None:
@@ -441,22 +907,14 @@ def add_question_to_session(
                     logger.error("Failed to generate question")
                     raise HTTPException(status_code=500, detail="Failed to generate question")
             
-            # Create a new question in the database
-            question = QuestionTable(
-                title=generated_question["title"],
-                desc=generated_question["desc"],
-                difficulty=generated_question["difficulty"],
-                example=generated_question["example"],
-                constraints=generated_question.get("constraints", []),
-                topics=generated_question.get("topics", []),
-                test_cases=generated_question.get("test_cases", [])
-            )
-            
+            # Create a new question in the database, or reuse a stored near-duplicate
             try:
-                db.add(question)
+                question, created = find_or_create_question(db, generated_question)
                 db.commit()
                 db.refresh(question)
-                logger.info(f"Created new question with ID: {question.id}")
+                if created:
+                    register_created_question(question)
+                logger.info(f"{'Created new' if created else 'Reusing existing'} question with ID: {question.id}")
             except Exception as e:
                 db.rollback()
                 logger.error(f"Error creating question: {str(e)}")
@@ -506,9 +964,15 @@ def update_session_question(
         raise HTTPException(status_code=404, detail="Session question not found")
     
     # Update fields
-    for key, value in question_data.dict(exclude_unset=True).items():
+    updates = question_data.dict(exclude_unset=True)
+    for key, value in updates.items():
         setattr(session_question, key, value)
     
+    # Full code replaces any autosaved edits; the new revision makes pending patches conflict
+    if "code_submitted" in updates:
+        buffered_revision = autosave_buffers.discard(session_id, question_id)
+        session_question.code_revision = max(session_question.code_revision or 0, buffered_revision or 0) + 1
+    
     # If end_time is set but duration is not, calculate duration
     if question_data.end_time and not question_data.duration and session_question.start_time:
         duration = int((question_data.end_time - session_question.start_time).total_seconds())
@@ -516,8 +980,147 @@ def update_session_question(
     
     db.commit()
     db.refresh(session_question)
+    
+    if "code_submitted" in updates:
+        edit_timeline.reset(session_question.id, session_question.code_submitted or "", session_question.code_revision)
+        try:
+            edit_timeline.persist(db, session_question.id)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error writing edit timeline for session question {session_question.id}: {str(e)}")
     return session_question
 
+@app.get("/sessions/{session_id}/questions/{question_id}/autosave", response_model=CodeAutosaveState)
+def get_autosaved_code(
+    session_id: int,
+    question_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the latest code of a session question, including edits not yet written to the database."""
+    buffer = autosave_buffers.get(db, session_id, question_id)
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Session question not found")
+    
+    return buffer.state(include_code=True)
+
+@app.patch("/sessions/{session_id}/questions/{question_id}/autosave", response_model=CodeAutosaveState)
+def autosave_code(
+    session_id: int,
+    question_id: int,
+    autosave: CodeAutosave,
+    db: Session = Depends(get_db)
+):
+    """
+    Apply code patches made against base_revision.
+    
+    Edits are held in memory and written after a pause in typing or on
+    submit. A 409 response means the code changed since base_revision; fetch
+    it with GET and reapply the edits.
+    """
+    while True:
+        buffer = autosave_buffers.get(db, session_id, question_id)
+        if buffer is None:
+            raise HTTPException(status_code=404, detail="Session question not found")
+        
+        try:
+            revision = autosave_buffers.patch(buffer, autosave.base_revision, autosave.patches, autosave.language)
+        except AutosaveConflict as e:
+            headers = {"X-Code-Revision": str(e.revision)}
+            if e.lost_revision is not None:
+                headers["X-Lost-Revision"] = str(e.lost_revision)
+            raise HTTPException(status_code=409, detail=str(e), headers=headers)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # None: the buffer was evicted after get(); load it again
+        if revision is not None:
+            return buffer.state()
+
+def get_session_question_id(db: Session, session_id: int, question_id: int) -> int:
+    row = db.query(SessionQuestion.id).filter(
+        SessionQuestion.session_id == session_id,
+        SessionQuestion.question_id == question_id
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Session question not found")
+    return row.id
+
+@app.get("/sessions/{session_id}/questions/{question_id}/timeline")
+def get_edit_timeline(
+    session_id: int,
+    question_id: int,
+    db: Session = Depends(get_db)
+):
+    """List the recorded edit chunks of a session question, up to the last autosave flush."""
+    session_question_id = get_session_question_id(db, session_id, question_id)
+    
+    chunks = timeline_chunks(db, session_question_id)
+    return {
+        "session_question_id": session_question_id,
+        "start_ms": chunks[0].start_ms if chunks else None,
+        "end_ms": max(c.end_ms for c in chunks) if chunks else None,
+        "edits": sum(c.op_count or 0 for c in chunks),
+        "chunks": [
+            {
+                "chunk": c.seq,
+                "start_ms": c.start_ms,
+                "end_ms": c.end_ms,
+                "start_revision": c.start_revision,
+                "end_revision": c.end_revision,
+                "edits": c.op_count,
+            }
+            for c in chunks
+        ],
+    }
+
+@app.get("/sessions/{session_id}/questions/{question_id}/timeline/replay")
+def replay_edit_timeline(
+    session_id: int,
+    question_id: int,
+    at: Optional[datetime] = Query(None, description="Time to seek to (naive times are UTC); defaults to the latest edit"),
+    offset_ms: Optional[int] = Query(None, ge=0, description="Milliseconds after the first recorded edit to seek to"),
+    events: int = Query(0, ge=0, le=TIMELINE_MAX_EVENTS, description="Following edits to return for playback"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a session question's code as it was at a point in time.
+    
+    Only the chunk containing that time is decoded, starting from its snapshot.
+    Edits appear once autosave has written them.
+    """
+    session_question_id = get_session_question_id(db, session_id, question_id)
+    
+    at_ms = None
+    if at is not None:
+        at_ms = int((at if at.tzinfo else at.replace(tzinfo=timezone.utc)).timestamp() * 1000)
+    elif offset_ms is not None:
+        first = db.query(func.min(EditTimelineChunk.start_ms)).filter(
+            EditTimelineChunk.session_question_id == session_question_id
+        ).scalar()
+        at_ms = first + offset_ms if first is not None else None
+    
+    replay = seek_timeline(db, session_question_id, at_ms, events)
+    if replay is None:
+        raise HTTPException(status_code=404, detail="No edits were recorded before that time")
+    
+    return replay
+
+@app.get("/submissions/{submission_id}/similar")
+def get_similar_submissions(
+    submission_id: int,
+    k: int = Query(10, ge=1, le=100),
+    scope: str = Query("question", description="question: same question only, all: any question"),
+    db: Session = Depends(get_db)
+):
+    """Find the submissions from other sessions most similar to a code submission."""
+    if scope not in ("question", "all"):
+        raise HTTPException(status_code=400, detail="scope must be 'question' or 'all'")
+    
+    similar = find_similar(db, submission_id, k, same_question=scope == "question")
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Code submission not found")
+    
+    return {"submission_id": submission_id, "scope": scope, "similar": similar}
+
 # Emotion snapshots endpoints
 
 @app.post("/sessions/{session_id}/emotions/", response_model=EmotionSnapshotSchema)
@@ -677,7 +1280,7 @@ def generate_session_report(
     
     for q in questions:
         # Get question details
-        question_data = db.query(QuestionTable).filter(QuestionTable.id == q.question_id).first()
+        question_data = question_cache.get(db, q.question_id)
         if not question_data:
             continue
         
@@ -853,8 +1456,9 @@ def generate_session_report(
 
 # Judge0 API endpoints
 @app.post("/judge0/execute")
-async def execute_code(submission: dict):
-    """Execute code using Judge0."""
+async def execute_code(submission: dict, request: Request, http_response: Response):
+    """Execute code using Judge0, as an ad-hoc run scheduled with the caller's other evaluations."""
+    session_key = execution_session_key(None, request, submission.get("session_id"))
     try:
         code = submission.get("source_code", "")
         language_id = submission.get("language_id", 71)  # Default to Python
@@ -872,9 +1476,16 @@ async def execute_code(submission: dict):
         logger.info(f"Executing {language} code with Judge0")
         
         # Execute the code
-        result = judge0_service.execute_code(code, language, stdin)
+        def execute():
+            with execution_scheduler.slot(session_key, "run") as ticket:
+                return judge0_service.execute_code(code, language, stdin), ticket
+        
+        result, ticket = await run_in_threadpool(execute)
+        set_queue_headers(http_response, ticket)
         
         return result
+    except SchedulerRejected as e:
+        raise scheduler_http_error(e)
     except Exception as e:
         logger.error(f"Error executing code: {str(e)}")
         # Return a mock result instead of raising an error
@@ -937,40 +1548,11 @@ async def get_submission(token: str):
             "memory": 1024
         }
 
-def normalize_output(output, language):
-    """Normalize output based on language and format."""
-    # Remove "Output:" prefix if present
-    if output.startswith("Output:"):
-        normalized = output[7:].strip()
-    else:
-        normalized = output.strip()
-    
-    # For C++, handle array output format
-    if language.lower() == 'cpp':
-        # Remove any trailing newlines that C++ might add
-        normalized = normalized.rstrip('\n')
-        # Normalize array output format
-        if '[' in normalized and ']' in normalized:
-            # Extract numbers and join with spaces
-            numbers = re.findall(r'-?\d+', normalized)
-            normalized = ' '.join(numbers)
-    else:
-        # For other languages, normalize array/list outputs
-        if normalized.startswith('[') and normalized.endswith(']'):
-            normalized = normalized.replace(" , ", ", ").replace(", ", ", ")
-    
-    return normalized.strip()
-
-@app.post("/questions/{question_id}/batch-test")
-def batch_test_question(
-    question_id: int,
-    submission: CodeSubmission,
-    db: Session = Depends(get_db)
-):
-    """Run all test cases for a question in batch."""
+def run_batch_test(question_id: int, submission: CodeSubmission, request: Request, db: Session):
+    """Run all test cases for a question in batch; returns the response and the execution slot ticket."""
     try:
-        # Get the question from the database
-        question = db.query(QuestionTable).filter(QuestionTable.id == question_id).first()
+        # Get the question, from the cache when it is hot
+        question = question_cache.get(db, question_id)
         if not question:
             raise HTTPException(status_code=404, detail=f"Question not found with ID: {question_id}")
         
@@ -978,15 +1560,50 @@ def batch_test_question(
         if not question.test_cases or len(question.test_cases) == 0:
             raise HTTPException(status_code=400, detail="Question has no test cases")
         
-        # Execute all test cases in batch
-        test_results = judge0_service.batch_execute_code(
-            code=submission.code,
-            language=submission.language,
-            test_cases=question.test_cases
-        )
+        # Expected outputs are parsed once per question and language
+        expected_outputs = question.expected_outputs(submission.language)
+        mode = resolve_evaluation_mode(submission.mode)
+        
+        def check_result(test_result: Dict[str, Any]) -> bool:
+            """Record whether a test passed; True when the rest of the batch can be skipped."""
+            result = test_result["result"]
+            passed = False
+            if result["status"]["id"] == ACCEPTED_STATUS_ID:
+                actual_output = result["stdout"] or ""
+                expected_output = expected_outputs[test_result["index"]]
+                
+                # Compare parsed values rather than raw text
+                passed = outputs_match(expected_output, actual_output, submission.language)
+                
+                # Log comparison details for debugging
+                logger.debug(f"Output comparison for test case:")
+                logger.debug(f"Raw actual: {actual_output.strip()}")
+                logger.debug(f"Canonical expected: {expected_output!r}")
+                logger.debug(f"Passed: {passed}")
+            test_result["passed"] = passed
+            return should_stop_evaluation(result["status"]["id"], passed, mode)
+        
+        # Execute test cases in batch; the first one runs alone so a compile error
+        # skips the rest, and in "run" mode the first failure skips the rest too.
+        # The batch waits for a slot shared fairly between sessions, submits first
+        session_key = execution_session_key(db, request, submission.session_id, submission.session_question_id)
+        # Give the connection back to the pool while waiting and running; the writes below check one out again
+        db.close()
+        try:
+            with execution_scheduler.slot(session_key, mode, len(question.test_cases)) as ticket:
+                test_results = judge0_service.batch_execute_code(
+                    code=submission.code,
+                    language=submission.language,
+                    test_cases=question.test_cases,
+                    stop_on=check_result,
+                    window=None if mode == "run" else len(question.test_cases)
+                )
+        except SchedulerRejected as e:
+            raise scheduler_http_error(e)
         
         # Process results
         passed_count = 0
+        skipped_count = 0
         total_time = 0.0  # Initialize as float
         results = []
         
@@ -994,25 +1611,14 @@ def batch_test_question(
             test_case = test_result["test_case"]
             result = test_result["result"]
             
-            # Check if the test passed
-            passed = False
-            if result["status"]["id"] == 3:  # Accepted
-                actual_output = result["stdout"].strip() if result["stdout"] else ""
-                expected_output = test_case["output"].strip()
-                
-                # Normalize outputs for comparison using the language-aware function
-                normalized_actual = normalize_output(actual_output, submission.language)
-                normalized_expected = normalize_output(expected_output, submission.language)
-                
-                passed = normalized_actual == normalized_expected
-                
-                # Log comparison details for debugging
-                logger.debug(f"Output comparison for test case:")
-                logger.debug(f"Raw actual: {actual_output}")
-                logger.debug(f"Raw expected: {expected_output}")
-                logger.debug(f"Normalized actual: {normalized_actual}")
-                logger.debug(f"Normalized expected: {normalized_expected}")
-                logger.debug(f"Passed: {passed}")
+            if result["status"]["id"] == SKIPPED_STATUS["id"]:
+                skipped_count += 1
+                continue
+            
+            # Check if the test passed (timed out results were never checked)
+            if "passed" not in test_result:
+                check_result(test_result)
+            passed = test_result["passed"]
             
             if passed:
                 passed_count += 1
@@ -1039,38 +1645,83 @@ def batch_test_question(
         # Calculate pass rate
         pass_rate = (passed_count / len(question.test_cases)) * 100
         
+        if pass_rate == 100:
+            feedback = "All tests passed! Great job!"
+        elif skipped_count:
+            feedback = f"Stopped early; {skipped_count} remaining test cases were not run. Check the details below."
+        else:
+            feedback = "Some tests failed. Check the details below."
+        
         # Create response object
         response = {
             "passed": pass_rate == 100,
             "passed_test_cases": passed_count,
+            "skipped_test_cases": skipped_count,
             "total_test_cases": len(question.test_cases),
             "pass_rate": pass_rate,
+            "mode": mode,
             "total_execution_time": float(total_time),  # Ensure it's a float
             "results": results,
-            "feedback": "All tests passed! Great job!" if pass_rate == 100 else "Some tests failed. Check the details below."
+            "feedback": feedback
         }
         
-        # Save the code submission and Judge0 response to the database
+        # Save the code submission and Judge0 response to the database; the code and
+        # response are content blobs, stored once and shared with the session question
         if submission.session_question_id:
+            # Write pending autosaved edits so the stored code is current as of this submission
+            autosave_buffers.flush(db, submission.session_question_id)
+            
+            code_hash = blob_store.put_text(db, submission.code)
+            response_hash = blob_store.put_json(db, response)
             code_submission = CodeSubmissionModel(
                 session_question_id=submission.session_question_id,
-                code=submission.code,
                 language=submission.language,
-                judge0_response=response
+                code_hash=code_hash,
+                response_hash=response_hash
             )
             db.add(code_submission)
-            db.commit()
+            db.flush()
+            
+            # Add the code to the similarity index; a failure there must not lose the submission
+            if SIMILARITY_ENABLED:
+                try:
+                    with db.begin_nested():
+                        index_submission(db, code_submission, submission.code, question_id)
+                except Exception as e:
+                    logger.error(f"Error indexing code submission {code_submission.id}: {str(e)}")
             
             # Update the session question with the test results
             session_question = db.query(SessionQuestion).filter(SessionQuestion.id == submission.session_question_id).first()
             if session_question:
                 session_question.passed_tests = passed_count
                 session_question.total_tests = len(question.test_cases)
-                session_question.test_results = response
-                db.commit()
+                session_question.test_results_inline = None
+                session_question.test_results_hash = response_hash
+            db.commit()
         
         # Return the test results
-        return response
+        return response, ticket
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in batch testing: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/questions/{question_id}/batch-test")
+def batch_test_question(
+    question_id: int,
+    submission: CodeSubmission,
+    request: Request,
+    http_response: Response,
+    db: Session = Depends(get_db)
+):
+    """
+    Run all test cases for a question in batch.
+    
+    Identical requests arriving while one runs (double clicks, client retries
+    without an Idempotency-Key) share its Judge0 batch and stored submission.
+    """
+    flight_key = content_hash(canonical_json([question_id, submission.model_dump()]))
+    response, ticket = evaluation_flights.do(flight_key, lambda: run_batch_test(question_id, submission, request, db))
+    set_queue_headers(http_response, ticket)
+    return response 
\ No newline at end of file
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, Float, ForeignKey, Boolean, Text, Index, LargeBinary
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, object_session
 from database import Base
 
 class User(Base):
@@ -39,6 +40,28 @@ class QuestionTable(Base):
     
     # Relationships
     session_questions = relationship("SessionQuestion", back_populates="question")
+    topic_entries = relationship("QuestionTopic", back_populates="question")
+    
+    __table_args__ = (
+        # Keyset pagination within a difficulty: WHERE difficulty = ? AND id > ? ORDER BY id
+        Index("ix_questions_difficulty_id", "difficulty", "id"),
+    )
+
+class QuestionTopic(Base):
+    """Normalized (question, topic) pairs so topic filters can use an index instead of parsing JSON."""
+    __tablename__ = "question_topics"
+    
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    topic = Column(String(100), primary_key=True)  # lowercased
+    difficulty = Column(String(50))  # copied from the question for the composite index
+    
+    # Relationships
+    question = relationship("QuestionTable", back_populates="topic_entries")
+    
+    __table_args__ = (
+        Index("ix_question_topics_difficulty_topic_question", "difficulty", "topic", "question_id"),
+        Index("ix_question_topics_topic_question", "topic", "question_id"),
+    )
 
 class InterviewSession(Base):
     __tablename__ = "interview_sessions"
@@ -64,6 +87,12 @@ class InterviewSession(Base):
     user = relationship("User", back_populates="sessions")
     session_questions = relationship("SessionQuestion", back_populates="session")
     emotion_snapshots = relationship("EmotionSnapshot", back_populates="session")
+    archive = relationship("SessionArchive", back_populates="session", uselist=False)
+    
+    __table_args__ = (
+        # Retention scans: WHERE start_time < cutoff
+        Index("ix_interview_sessions_start_time", "start_time"),
+    )
 
 class SessionQuestion(Base):
     __tablename__ = "session_questions"
@@ -75,12 +104,14 @@ class SessionQuestion(Base):
     
     # User's code submission
     code_submitted = Column(Text, nullable=True)
+    code_revision = Column(Integer, nullable=True)  # bumped by every autosave patch or full update; NULL means 0
     language = Column(String(50), nullable=True)
     
-    # Test results
+    # Test results; batch test runs store them as a content blob shared with the code submission
     passed_tests = Column(Integer, nullable=True)
     total_tests = Column(Integer, nullable=True)
-    test_results = Column(JSON, nullable=True)
+    test_results_inline = Column("test_results", JSON, nullable=True)
+    test_results_hash = Column(String(64), nullable=True, index=True)
     
     # Time spent on this question
     start_time = Column(DateTime(timezone=True), server_default=func.now())
@@ -94,6 +125,18 @@ class SessionQuestion(Base):
     session = relationship("InterviewSession", back_populates="session_questions")
     question = relationship("QuestionTable", back_populates="session_questions")
     code_submissions = relationship("CodeSubmission", back_populates="session_question")
+    
+    @property
+    def test_results(self):
+        if self.test_results_hash:
+            from blob_store import blob_store
+            return blob_store.get_json(object_session(self), self.test_results_hash)
+        return self.test_results_inline
+    
+    @test_results.setter
+    def test_results(self, value):
+        self.test_results_inline = value
+        self.test_results_hash = None
 
 class EmotionSnapshot(Base):
     __tablename__ = "emotion_snapshots"
@@ -116,16 +159,128 @@ class EmotionSnapshot(Base):
     
     # Relationships
     session = relationship("InterviewSession", back_populates="emotion_snapshots")
+    
+    __table_args__ = (
+        # Per-session range scans (detail, archive streaming, batched deletes) in id order
+        Index("ix_emotion_snapshots_session_id_id", "session_id", "id"),
+    )
 
 class CodeSubmission(Base):
     __tablename__ = "code_submissions"
     
     id = Column(Integer, primary_key=True, index=True)
     session_question_id = Column(Integer, ForeignKey("session_questions.id"))
-    code = Column(Text)
+    code = Column(Text)  # inline copies from before content blobs; new rows reference code_hash and response_hash
     language = Column(String(50))
     judge0_response = Column(JSON)
+    code_hash = Column(String(64), nullable=True, index=True)
+    response_hash = Column(String(64), nullable=True, index=True)
+    fingerprint_count = Column(Integer, nullable=True)  # distinct winnowing fingerprints; NULL until indexed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    session_question = relationship("SessionQuestion", back_populates="code_submissions") 
\ No newline at end of file
+    session_question = relationship("SessionQuestion", back_populates="code_submissions")
+    
+    __table_args__ = (
+        Index("ix_code_submissions_session_question_id", "session_question_id"),
+    )
+
+class SessionArchive(Base):
+    """A session whose snapshots and code submissions were moved out of the hot tables into an archive file."""
+    __tablename__ = "session_archives"
+    
+    session_id = Column(Integer, ForeignKey("interview_sessions.id"), primary_key=True)
+    status = Column(String(20))  # archiving, archived or rehydrated
+    path = Column(String(512))  # relative to the archive directory
+    snapshot_count = Column(Integer, default=0)
+    submission_count = Column(Integer, default=0)
+    size_bytes = Column(Integer, default=0)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    rehydrated_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Relationships
+    session = relationship("InterviewSession", back_populates="archive") 
+
+class CodeFingerprint(Base):
+    """Inverted index posting: a winnowing fingerprint that occurs in a code submission."""
+    __tablename__ = "code_fingerprints"
+    
+    fingerprint = Column(BigInteger, primary_key=True, autoincrement=False)
+    submission_id = Column(Integer, primary_key=True, autoincrement=False)  # code_submissions.id
+    question_id = Column(Integer, nullable=True)  # copied from the session question to scope lookups
+    
+    __table_args__ = (
+        Index("ix_code_fingerprints_submission", "submission_id"),
+    )
+
+class FingerprintFrequency(Base):
+    """Number of indexed submissions containing a fingerprint, to skip boilerplate at query time."""
+    __tablename__ = "code_fingerprint_frequencies"
+    
+    fingerprint = Column(BigInteger, primary_key=True, autoincrement=False)
+    submissions = Column(Integer, default=0)
+
+class EditTimelineChunk(Base):
+    """
+    A run of recorded code edits for one session question.
+
+    The chunk starts from a full snapshot of the code, stored as a content
+    blob; its edits are a varint-encoded operation stream appended one
+    segment per autosave flush. ops_hash holds the whole stream of chunks
+    written before segments existed.
+    """
+    __tablename__ = "edit_timeline_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_question_id = Column(Integer, ForeignKey("session_questions.id"))
+    seq = Column(Integer)  # chunk number within the session question
+    start_ms = Column(BigInteger)  # Unix time of the snapshot, in milliseconds
+    end_ms = Column(BigInteger)  # Unix time of the last edit
+    start_revision = Column(Integer)
+    end_revision = Column(Integer)
+    op_count = Column(Integer, default=0)
+    snapshot_hash = Column(String(64), index=True)
+    ops_hash = Column(String(64), nullable=True, index=True)
+    
+    __table_args__ = (
+        # Seek: the last chunk of a session question starting at or before a time
+        Index("ix_edit_timeline_chunks_question_start", "session_question_id", "start_ms"),
+    )
+
+class EditTimelineSegment(Base):
+    """The edits one autosave flush appended to an edit timeline chunk, never rewritten."""
+    __tablename__ = "edit_timeline_segments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    chunk_id = Column(Integer, ForeignKey("edit_timeline_chunks.id"))
+    end_op = Column(Integer)  # chunk op count after this segment; orders the segments
+    ops = Column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"))
+    
+    __table_args__ = (
+        Index("ix_edit_timeline_segments_chunk_end_op", "chunk_id", "end_op"),
+    )
+
+class ContentBlob(Base):
+    """Compressed content stored once per SHA-256 of the uncompressed bytes and shared by every row that references it."""
+    __tablename__ = "content_blobs"
+    
+    hash = Column(String(64), primary_key=True)  # hex SHA-256 of the uncompressed content
+    codec = Column(String(10))  # none, zlib or zstd
+    size = Column(Integer)  # uncompressed bytes
+    stored_size = Column(Integer)
+    data = Column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())  # refreshed on every put; guards garbage collection
+
+class IdempotencyRecord(Base):
+    """The outcome of a POST sent with an Idempotency-Key, replayed to retries of the same request until it expires."""
+    __tablename__ = "idempotency_records"
+    
+    key = Column(String(255), primary_key=True)  # the client's Idempotency-Key
+    request_hash = Column(String(64))  # SHA-256 of method, path, query and body; a reused key must match
+    status = Column(String(20))  # pending while the first request runs, then done
+    status_code = Column(Integer, nullable=True)
+    response_headers = Column(JSON, nullable=True)  # [name, value] pairs replayed with the body
+    response_hash = Column(String(64), nullable=True, index=True)  # content blob of the response body
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)
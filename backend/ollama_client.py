@@ -0,0 +1,193 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from json_stream import IncrementalJSONObjectParser, MalformedJSONStream
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Ollama client configuration from environment variables
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "120"))  # seconds per generation
+OLLAMA_STREAM_IDLE_TIMEOUT = int(os.environ.get("OLLAMA_STREAM_IDLE_TIMEOUT", "15"))  # max seconds between tokens
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "1"))  # match OLLAMA_NUM_PARALLEL on the server
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_MODELS_TTL = float(os.environ.get("OLLAMA_MODELS_TTL", "60"))  # seconds to cache the model list
+OLLAMA_RETRIES = int(os.environ.get("OLLAMA_RETRIES", "3"))
+OLLAMA_RETRY_DELAY = float(os.environ.get("OLLAMA_RETRY_DELAY", "1"))  # seconds, doubled per retry
+
+SYSTEM_PROMPT = "You are a helpful assistant for generating programming interview questions."
+
+
+class AsyncOllamaClient:
+    """
+    Async Ollama client sharing one pooled HTTP connection set per process.
+
+    Generation calls are limited to the number of requests the model server
+    can run in parallel; extra callers wait for a slot instead of piling onto
+    Ollama. Identical in-flight generations (same model, prompt and options)
+    are coalesced into one upstream call whose result every caller receives,
+    and the model list is cached for a short TTL.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        models_ttl: float = OLLAMA_MODELS_TTL,
+        retries: int = OLLAMA_RETRIES,
+        retry_delay: float = OLLAMA_RETRY_DELAY,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_connections = max_connections
+        self.models_ttl = models_ttl
+        self.retries = max(retries, 1)
+        self.retry_delay = retry_delay
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._models: Optional[List[str]] = None
+        self._models_fetched_at = 0.0
+        self._models_task: Optional[asyncio.Future] = None
+        self.stats = {"upstream": 0, "coalesced": 0, "retries": 0, "models_cache_hits": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(5.0),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def close(self):
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    async def check_server(self) -> bool:
+        """Check if the Ollama server is reachable."""
+        try:
+            await self.list_models(force_refresh=self._models is None)
+            return True
+        except Exception as e:
+            logger.error(f"Ollama server check failed: {e}")
+            return False
+
+    async def list_models(self, force_refresh: bool = False) -> List[str]:
+        """Names of the available models, cached for models_ttl seconds."""
+        if (not force_refresh and self._models is not None
+                and time.monotonic() - self._models_fetched_at < self.models_ttl):
+            self.stats["models_cache_hits"] += 1
+            return list(self._models)
+
+        # Concurrent refreshes share one request
+        if self._models_task is None or self._models_task.done():
+            self._models_task = asyncio.ensure_future(self._fetch_models())
+        return list(await asyncio.shield(self._models_task))
+
+    async def _fetch_models(self) -> List[str]:
+        response = await self._get_client().get("/api/tags")
+        response.raise_for_status()
+        self._models = [model.get("name") for model in response.json().get("models", [])]
+        self._models_fetched_at = time.monotonic()
+        return self._models
+
+    async def generate_json(
+        self,
+        prompt: str,
+        model: str = "llama3",
+        max_tokens: int = 2048,
+        temperature: float = 0.7,
+        timeout: float = OLLAMA_TIMEOUT,
+    ) -> Dict[str, Any]:
+        """
+        Generate a completion and return the first JSON object in it.
+
+        Identical concurrent calls share a single upstream generation.
+
+        Raises:
+            MalformedJSONStream: if every attempt produced output that is not a JSON object
+            httpx.HTTPError / asyncio.TimeoutError: if every attempt failed to complete
+        """
+        key = json.dumps([model, prompt, max_tokens, temperature])
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._generate_json_with_retries(prompt, model, max_tokens, temperature, timeout)
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.stats["upstream"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.info("Coalescing identical in-flight Ollama generation")
+        # Shield the shared call so one caller giving up does not cancel it for the others
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    async def _generate_json_with_retries(self, prompt, model, max_tokens, temperature, timeout) -> Dict[str, Any]:
+        delay = self.retry_delay
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._get_client()
+                # The span includes time spent waiting for a generation slot
+                with span("ollama.generate", model=model, attempt=attempt, stream=True):
+                    async with self._semaphore:
+                        return await asyncio.wait_for(
+                            self._stream_json(prompt, model, max_tokens, temperature),
+                            timeout=timeout
+                        )
+            except (httpx.HTTPError, asyncio.TimeoutError, MalformedJSONStream, ValueError) as e:
+                if attempt >= self.retries:
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Ollama generation attempt {attempt} failed: {str(e)}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def _stream_json(self, prompt, model, max_tokens, temperature) -> Dict[str, Any]:
+        """Stream one generation, returning as soon as the JSON object closes."""
+        parser = IncrementalJSONObjectParser()
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "system": SYSTEM_PROMPT,
+            "stream": True,
+            "options": {"num_predict": max_tokens, "temperature": temperature}
+        }
+        timeout = httpx.Timeout(5.0, read=OLLAMA_STREAM_IDLE_TIMEOUT)
+        async with self._get_client().stream("POST", "/api/generate", json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise ValueError(f"Ollama error: {chunk['error']}")
+                text = parser.feed(chunk.get("response", ""))
+                if text is not None:
+                    # Leaving the context closes the connection, stopping generation upstream
+                    return json.loads(text)
+                if chunk.get("done"):
+                    break
+        raise MalformedJSONStream("Model finished before the JSON object was complete")
+
+
+# Create a singleton instance
+ollama_client = AsyncOllamaClient()
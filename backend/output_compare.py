@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import math
+from typing import Any, Iterable, List, Tuple, Union
+
+# Output comparison configuration from environment variables
+OUTPUT_FLOAT_REL_TOL = float(os.environ.get("OUTPUT_FLOAT_REL_TOL", "1e-6"))
+OUTPUT_FLOAT_ABS_TOL = float(os.environ.get("OUTPUT_FLOAT_ABS_TOL", "1e-6"))
+
+# Languages whose programs usually print arrays as bare space-separated values,
+# so "[1, 2, 3]" and "1 2 3" are treated as the same flat array
+FLAT_ARRAY_LANGUAGES = frozenset({"cpp"})
+
+_INT_RE = re.compile(r"[+-]?\d+")
+_FLOAT_RE = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?")
+_SEPARATOR_RE = re.compile(r"[,\s]+")
+
+# Canonical output: bool, int, float, str, or a tuple of canonical values
+Canonical = Union[bool, int, float, str, Tuple[Any, ...]]
+
+
+def _strip_output(text: str) -> str:
+    """Drop the "Output:" prefix, normalize line endings and trailing whitespace."""
+    text = (text or "").strip()
+    if text.startswith("Output:"):
+        text = text[7:].strip()
+    if "\n" in text or "\r" in text:
+        text = "\n".join(line.rstrip() for line in text.splitlines())
+    return text
+
+
+def _parse_scalar(token: str) -> Canonical:
+    lowered = token.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if _INT_RE.fullmatch(token):
+        return int(token)
+    if _FLOAT_RE.fullmatch(token):
+        return float(token)
+    return token
+
+
+def _from_json(value: Any) -> Canonical:
+    if isinstance(value, list):
+        return tuple(_from_json(item) for item in value)
+    if value is None:
+        return "null"
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def _parse_array(text: str) -> Canonical:
+    """Parse a bracketed array written as JSON, a Python list, or loose separated values."""
+    for candidate in (text, text.replace("'", '"').replace("True", "true").replace("False", "false").replace("None", "null")):
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, list):
+            return _from_json(value)
+    inner = text[1:-1].strip()
+    if not inner:
+        return ()
+    if "[" in inner or "]" in inner:
+        return text
+    return tuple(_parse_scalar(token.strip("'\"")) for token in _SEPARATOR_RE.split(inner) if token)
+
+
+def _flatten(value: Canonical) -> Tuple[Any, ...]:
+    if not isinstance(value, tuple):
+        return (value,)
+    flat: List[Any] = []
+    for item in value:
+        flat.extend(_flatten(item))
+    return tuple(flat)
+
+
+def canonicalize(output: str, language: str) -> Canonical:
+    """
+    Parse program output into a canonical value for comparison.
+
+    Booleans, integers, floats and arrays (JSON, Python or loosely separated)
+    are parsed into Python values; anything else compares as trimmed text.
+    """
+    text = _strip_output(output)
+    flat_arrays = language.lower() in FLAT_ARRAY_LANGUAGES
+
+    if text.startswith("[") and text.endswith("]"):
+        value = _parse_array(text)
+        return _flatten(value) if flat_arrays and isinstance(value, tuple) else value
+    if flat_arrays and text and " " in text and "\n" not in text:
+        tokens = text.split()
+        values = tuple(_parse_scalar(token) for token in tokens)
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return values
+    return _parse_scalar(text) if text and "\n" not in text else text
+
+
+def values_equal(expected: Canonical, actual: Canonical) -> bool:
+    """Compare canonical values, allowing a small tolerance between floats."""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return type(expected) is type(actual) and expected == actual
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if isinstance(expected, int) and isinstance(actual, int):
+            return expected == actual
+        return math.isclose(expected, actual, rel_tol=OUTPUT_FLOAT_REL_TOL, abs_tol=OUTPUT_FLOAT_ABS_TOL)
+    if isinstance(expected, tuple) and isinstance(actual, tuple):
+        return len(expected) == len(actual) and all(values_equal(e, a) for e, a in zip(expected, actual))
+    return type(expected) is type(actual) and expected == actual
+
+
+def compile_expected(test_cases: Iterable[dict], language: str) -> List[Canonical]:
+    """Canonical expected outputs for a question's test cases, in order."""
+    return [canonicalize(str(case.get("output", "")), language) for case in test_cases]
+
+
+def outputs_match(expected: Canonical, actual_output: str, language: str) -> bool:
+    """Check program output against a precompiled expected output."""
+    return values_equal(expected, canonicalize(actual_output, language))
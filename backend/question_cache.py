@@ -0,0 +1,120 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import QuestionTable
+from output_compare import Canonical, compile_expected
+from serialization import dump_question, question_from_row
+
+logger = logging.getLogger(__name__)
+
+# Question cache configuration from environment variables
+QUESTION_CACHE_SIZE = int(os.environ.get("QUESTION_CACHE_SIZE", "1024"))  # questions per worker
+QUESTION_CACHE_TTL = float(os.environ.get("QUESTION_CACHE_TTL", "600"))  # seconds; 0 keeps entries until evicted
+
+QUESTION_FIELDS = (
+    "id", "title", "desc", "difficulty", "example", "constraints", "topics",
+    "attention_level", "positivity_level", "arousal_level", "dominant_emotion",
+    "created_at", "updated_at",
+)
+
+
+class CachedQuestion:
+    """
+    Detached, fully materialized copy of a question row.
+
+    Exposes the same attributes as QuestionTable, with JSON columns already
+    deserialized and test cases normalized to plain dicts, so it can be used
+    wherever a loaded question was used before. Instances are shared between
+    requests and must be treated as read-only.
+    """
+
+    __slots__ = QUESTION_FIELDS + ("test_cases", "json", "_expected")
+
+    def __init__(self, row: QuestionTable):
+        for name in QUESTION_FIELDS:
+            setattr(self, name, getattr(row, name))
+        self.test_cases: List[Dict[str, Any]] = [
+            {
+                "input": str(case.get("input", "")),
+                "output": str(case.get("output", "")),
+                "explanation": case.get("explanation")
+            }
+            for case in row.test_cases or []
+            if isinstance(case, dict)
+        ]
+        # Response body serialized once; None for rows that do not satisfy the schema
+        try:
+            self.json: Optional[bytes] = dump_question(question_from_row(self))
+        except Exception:
+            self.json = None
+        self._expected: Dict[str, List[Canonical]] = {}
+
+    def expected_outputs(self, language: str) -> List[Canonical]:
+        """Canonical expected outputs for each test case, compiled once per language."""
+        key = language.lower()
+        expected = self._expected.get(key)
+        if expected is None:
+            expected = compile_expected(self.test_cases, key)
+            self._expected[key] = expected
+        return expected
+
+
+class QuestionCache:
+    """
+    Process-local read-through LRU cache of questions by id.
+
+    Questions are effectively immutable once stored, so a hot question costs
+    no database round trip after its first load. Entries expire after a TTL,
+    which bounds staleness for edits made through another worker; edits made
+    through this worker should call invalidate().
+    """
+
+    def __init__(self, max_entries: int = QUESTION_CACHE_SIZE, ttl: float = QUESTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, CachedQuestion]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, db: Session, question_id: int) -> Optional[CachedQuestion]:
+        """Return the question, loading it from the database on a miss; None if it does not exist."""
+        with self._lock:
+            entry = self._entries.get(question_id)
+            if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[0] <= self.ttl):
+                self._entries.move_to_end(question_id)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        row = db.query(QuestionTable).filter(QuestionTable.id == question_id).first()
+        if row is None:
+            return None
+        return self.put(row)
+
+    def put(self, row: QuestionTable) -> CachedQuestion:
+        """Materialize a loaded row and cache it."""
+        cached = CachedQuestion(row)
+        with self._lock:
+            self._entries[cached.id] = (time.monotonic(), cached)
+            self._entries.move_to_end(cached.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self, question_id: Optional[int] = None):
+        """Drop one question, or every question when no id is given."""
+        with self._lock:
+            if question_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(question_id, None)
+
+
+# Create a singleton instance
+question_cache = QuestionCache()
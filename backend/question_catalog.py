@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import engine
+from models import QuestionTable, QuestionTopic
+
+logger = logging.getLogger(__name__)
+
+# Catalog cache configuration from environment variables
+QUESTION_CATALOG_CACHE_SIZE = int(os.environ.get("QUESTION_CATALOG_CACHE_SIZE", "256"))  # cached pages
+QUESTION_CATALOG_CACHE_TTL = float(os.environ.get("QUESTION_CATALOG_CACHE_TTL", "60"))  # seconds; bounds staleness across workers
+QUESTION_CATALOG_MAX_LIMIT = int(os.environ.get("QUESTION_CATALOG_MAX_LIMIT", "100"))
+QUESTION_TOPIC_BACKFILL_BATCH = int(os.environ.get("QUESTION_TOPIC_BACKFILL_BATCH", "500"))  # questions per startup backfill query
+
+
+def normalize_topic(topic: str) -> str:
+    """Canonical form used for stored and queried topics."""
+    return " ".join(topic.lower().split())[:100]
+
+
+def topic_rows_for(question: Any) -> List[QuestionTopic]:
+    """Build the question_topics rows for a question (or a row with its id, difficulty and topics)."""
+    topics = {normalize_topic(t) for t in question.topics or [] if isinstance(t, str) and t.strip()}
+    return [
+        QuestionTopic(question_id=question.id, topic=topic, difficulty=question.difficulty)
+        for topic in sorted(topics)
+    ]
+
+
+def ensure_catalog_indexes():
+    """Create catalog indexes that create_all skips on tables that already exist."""
+    for table in (QuestionTable.__table__, QuestionTopic.__table__):
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                logger.error(f"Error creating index {index.name}: {str(e)}")
+
+
+def backfill_question_topics(db: Session, batch_size: int = QUESTION_TOPIC_BACKFILL_BATCH) -> int:
+    """
+    Add question_topics rows for questions stored before the topic index existed.
+
+    Only id, difficulty and topics are read, in id-ordered batches. Questions
+    without topics, such as user state logs, have nothing to index and are skipped.
+    """
+    indexed = select(QuestionTopic.question_id)
+    last_id = 0
+    total = 0
+    while True:
+        batch = (
+            db.query(QuestionTable.id, QuestionTable.difficulty, QuestionTable.topics)
+            .filter(QuestionTable.id > last_id, ~QuestionTable.id.in_(indexed))
+            .order_by(QuestionTable.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        rows = [row for question in batch if question.topics for row in topic_rows_for(question)]
+        if rows:
+            db.add_all(rows)
+            db.commit()
+            total += len(rows)
+    if total:
+        logger.info(f"Backfilled {total} question topic rows")
+    return total
+
+
+def query_question_page(
+    db: Session,
+    difficulty: Optional[str] = None,
+    topics: Optional[Iterable[str]] = None,
+    cursor: Optional[int] = None,
+    limit: int = 10,
+    skip: int = 0,
+    columns: Optional[Tuple] = None,
+) -> List[Any]:
+    """
+    Fetch one page of questions ordered by id.
+
+    When columns are given only those are selected and plain rows are
+    returned instead of QuestionTable objects.
+
+    With a cursor (the last id of the previous page) the query seeks straight
+    to the next page through the (difficulty, id) or (difficulty, topic,
+    question_id) index instead of scanning past skipped rows. Topic filters
+    match questions having any of the given topics.
+    """
+    topic_list = sorted({normalize_topic(t) for t in topics or [] if t.strip()})
+    if topic_list:
+        ids = db.query(QuestionTopic.question_id).filter(QuestionTopic.topic.in_(topic_list))
+        if difficulty:
+            ids = ids.filter(QuestionTopic.difficulty == difficulty)
+        if cursor is not None:
+            ids = ids.filter(QuestionTopic.question_id > cursor)
+        ids = ids.distinct().order_by(QuestionTopic.question_id)
+        if cursor is None and skip:
+            ids = ids.offset(skip)
+        page_ids = [row.question_id for row in ids.limit(limit).all()]
+        if not page_ids:
+            return []
+        query = db.query(*columns) if columns else db.query(QuestionTable)
+        return query.filter(QuestionTable.id.in_(page_ids)).order_by(QuestionTable.id).all()
+
+    query = db.query(*columns) if columns else db.query(QuestionTable)
+    if difficulty:
+        query = query.filter(QuestionTable.difficulty == difficulty)
+    if cursor is not None:
+        query = query.filter(QuestionTable.id > cursor)
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(QuestionTable.id).limit(limit).all()
+
+
+class CatalogCache:
+    """
+    LRU cache of serialized question list pages.
+
+    Every insert bumps a version number that is part of each cache key, so all
+    cached pages are invalidated at once. Entries also expire after a TTL,
+    which bounds how stale another worker's cache can get.
+    """
+
+    def __init__(self, max_entries: int = QUESTION_CATALOG_CACHE_SIZE, ttl: float = QUESTION_CATALOG_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._version = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def key(self, *parts) -> Tuple:
+        return (self._version,) + parts
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or key[0] != self._version or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: Tuple, value: Any):
+        with self._lock:
+            if key[0] != self._version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached page; call after inserting or changing questions."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+
+# Create a singleton instance
+catalog_cache = CatalogCache()
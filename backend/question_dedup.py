@@ -0,0 +1,146 @@
+import os
+import re
+import random
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import QuestionTable
+
+logger = logging.getLogger(__name__)
+
+# Deduplication configuration from environment variables
+QUESTION_DEDUP_ENABLED = os.environ.get("QUESTION_DEDUP_ENABLED", "true").lower() == "true"
+QUESTION_DEDUP_THRESHOLD = float(os.environ.get("QUESTION_DEDUP_THRESHOLD", "0.6"))  # estimated Jaccard similarity
+QUESTION_DEDUP_SHINGLE_SIZE = int(os.environ.get("QUESTION_DEDUP_SHINGLE_SIZE", "3"))  # words per shingle
+
+# 16 bands of 4 rows put the LSH candidate threshold near 0.5, comfortably below QUESTION_DEDUP_THRESHOLD
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # fixed seed so signatures are stable across processes
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+Signature = Tuple[int, ...]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and reduce text to alphanumeric words separated by single spaces."""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def shingles(title: str, desc: str, size: int = QUESTION_DEDUP_SHINGLE_SIZE) -> Set[str]:
+    """Word shingles over the normalized title and description."""
+    words = normalize_text(f"{title} {desc}").split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set: Set[str]) -> Signature:
+    """MinHash signature of a shingle set."""
+    if not shingle_set:
+        return tuple([_MERSENNE_PRIME] * NUM_PERMUTATIONS)
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingle_set]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+
+class QuestionDedupIndex:
+    """
+    In-memory MinHash/LSH index over question titles and descriptions.
+
+    Each question's signature is split into bands; questions sharing any band
+    are candidates, and a candidate whose estimated similarity reaches the
+    threshold counts as a near-duplicate. Exact normalized titles also match.
+    The index is rebuilt from the database at startup and updated on insert.
+    """
+
+    def __init__(self, threshold: float = QUESTION_DEDUP_THRESHOLD, enabled: bool = QUESTION_DEDUP_ENABLED):
+        self.threshold = threshold
+        self.enabled = enabled
+        self._signatures: Dict[int, Signature] = {}
+        self._titles: Dict[str, int] = {}
+        self._bands: List[Dict[Signature, Set[int]]] = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    @staticmethod
+    def _band_keys(signature: Signature) -> List[Signature]:
+        return [signature[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND] for i in range(BANDS)]
+
+    def add(self, question_id: int, title: str, desc: str):
+        """Index a stored question."""
+        signature = minhash(shingles(title, desc))
+        with self._lock:
+            self._signatures[question_id] = signature
+            self._titles.setdefault(normalize_text(title), question_id)
+            for band, key in zip(self._bands, self._band_keys(signature)):
+                band.setdefault(key, set()).add(question_id)
+
+    def remove(self, question_id: int):
+        """Drop a question from the index."""
+        with self._lock:
+            signature = self._signatures.pop(question_id, None)
+            if signature is None:
+                return
+            for band, key in zip(self._bands, self._band_keys(signature)):
+                bucket = band.get(key)
+                if bucket is not None:
+                    bucket.discard(question_id)
+                    if not bucket:
+                        del band[key]
+            for title, indexed_id in list(self._titles.items()):
+                if indexed_id == question_id:
+                    del self._titles[title]
+
+    def find_duplicate(self, title: str, desc: str) -> Optional[int]:
+        """Return the id of an indexed near-duplicate question, or None."""
+        if not self.enabled:
+            return None
+        signature = minhash(shingles(title, desc))
+        with self._lock:
+            exact = self._titles.get(normalize_text(title))
+            if exact is not None:
+                return exact
+            candidates: Set[int] = set()
+            for band, key in zip(self._bands, self._band_keys(signature)):
+                candidates.update(band.get(key, ()))
+            best_id, best_score = None, 0.0
+            for candidate in candidates:
+                score = estimate_similarity(signature, self._signatures[candidate])
+                if score > best_score:
+                    best_id, best_score = candidate, score
+        if best_id is not None and best_score >= self.threshold:
+            return best_id
+        return None
+
+    def rebuild(self, db):
+        """Rebuild the index from every question in the database."""
+        rows = db.query(QuestionTable.id, QuestionTable.title, QuestionTable.desc).all()
+        with self._lock:
+            self._signatures.clear()
+            self._titles.clear()
+            self._bands = [{} for _ in range(BANDS)]
+        for question_id, title, desc in rows:
+            self.add(question_id, title or "", desc or "")
+        logger.info(f"Question dedup index rebuilt with {len(rows)} questions")
+
+
+# Create a singleton instance
+question_dedup_index = QuestionDedupIndex()
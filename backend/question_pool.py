@@ -0,0 +1,177 @@
+import os
+import asyncio
+import logging
+import threading
+import itertools
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from services import build_question_prompt, validate_generated_question, MODEL_NAME
+from ollama_client import ollama_client
+from question_dedup import QuestionDedupIndex, question_dedup_index
+
+logger = logging.getLogger(__name__)
+
+# Question pool configuration from environment variables
+QUESTION_POOL_ENABLED = os.environ.get("QUESTION_POOL_ENABLED", "true").lower() == "true"
+QUESTION_POOL_TARGET_SIZE = int(os.environ.get("QUESTION_POOL_TARGET_SIZE", "5"))  # questions per buffer
+QUESTION_POOL_TOPICS = [t.strip() for t in os.environ.get("QUESTION_POOL_TOPICS", "").split(",") if t.strip()]
+QUESTION_POOL_IDLE_INTERVAL = float(os.environ.get("QUESTION_POOL_IDLE_INTERVAL", "30"))  # seconds between checks when full
+QUESTION_POOL_MAX_BACKOFF = float(os.environ.get("QUESTION_POOL_MAX_BACKOFF", "300"))  # seconds
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+# (difficulty, topic) - a topic of None means "any topic"
+PoolKey = Tuple[str, Optional[str]]
+
+
+class QuestionPool:
+    """
+    Buffers of validated, pre-generated questions per difficulty and topic.
+
+    A background task keeps every buffer topped up from Ollama so requests can
+    take a question immediately; generation latency never reaches the caller.
+    When a buffer is empty, take() returns None and the caller falls back to
+    its existing path.
+    """
+
+    def __init__(
+        self,
+        target_size: int = QUESTION_POOL_TARGET_SIZE,
+        topics: Optional[List[str]] = None,
+        enabled: bool = QUESTION_POOL_ENABLED,
+    ):
+        self.target_size = target_size
+        self.topics = topics if topics is not None else QUESTION_POOL_TOPICS
+        self.enabled = enabled
+        # Buffered entries are (pool id, question); the pool id keys the pending dedup index
+        self._buffers: Dict[PoolKey, Deque[Tuple[int, dict]]] = {}
+        self._pending = QuestionDedupIndex()
+        self._ids = itertools.count(1)
+        for difficulty in DIFFICULTIES:
+            self._buffers[(difficulty, None)] = deque()
+            for topic in self.topics:
+                self._buffers[(difficulty, topic.lower())] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"served": 0, "misses": 0, "generated": 0, "rejected": 0, "duplicates": 0}
+
+    def _key(self, difficulty: str, topic: Optional[str]) -> Optional[PoolKey]:
+        key = (difficulty, topic.lower() if topic else None)
+        return key if key in self._buffers else None
+
+    def take(self, difficulty: str, topic: Optional[str] = None) -> Optional[dict]:
+        """Pop a ready question, or return None if the matching buffer is empty."""
+        if not self.enabled:
+            return None
+        # Prefer the topic's own buffer, then the difficulty-wide one
+        candidates = [key for key in (self._key(difficulty, topic), self._key(difficulty, None)) if key is not None]
+        question = None
+        with self._lock:
+            for key in candidates:
+                if self._buffers[key]:
+                    pool_id, question = self._buffers[key].popleft()
+                    self._pending.remove(pool_id)
+                    break
+        if question is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["served"] += 1
+        self._notify()
+        return question
+
+    def put(self, difficulty: str, topic: Optional[str], question: dict) -> bool:
+        """Add a validated question to its buffer unless it duplicates a stored or buffered one."""
+        key = self._key(difficulty, topic)
+        if key is None:
+            return False
+        if (question_dedup_index.find_duplicate(question["title"], question["desc"]) is not None
+                or self._pending.find_duplicate(question["title"], question["desc"]) is not None):
+            logger.info(f"Question pool rejected near-duplicate '{question['title']}'")
+            return False
+        pool_id = next(self._ids)
+        self._pending.add(pool_id, question["title"], question["desc"])
+        with self._lock:
+            self._buffers[key].append((pool_id, question))
+        return True
+
+    def sizes(self) -> Dict[str, int]:
+        """Current buffer sizes, keyed as "difficulty" or "difficulty/topic"."""
+        with self._lock:
+            return {
+                difficulty if topic is None else f"{difficulty}/{topic}": len(buffer)
+                for (difficulty, topic), buffer in self._buffers.items()
+            }
+
+    def _notify(self):
+        """Wake the refill task; safe to call from request threads."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _most_depleted(self) -> Optional[PoolKey]:
+        with self._lock:
+            key, buffer = min(self._buffers.items(), key=lambda item: len(item[1]))
+            return key if len(buffer) < self.target_size else None
+
+    async def _refill_loop(self):
+        backoff = 1.0
+        while True:
+            key = self._most_depleted()
+            if key is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=QUESTION_POOL_IDLE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            difficulty, topic = key
+            try:
+                if not await ollama_client.check_server():
+                    raise RuntimeError("Ollama server is not available")
+                data = await ollama_client.generate_json(build_question_prompt(difficulty, topic), model=MODEL_NAME)
+                question = validate_generated_question(data, difficulty, topic)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Question pool refill failed: {str(e)}, retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, QUESTION_POOL_MAX_BACKOFF)
+                continue
+
+            if question is None or not self.put(difficulty, topic, question):
+                # A rejected or duplicate question means the model is not producing anything new yet
+                self.stats["rejected" if question is None else "duplicates"] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, QUESTION_POOL_MAX_BACKOFF)
+                continue
+
+            backoff = 1.0
+            self.stats["generated"] += 1
+            logger.info(f"Question pool added '{question['title']}' to {difficulty}/{topic or 'any'}")
+
+    def start(self):
+        """Start the background refill task on the running event loop."""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._refill_loop())
+        logger.info(f"Question pool started (target {self.target_size} per buffer, topics: {self.topics or 'any'})")
+
+    async def stop(self):
+        """Cancel the background refill task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Create a singleton instance
+question_pool = QuestionPool()
@@ -0,0 +1,408 @@
+import os
+import json
+import gzip
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import DateTime, and_, exists, insert, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import InterviewSession, SessionQuestion, EmotionSnapshot, CodeSubmission, SessionArchive
+from blob_store import blob_store
+from code_similarity import unindex_submissions
+
+logger = logging.getLogger(__name__)
+
+# Retention configuration from environment variables
+RETENTION_ENABLED = os.environ.get("RETENTION_ENABLED", "false").lower() == "true"
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "90"))  # sessions idle this long are archived
+RETENTION_ARCHIVE_DIR = os.environ.get("RETENTION_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archives"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "1000"))  # rows per delete or insert statement
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "3600"))  # seconds between archiver runs
+RETENTION_SESSIONS_PER_RUN = int(os.environ.get("RETENTION_SESSIONS_PER_RUN", "100"))
+
+ARCHIVE_FORMAT_VERSION = 2  # 2: rows reference content blobs, embedded under "blobs"
+
+# Archive status values
+ARCHIVING = "archiving"  # file written, hot rows not all deleted yet
+ARCHIVED = "archived"
+REHYDRATED = "rehydrated"  # rows restored to the hot tables; archived again after another retention window
+
+
+def ensure_retention_indexes():
+    """Create retention indexes that create_all skips on tables that already exist."""
+    for table in (InterviewSession.__table__, EmotionSnapshot.__table__, CodeSubmission.__table__):
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                logger.error(f"Error creating index {index.name}: {str(e)}")
+
+
+def _row_to_dict(row: Any) -> Dict[str, Any]:
+    data = {}
+    for attr in inspect(type(row)).column_attrs:
+        value = getattr(row, attr.key)
+        data[attr.key] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def _dict_to_values(model, data: Dict[str, Any]) -> Dict[str, Any]:
+    values = {}
+    for attr in inspect(model).column_attrs:
+        if attr.key not in data:
+            continue
+        value = data[attr.key]
+        if value is not None and isinstance(attr.columns[0].type, DateTime):
+            value = datetime.fromisoformat(value)
+        values[attr.key] = value
+    return values
+
+
+def _archive_line(db: Session, record_type: str, row: Any, *hashes: Optional[str]) -> str:
+    """
+    One archive line; content blobs the row references are embedded so the archive stands alone.
+
+    A blob that is already missing is left out, as the live row could not read it either.
+    """
+    record = {"type": record_type, "data": _row_to_dict(row)}
+    blobs = {blob_hash: blob_store.get_text(db, blob_hash) for blob_hash in hashes if blob_hash}
+    blobs = {blob_hash: text for blob_hash, text in blobs.items() if text is not None}
+    if blobs:
+        record["blobs"] = blobs
+    return json.dumps(record) + "\n"
+
+
+# Columns that tell an archived row apart from a newer hot row that was given the same id
+_ROW_IDENTITY = {
+    EmotionSnapshot: ("session_id", "timestamp"),
+    CodeSubmission: ("session_question_id", "created_at"),
+}
+
+
+def _insert_missing(db: Session, model, batch: List[Dict[str, Any]]):
+    """
+    Insert the archived rows of a batch that are not in the hot table.
+
+    A hot row with the same id and identity was left behind by an interrupted
+    archive run and is kept. An id since taken by a row written after archiving
+    is left to that row, and the archived row is inserted under a new id.
+    """
+    columns = _ROW_IDENTITY[model]
+    present = {
+        row.id: tuple(row[1:])
+        for row in db.query(model.id, *(getattr(model, c) for c in columns)).filter(
+            model.id.in_([values["id"] for values in batch])
+        )
+    }
+    keep_id, new_id = [], []
+    for values in batch:
+        identity = present.get(values["id"])
+        if identity is None:
+            keep_id.append(values)
+        elif identity != tuple(values.get(c) for c in columns):
+            new_id.append({key: value for key, value in values.items() if key != "id"})
+    for rows in (keep_id, new_id):
+        if rows:
+            db.execute(insert(model), rows)
+
+
+def _session_question_ids(session_id: int):
+    return select(SessionQuestion.id).where(SessionQuestion.session_id == session_id)
+
+
+def archive_path(session_id: int) -> str:
+    """Archive file for a session, relative to RETENTION_ARCHIVE_DIR; sharded by id to keep directories small."""
+    return os.path.join(f"{session_id // 1000:06d}", f"session-{session_id}.jsonl.gz")
+
+
+def delete_session_rows(
+    db: Session, session_id: int, batch_size: int = RETENTION_BATCH_SIZE, commit: bool = True
+) -> Tuple[int, int]:
+    """
+    Delete a session's emotion snapshots and code submissions (with their similarity index postings) in batches.
+
+    Each batch is its own short transaction, so deleting a long session never
+    holds locks on (or builds undo for) every row at once. With commit=False
+    the batches run in the caller's transaction instead, for deletes that must
+    succeed or fail as a whole. Returns the number of snapshots and submissions deleted.
+    """
+    counts = []
+    for model, condition in (
+        (EmotionSnapshot, EmotionSnapshot.session_id == session_id),
+        (CodeSubmission, CodeSubmission.session_question_id.in_(_session_question_ids(session_id))),
+    ):
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.query(model.id).filter(condition).order_by(model.id).limit(batch_size)]
+            if not ids:
+                break
+            if model is CodeSubmission:
+                unindex_submissions(db, ids)
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            if commit:
+                db.commit()
+            deleted += len(ids)
+        counts.append(deleted)
+    return counts[0], counts[1]
+
+
+def write_archive(db: Session, session: InterviewSession, path: str) -> Tuple[int, int, int]:
+    """
+    Stream a session and its rows into a gzip-compressed JSON lines file.
+
+    The first line describes the session; every following line is one
+    session question, emotion snapshot or code submission. The file is
+    written under a temporary name and renamed, so a partial archive is
+    never visible. Returns the snapshot count, submission count and file size.
+    """
+    full_path = os.path.join(RETENTION_ARCHIVE_DIR, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = full_path + ".tmp"
+    snapshots = submissions = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "session", "version": ARCHIVE_FORMAT_VERSION, "data": _row_to_dict(session)}) + "\n")
+        for question in db.query(SessionQuestion).filter(SessionQuestion.session_id == session.id).order_by(SessionQuestion.id):
+            f.write(_archive_line(db, "session_question", question, question.test_results_hash))
+        for snapshot in db.query(EmotionSnapshot).filter(
+            EmotionSnapshot.session_id == session.id
+        ).order_by(EmotionSnapshot.id).yield_per(RETENTION_BATCH_SIZE):
+            f.write(json.dumps({"type": "emotion_snapshot", "data": _row_to_dict(snapshot)}) + "\n")
+            snapshots += 1
+        for submission in db.query(CodeSubmission).filter(
+            CodeSubmission.session_question_id.in_(_session_question_ids(session.id))
+        ).order_by(CodeSubmission.id).yield_per(RETENTION_BATCH_SIZE):
+            f.write(_archive_line(db, "code_submission", submission, submission.code_hash, submission.response_hash))
+            submissions += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, full_path)
+    return snapshots, submissions, os.path.getsize(full_path)
+
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the records of an archive file."""
+    with gzip.open(os.path.join(RETENTION_ARCHIVE_DIR, path), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def archive_session(db: Session, session_id: int) -> Optional[SessionArchive]:
+    """
+    Move a session's snapshots and code submissions into its archive file.
+
+    The session and its questions stay in the hot tables so listings and
+    reports keep working. An archive left in the archiving state by an
+    interrupted run only has its remaining hot rows deleted.
+    """
+    session = db.query(InterviewSession).filter(InterviewSession.id == session_id).first()
+    if session is None:
+        return None
+    record = db.get(SessionArchive, session_id)
+    if record is None or record.status == REHYDRATED:
+        path = archive_path(session_id)
+        snapshots, submissions, size = write_archive(db, session, path)
+        if record is None:
+            record = SessionArchive(session_id=session_id)
+            db.add(record)
+        record.status = ARCHIVING
+        record.path = path
+        record.snapshot_count = snapshots
+        record.submission_count = submissions
+        record.size_bytes = size
+        record.archived_at = datetime.now()
+        record.rehydrated_at = None
+        db.commit()
+    elif record.status == ARCHIVED:
+        return record
+
+    delete_session_rows(db, session_id)
+    record.status = ARCHIVED
+    db.commit()
+    logger.info(f"Archived session {session_id}: {record.snapshot_count} snapshots, "
+                f"{record.submission_count} submissions, {record.size_bytes} bytes")
+    return record
+
+
+def rehydrate_session(db: Session, session_id: int) -> Optional[SessionArchive]:
+    """
+    Restore an archived session's snapshots and code submissions to the hot tables.
+
+    Rows keep their original ids unless a row written after archiving took
+    the id. Hot rows are never deleted: snapshots and submissions recorded
+    while the session was archived stay alongside the restored ones. Returns
+    None when the session has no archive.
+    """
+    record = db.get(SessionArchive, session_id)
+    if record is None:
+        return None
+    if record.status == REHYDRATED:
+        return record
+
+    batches: Dict[str, List[Dict[str, Any]]] = {"emotion_snapshot": [], "code_submission": []}
+    models = {"emotion_snapshot": EmotionSnapshot, "code_submission": CodeSubmission}
+    for line in read_archive(record.path):
+        record_type = line["type"]
+        batch = batches.get(record_type)
+        if batch is None:
+            continue
+        # Referenced blobs may have been collected while the rows were archived;
+        # archives written before missing blobs were left out store those as null
+        for text in line.get("blobs", {}).values():
+            if text is not None:
+                blob_store.put_text(db, text)
+        values = _dict_to_values(models[record_type], line["data"])
+        if record_type == "code_submission":
+            # Its similarity postings were deleted; leave it for the backfill to index again
+            values["fingerprint_count"] = None
+        batch.append(values)
+        if len(batch) >= RETENTION_BATCH_SIZE:
+            _insert_missing(db, models[record_type], batch)
+            batch.clear()
+    for record_type, batch in batches.items():
+        if batch:
+            _insert_missing(db, models[record_type], batch)
+
+    record.status = REHYDRATED
+    record.rehydrated_at = datetime.now()
+    db.commit()
+    logger.info(f"Rehydrated session {session_id} from {record.path}")
+    return record
+
+
+def remove_archive(db: Session, session_id: int) -> Optional[str]:
+    """
+    Delete a session's archive record (the caller commits) and return its file path.
+
+    The file itself is left for unlink_archive once the commit succeeded, so a
+    failed delete never loses the archived rows.
+    """
+    record = db.get(SessionArchive, session_id)
+    if record is None:
+        return None
+    db.delete(record)
+    return record.path
+
+
+def unlink_archive(path: str):
+    """Delete an archive file returned by remove_archive."""
+    try:
+        os.remove(os.path.join(RETENTION_ARCHIVE_DIR, path))
+    except FileNotFoundError:
+        pass
+
+
+def archive_candidates(db: Session, cutoff: datetime, limit: int = RETENTION_SESSIONS_PER_RUN) -> List[int]:
+    """
+    Ids of sessions whose last activity is before cutoff and whose rows are still in the hot tables.
+
+    Activity is the session's start and end time and its newest emotion
+    snapshot or code submission. Sessions are rarely marked completed, so an
+    open session idle for the whole retention window counts as abandoned.
+    """
+    recent_snapshot = exists().where(
+        EmotionSnapshot.session_id == InterviewSession.id,
+        EmotionSnapshot.timestamp >= cutoff,
+    )
+    recent_submission = exists().where(
+        SessionQuestion.session_id == InterviewSession.id,
+        CodeSubmission.session_question_id == SessionQuestion.id,
+        CodeSubmission.created_at >= cutoff,
+    )
+    rows = db.query(InterviewSession.id).outerjoin(
+        SessionArchive, SessionArchive.session_id == InterviewSession.id
+    ).filter(
+        InterviewSession.start_time < cutoff,
+        or_(InterviewSession.end_time.is_(None), InterviewSession.end_time < cutoff),
+        ~recent_snapshot,
+        ~recent_submission,
+        or_(
+            SessionArchive.session_id.is_(None),
+            SessionArchive.status == ARCHIVING,
+            and_(SessionArchive.status == REHYDRATED, SessionArchive.rehydrated_at < cutoff),
+        )
+    ).order_by(InterviewSession.id).limit(limit).all()
+    return [row.id for row in rows]
+
+
+class SessionArchiver:
+    """
+    Background task that periodically archives sessions older than the retention window.
+
+    Database and file work runs in the thread pool; the event loop only
+    schedules runs.
+    """
+
+    def __init__(
+        self,
+        retention_days: int = RETENTION_DAYS,
+        interval: float = RETENTION_INTERVAL,
+        enabled: bool = RETENTION_ENABLED,
+    ):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "archived": 0, "failed": 0, "last_run": None}
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Archive one batch of eligible sessions; returns how many were archived."""
+        cutoff = (now or datetime.now()) - timedelta(days=self.retention_days)
+        archived = 0
+        db = SessionLocal()
+        try:
+            for session_id in archive_candidates(db, cutoff):
+                try:
+                    if archive_session(db, session_id) is not None:
+                        archived += 1
+                except Exception as e:
+                    db.rollback()
+                    self.stats["failed"] += 1
+                    logger.error(f"Error archiving session {session_id}: {str(e)}")
+        finally:
+            db.close()
+        self.stats["runs"] += 1
+        self.stats["archived"] += archived
+        self.stats["last_run"] = datetime.now().isoformat()
+        return archived
+
+    async def _archive_loop(self):
+        while True:
+            try:
+                archived = await run_in_threadpool(self.run_once)
+                if archived:
+                    logger.info(f"Session archiver moved {archived} sessions out of the hot tables")
+                # A full batch means more sessions are waiting
+                if archived >= RETENTION_SESSIONS_PER_RUN:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Session archiver run failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background archive task on the running event loop."""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._archive_loop())
+        logger.info(f"Session archiver started (retention {self.retention_days} days, archives in {RETENTION_ARCHIVE_DIR})")
+
+    async def stop(self):
+        """Cancel the background archive task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Create a singleton instance
+session_archiver = SessionArchiver()
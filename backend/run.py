@@ -5,6 +5,7 @@ import requests
 import time
 import sys
 from services import MOCK_MODE
+from ollama_client import OLLAMA_URL
 
 # Configure logging
 logging.basicConfig(
@@ -17,7 +18,7 @@ def check_ollama_available():
     """Check if Ollama server is available and get available models"""
     try:
         logger.info("Checking if Ollama server is available...")
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
+        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=2)
         
         if response.status_code == 200:
             models = response.json().get("models", [])
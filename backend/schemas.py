@@ -72,6 +72,8 @@ class TestResult(BaseModel):
     passed: bool
     passed_test_cases: int
     total_test_cases: int
+    skipped_test_cases: int = 0  # not run because evaluation stopped early
+    mode: Optional[str] = None
     results: List[TestCaseResult]
     feedback: str
     time_complexity: str
@@ -109,6 +111,12 @@ class EmotionSnapshot(EmotionSnapshotCreate):
     class Config:
         orm_mode = True
 
+class FrameMeta(BaseModel):
+    """Per-frame metadata of a batch emotion upload."""
+    session_id: Optional[int] = None
+    question_id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+
 class SessionQuestionCreate(BaseModel):
     question_id: int
     order_index: int = 0
@@ -140,6 +148,24 @@ class SessionQuestion(BaseModel):
     class Config:
         orm_mode = True
 
+class CodePatch(BaseModel):
+    """Replace the characters in [start, end) of the current code with text."""
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str = ""
+
+class CodeAutosave(BaseModel):
+    base_revision: int = Field(..., ge=0)  # revision the patches were made against
+    patches: List[CodePatch] = []  # applied in order, each against the result of the previous one
+    language: Optional[str] = None
+
+class CodeAutosaveState(BaseModel):
+    revision: int
+    persisted_revision: int  # last revision written to the database
+    length: int
+    language: Optional[str] = None
+    code: Optional[str] = None  # only returned when fetching the full state
+
 class InterviewSessionCreate(BaseModel):
     user_id: Optional[int] = None
     session_name: Optional[str] = None
@@ -175,4 +201,24 @@ class InterviewSessionWithDetails(InterviewSession):
     emotion_snapshots: List[EmotionSnapshot] = []
     
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class EmotionSummaryPoint(BaseModel):
+    """Averages over one slice of a session's emotion snapshots."""
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    snapshots: int
+    attention_level: Optional[float] = None
+    positivity_level: Optional[float] = None
+    arousal_level: Optional[float] = None
+    dominant_emotion: Optional[str] = None
+    face_detected_ratio: float
+
+class InterviewSessionDetail(InterviewSession):
+    """Session detail with only the requested relations; omitted relations are left out of the response."""
+    session_questions: Optional[List[SessionQuestion]] = None
+    emotion_snapshots: Optional[List[EmotionSnapshot]] = None
+    emotion_snapshot_count: Optional[int] = None
+    emotion_snapshots_truncated: Optional[bool] = None
+    emotion_snapshots_url: Optional[str] = None
+    emotion_summary: Optional[List[EmotionSummaryPoint]] = None 
\ No newline at end of file
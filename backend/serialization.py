@@ -0,0 +1,58 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from models import QuestionTable
+from schemas import Question
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    logger.warning("orjson is not installed, falling back to the standard JSON response (pip install orjson)")
+    FastJSONResponse = JSONResponse
+
+# Validators and serializers built once at import instead of per request
+question_adapter = TypeAdapter(Question)
+question_list_adapter = TypeAdapter(List[Question])
+
+# Columns loaded for question responses, in schema order; list endpoints select
+# these directly instead of hydrating full ORM objects
+QUESTION_COLUMNS = tuple(getattr(QuestionTable, name) for name in Question.model_fields)
+
+
+def question_from_row(row: Any) -> Question:
+    """Validate an ORM question or a projected row into the response model."""
+    mapping = getattr(row, "_mapping", None)
+    if mapping is not None:
+        return question_adapter.validate_python(dict(mapping))
+    return question_adapter.validate_python(row, from_attributes=True)
+
+
+def questions_from_rows(rows: Iterable[Any]) -> List[Question]:
+    return [question_from_row(row) for row in rows]
+
+
+def dump_question(question: Question) -> bytes:
+    """JSON body for one question, serialized by pydantic-core."""
+    return question_adapter.dump_json(question)
+
+
+def dump_questions(questions: List[Question]) -> bytes:
+    """JSON body for a list of questions, serialized by pydantic-core."""
+    return question_list_adapter.dump_json(questions)
+
+
+def raw_json_response(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Response for an already serialized JSON body.
+
+    Returning a Response from a path operation skips FastAPI's response_model
+    validation and jsonable_encoder pass, so bodies serialized (and possibly
+    cached) with the adapters above are sent as they are.
+    """
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
@@ -2,15 +2,20 @@ import os
 import sys
 import logging
 import json
-import requests
-import time
 import random
 import re
 import cv2
+import time
 import base64
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
-from judge0_service import judge0_service
+from judge0_service import judge0_service, COMPILATION_ERROR_STATUS_ID
+from face_detection import face_detector
+from frame_sampler import frame_sampler
+from emotion_model import get_emotion_model
+from output_compare import compile_expected, outputs_match
+from instrumentation import span
 
 # Configure logging
 logging.basicConfig(
@@ -24,8 +29,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Configuration from environment variables
-OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
-OLLAMA_API_URL = f"{OLLAMA_URL}"
 MODEL_NAME = os.environ.get("OLLAMA_MODEL_NAME", "llama3")
 MOCK_MODE = os.environ.get("MOCK_MODE", "false").lower() == "true"
 
@@ -34,8 +37,12 @@ if MOCK_MODE:
 else:
     logger.info(f"Using Ollama with model: {MODEL_NAME}")
 
-# Ollama API configuration
-OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "120"))  # seconds
+# Worker threads for batched frame analysis (OpenCV releases the GIL while decoding and detecting)
+EMOTION_BATCH_WORKERS = int(os.environ.get("EMOTION_BATCH_WORKERS", str(os.cpu_count() or 4)))
+
+# Code evaluation: "run" stops at the first failing test case, "submit" runs them all
+EVALUATION_MODES = ("run", "submit")
+EVALUATION_DEFAULT_MODE = os.environ.get("EVALUATION_DEFAULT_MODE", "submit").lower()
 
 # Sample questions for mock mode
 MOCK_QUESTIONS = [
@@ -181,74 +188,6 @@ MOCK_QUESTIONS = [
     }
 ]
 
-# Cache for Haarcascade file
-face_cascade = None
-
-def check_ollama_server() -> bool:
-    """Check if Ollama server is available"""
-    try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        return response.status_code == 200
-    except Exception as e:
-        logger.error(f"Ollama server check failed: {e}")
-        return False
-
-def get_available_models():
-    """Get list of available Ollama models."""
-    try:
-        if MOCK_MODE:
-            logger.info("Running in mock mode, not checking available models")
-            return ["llama3.2:latest"]
-        
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            return [model.get("name") for model in models]
-        return []
-    except Exception as e:
-        logger.error(f"Error getting available models: {str(e)}")
-        return []
-
-def call_llama(prompt, model="llama3", max_tokens=2048, temperature=0.7, timeout=60, retries=3, retry_delay=2):
-    """Call the Llama model via Ollama API"""
-    attempt = 1
-    while attempt <= retries:
-        try:
-            logging.info(f"Sending prompt to Llama model (attempt {attempt})")
-            response = requests.post(
-                f"{OLLAMA_API_URL}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "system": "You are a helpful assistant for generating programming interview questions.",
-                    "stream": False,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature
-                },
-                timeout=timeout  # Reduced timeout from 120 to 60 seconds
-            )
-            response.raise_for_status()
-            return response.json()["response"]
-        except requests.exceptions.Timeout:
-            logging.error(f"Request timed out after {timeout} seconds")
-            if attempt < retries:
-                logging.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                attempt += 1
-            else:
-                logging.error("Maximum retries reached. Falling back to mock question.")
-                return get_mock_question_json(prompt)
-        except Exception as e:
-            logging.error(f"Error calling Llama model: {str(e)}")
-            if attempt < retries:
-                logging.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                attempt += 1
-            else:
-                logging.error("Maximum retries reached. Falling back to mock question.")
-                return get_mock_question_json(prompt)
-    return None  # This should never be reached
-
 def get_mock_question_json(prompt):
     """Generate a mock question based on the difficulty in the prompt"""
     logger.info("Using mock question data")
@@ -412,6 +351,74 @@ def generate_question(difficulty: str = "medium") -> dict:
     # Rest of the function can be skipped as we're always using mock mode
     # This code won't be executed
 
+QUESTION_PROMPT_TEMPLATE = """Generate a unique data structures and algorithms coding interview question.
+Difficulty: {difficulty}
+{topic_line}
+Respond with only a JSON object, no markdown, using exactly these fields:
+{{
+  "title": "String",
+  "desc": "String",
+  "difficulty": "{difficulty}",
+  "example": {{"input": "String", "output": "String", "explanation": "String"}},
+  "constraints": ["String"],
+  "topics": ["String"],
+  "test_cases": [{{"input": "String", "output": "String", "explanation": "String"}}]
+}}
+Include at least 3 test cases whose outputs are exactly what a correct program prints."""
+
+def build_question_prompt(difficulty: str, topic: Optional[str] = None) -> str:
+    """Build the Llama prompt for a question of the given difficulty and optional topic."""
+    topic_line = f"Topic: {topic}" if topic else "Topic: any"
+    return QUESTION_PROMPT_TEMPLATE.format(difficulty=difficulty, topic_line=topic_line)
+
+def validate_generated_question(data: Any, difficulty: str, topic: Optional[str] = None) -> Optional[dict]:
+    """
+    Check that a generated question has everything the API needs.
+    
+    Returns a cleaned copy of the question, or None if it is unusable.
+    """
+    if not isinstance(data, dict):
+        return None
+    title = data.get("title")
+    desc = data.get("desc")
+    if not isinstance(title, str) or not title.strip() or not isinstance(desc, str) or not desc.strip():
+        return None
+    
+    example = data.get("example")
+    if not isinstance(example, dict) or "input" not in example or "output" not in example:
+        return None
+    
+    test_cases = data.get("test_cases")
+    if not isinstance(test_cases, list) or not test_cases:
+        test_cases = generate_test_cases_from_example(data)
+    cleaned_cases = []
+    for case in test_cases:
+        if not isinstance(case, dict) or "input" not in case or "output" not in case:
+            return None
+        cleaned_cases.append({
+            "input": str(case["input"]),
+            "output": str(case["output"]),
+            "explanation": str(case.get("explanation", ""))
+        })
+    
+    topics = [str(t) for t in data.get("topics") or [] if t]
+    if topic and topic.lower() not in (t.lower() for t in topics):
+        topics.append(topic)
+    
+    return {
+        "title": title.strip(),
+        "desc": desc.strip(),
+        "difficulty": difficulty,
+        "example": {
+            "input": str(example["input"]),
+            "output": str(example["output"]),
+            "explanation": str(example.get("explanation", ""))
+        },
+        "constraints": [str(c) for c in data.get("constraints") or []],
+        "topics": topics,
+        "test_cases": cleaned_cases
+    }
+
 def get_fallback_question(difficulty: str) -> dict:
     """Get a fallback question when generation fails."""
     # Filter by difficulty if specified
@@ -502,7 +509,26 @@ def generate_test_cases_from_example(question_data: dict) -> list:
     
     return test_cases 
 
-def evaluate_code_submission(code: str, language: str, question) -> dict:
+def resolve_evaluation_mode(mode: Optional[str]) -> str:
+    """Return a valid evaluation mode, defaulting to EVALUATION_DEFAULT_MODE."""
+    mode = (mode or EVALUATION_DEFAULT_MODE).lower()
+    if mode not in EVALUATION_MODES:
+        logger.warning(f"Unknown evaluation mode '{mode}', using '{EVALUATION_DEFAULT_MODE}'")
+        mode = EVALUATION_DEFAULT_MODE
+    return mode
+
+def should_stop_evaluation(status_id: int, passed: bool, mode: str) -> bool:
+    """
+    Whether a test case outcome ends the evaluation early.
+    
+    A compile error fails every test case the same way, so it always stops
+    the run; in "run" mode the first failing test case stops it as well.
+    """
+    if status_id == COMPILATION_ERROR_STATUS_ID:
+        return True
+    return mode == "run" and not passed
+
+def evaluate_code_submission(code: str, language: str, question, mode: Optional[str] = None) -> dict:
     """
     Evaluate a code submission against test cases in a question using Judge0.
     
@@ -510,6 +536,8 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
         code: The submitted code
         language: The programming language of the submission
         question: The question object with test cases
+        mode: "run" stops at the first failing test case, "submit" runs them all;
+            a compile error stops either mode after the first test case
         
     Returns:
         A TestResult object with the evaluation results
@@ -532,12 +560,21 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
             "space_complexity": "Unknown"
         }
     
+    # Expected outputs are parsed once per question and language when the question is cached
+    if hasattr(question, "expected_outputs"):
+        expected_outputs = question.expected_outputs(language)
+    else:
+        expected_outputs = compile_expected(test_cases, language)
+    
+    mode = resolve_evaluation_mode(mode)
+    
     # Execute code against each test case
     results = []
     passed_count = 0
     total_execution_time = 0
+    stopped_reason = None
     
-    for test_case in test_cases:
+    for test_case, expected in zip(test_cases, expected_outputs):
         try:
             # Execute the code with the test case input
             execution_result = judge0_service.execute_code(
@@ -554,7 +591,7 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
             if execution_result['status']['id'] == 3:  # 3: Accepted
                 actual_output = execution_result['stdout'].strip()
                 expected_output = test_case['output'].strip()
-                passed = actual_output == expected_output
+                passed = outputs_match(expected, actual_output, language)
                 
                 if passed:
                     passed_count += 1
@@ -575,6 +612,12 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
                 "execution_time": execution_time
             })
             
+            # Skip the remaining test cases once the outcome is settled
+            status_id = execution_result['status']['id']
+            if should_stop_evaluation(status_id, passed, mode):
+                stopped_reason = "compile_error" if status_id == COMPILATION_ERROR_STATUS_ID else "failed"
+                break
+            
         except Exception as e:
             logger.error(f"Error executing test case: {str(e)}")
             results.append({
@@ -587,10 +630,19 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
     
     # Calculate overall success
     total_test_cases = len(test_cases)
+    skipped_count = total_test_cases - len(results)
     all_passed = passed_count == total_test_cases
     
     # Generate feedback based on performance
-    if all_passed:
+    if stopped_reason == "compile_error":
+        feedback = "Your code did not compile. Fix the compilation error and try again."
+        time_complexity = "Unknown"
+        space_complexity = "Unknown"
+    elif stopped_reason == "failed" and skipped_count:
+        feedback = f"Stopped at the first failing test case; {skipped_count} remaining test cases were not run."
+        time_complexity = "Unknown"
+        space_complexity = "Unknown"
+    elif all_passed:
         feedback = "Excellent work! Your solution passes all test cases."
         time_complexity = "O(n)"  # This would be estimated from actual execution patterns
         space_complexity = "O(n)"
@@ -608,6 +660,8 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
         "passed": all_passed,
         "total_test_cases": total_test_cases,
         "passed_test_cases": passed_count,
+        "skipped_test_cases": skipped_count,
+        "mode": mode,
         "results": results,
         "overall_execution_time": total_execution_time,
         "feedback": feedback,
@@ -615,66 +669,248 @@ def evaluate_code_submission(code: str, language: str, question) -> dict:
         "space_complexity": space_complexity
     }
 
-def analyze_facial_expression(image_data: str) -> Dict[str, Any]:
+def _default_emotion_result(error: Optional[str] = None) -> Dict[str, Any]:
+    """Neutral result used when no face is found or analysis fails."""
+    result = {
+        "attention_level": 0.5,
+        "positivity_level": 0.5,
+        "arousal_level": 0.5,
+        "dominant_emotion": "neutral",
+        "face_detected": False
+    }
+    if error is not None:
+        result["error"] = error
+    return result
+
+def decode_frame(frame_bytes) -> np.ndarray:
+    """
+    Decode JPEG/WebP/PNG bytes straight to a grayscale image.
+    
+    Accepts bytes, bytearray or memoryview; the buffer is wrapped without
+    copying and decoded directly to grayscale, skipping the color conversion.
+    """
+    nparr = np.frombuffer(frame_bytes, np.uint8)
+    gray = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not decode image data")
+    return gray
+
+def analyze_frame(gray: np.ndarray, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analyze facial expression in an already decoded grayscale frame.
+    
+    Frames nearly identical to the session's previous frame reuse its result
+    ("reused": true). Every result carries "next_interval_ms", the suggested
+    delay before the client sends its next frame.
+    """
+    thumb = None
+    if session_id is not None and frame_sampler.enabled:
+        with span("emotion.dedup"):
+            thumb = frame_sampler.thumbnail(gray)
+            cached = frame_sampler.lookup(session_id, thumb)
+        if cached is not None:
+            return {**cached, "reused": True, "next_interval_ms": frame_sampler.recommend_interval_ms(session_id)}
+    
+    frame_sampler.begin()
+    try:
+        result = _run_emotion_analysis(gray, session_id)
+    finally:
+        frame_sampler.end()
+    
+    if thumb is not None:
+        frame_sampler.record(session_id, thumb, result)
+    return {**result, "reused": False, "next_interval_ms": frame_sampler.recommend_interval_ms(session_id)}
+
+def _detect_face_roi(gray: np.ndarray, session_id: Optional[str] = None) -> Optional[np.ndarray]:
+    """Detect the largest face and return its crop, or None if no face is found."""
+    # Detect faces on a downscaled frame, starting from the last known position
+    with span("emotion.detect_face"):
+        faces = face_detector.detect(gray, session_id)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = faces[0]
+    return gray[y:y + h, x:x + w]
+
+def _run_emotion_analysis(gray: np.ndarray, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run face detection and emotion scoring on a grayscale frame."""
+    face = _detect_face_roi(gray, session_id)
+    
+    # If no face is detected, return default values
+    if face is None:
+        return _default_emotion_result()
+    
+    # Score the face crop with the configured emotion model
+    with span("emotion.model", batch_size=1):
+        result = get_emotion_model().predict([face])[0]
+    return {**result, "face_detected": True}
+
+def analyze_frame_bytes(frame_bytes, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Analyze facial expression from raw encoded image bytes."""
+    try:
+        with span("emotion.decode"):
+            gray = decode_frame(frame_bytes)
+        return analyze_frame(gray, session_id)
+    except Exception as e:
+        logger.error(f"Error analyzing facial expression: {str(e)}")
+        return _default_emotion_result(str(e))
+
+def analyze_facial_expression(image_data: str, session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Analyze facial expression from base64 encoded image
     Returns confidence, engagement, and dominant emotion
-    """
-    global face_cascade
     
+    When session_id is given, the face position is tracked across frames so
+    detection can search around the previous face first.
+    """
     try:
-        # Initialize face detection if not already done
-        if face_cascade is None:
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
         # Convert base64 to image
-        img_data = base64.b64decode(image_data.split(',')[1])
-        nparr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        # If no face is detected, return default values
-        if len(faces) == 0:
-            return {
-                "attention_level": 0.5,
-                "positivity_level": 0.5,
-                "arousal_level": 0.5,
-                "dominant_emotion": "neutral",
-                "face_detected": False
-            }
-        
-        # For demo purposes, generate random emotion metrics
-        # In a real implementation, we would use a proper ML model here
-        attention = random.uniform(0.7, 1.0)
-        positivity = random.uniform(0.6, 0.9)
-        arousal = random.uniform(0.65, 0.95)
-        
-        # Select a dominant emotion based on positivity and arousal
-        emotions = ["happy", "confident", "neutral", "uncomfortable"]
-        weights = [0.4, 0.3, 0.2, 0.1]  # Bias toward positive emotions for demo
-        dominant_emotion = random.choices(emotions, weights=weights, k=1)[0]
-        
-        return {
-            "attention_level": attention,
-            "positivity_level": positivity,
-            "arousal_level": arousal,
-            "dominant_emotion": dominant_emotion,
-            "face_detected": True
-        }
-        
+        with span("emotion.decode"):
+            img_data = base64.b64decode(image_data[image_data.find(',') + 1:])
+            gray = decode_frame(img_data)
+        return analyze_frame(gray, session_id)
     except Exception as e:
         logger.error(f"Error analyzing facial expression: {str(e)}")
         # Return default values on error
-        return {
-            "attention_level": 0.5,
-            "positivity_level": 0.5,
-            "arousal_level": 0.5,
-            "dominant_emotion": "neutral",
-            "face_detected": False,
-            "error": str(e)
-        } 
\ No newline at end of file
+        return _default_emotion_result(str(e))
+
+# Thread pool for batched frame analysis, created on first use
+_batch_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_batch_executor() -> ThreadPoolExecutor:
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(max_workers=EMOTION_BATCH_WORKERS, thread_name_prefix="emotion-batch")
+    return _batch_executor
+
+def _decode_frame_safe(frame_bytes):
+    """Decode a frame, returning the exception instead of raising it."""
+    try:
+        return decode_frame(frame_bytes)
+    except Exception as e:
+        return e
+
+def analyze_frames_batch(
+    frames: List[bytes],
+    session_ids: Optional[List[Optional[str]]] = None,
+    timestamps: Optional[List[Optional[float]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Analyze many encoded frames together.
+    
+    Frames are decoded in parallel, faces are detected per session in order,
+    and all face crops of the batch are scored in a single model call.
+    Deduplication follows the same rules as analyze_frame: a frame reuses the
+    session's stored result or an earlier frame of the batch only while it is
+    similar and within the maximum reuse window.
+    
+    Args:
+        frames: Encoded JPEG/WebP/PNG frames
+        session_ids: Optional session key per frame, used for face tracking and deduplication
+        timestamps: Optional capture time per frame (epoch seconds); frames without one
+            count as captured when the batch arrived
+        
+    Returns:
+        One analysis result per frame, in input order
+    """
+    if session_ids is None:
+        session_ids = [None] * len(frames)
+    if len(session_ids) != len(frames):
+        raise ValueError("session_ids must have one entry per frame")
+    if timestamps is None:
+        timestamps = [None] * len(frames)
+    if len(timestamps) != len(frames):
+        raise ValueError("timestamps must have one entry per frame")
+    
+    received_at = time.time()
+    captured_at = [ts if ts is not None else received_at for ts in timestamps]
+    executor = _get_batch_executor()
+    
+    # Decode every frame in parallel
+    with span("emotion.decode", frames=len(frames)):
+        decoded = list(executor.map(_decode_frame_safe, frames))
+    
+    # Frames of the same session must be processed in order so that face
+    # tracking and deduplication see them as a stream; sessions run in parallel
+    groups: Dict[Any, List[int]] = {}
+    for index, session_id in enumerate(session_ids):
+        key = session_id if session_id is not None else ("frame", index)
+        groups.setdefault(key, []).append(index)
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(frames)
+    faces: Dict[int, np.ndarray] = {}
+    thumbs: Dict[int, np.ndarray] = {}
+    duplicate_of: Dict[int, int] = {}
+    analyzing: List[int] = []
+    
+    def detect_group(indices: List[int]):
+        previous = None
+        for index in indices:
+            frame = decoded[index]
+            if isinstance(frame, Exception):
+                logger.error(f"Error decoding frame {index}: {str(frame)}")
+                results[index] = _default_emotion_result(str(frame))
+                continue
+            try:
+                session_id = session_ids[index]
+                if session_id is not None and frame_sampler.enabled:
+                    thumb = frame_sampler.thumbnail(frame)
+                    if previous is None:
+                        # Until a frame of this batch is analyzed, the session's stored result is the latest
+                        cached = frame_sampler.lookup(session_id, thumb)
+                        if cached is not None:
+                            results[index] = {**cached, "reused": True}
+                            continue
+                    elif frame_sampler.can_reuse(thumbs[previous], captured_at[previous], thumb, captured_at[index]):
+                        duplicate_of[index] = previous
+                        continue
+                    thumbs[index] = thumb
+                    previous = index
+                analyzing.append(index)
+                frame_sampler.begin()
+                face = _detect_face_roi(frame, session_id)
+                if face is None:
+                    results[index] = _default_emotion_result()
+                else:
+                    faces[index] = face
+            except Exception as e:
+                logger.error(f"Error analyzing frame {index}: {str(e)}")
+                results[index] = _default_emotion_result(str(e))
+    
+    try:
+        with span("emotion.detect_face", frames=len(frames), sessions=len(groups)):
+            list(executor.map(detect_group, groups.values()))
+        
+        # Score every detected face in one batched inference call
+        if faces:
+            face_indices = sorted(faces)
+            try:
+                with span("emotion.model", batch_size=len(face_indices)):
+                    scores = get_emotion_model().predict([faces[i] for i in face_indices])
+                for index, score in zip(face_indices, scores):
+                    results[index] = {**score, "face_detected": True}
+            except Exception as e:
+                logger.error(f"Error scoring face batch: {str(e)}")
+                for index in face_indices:
+                    results[index] = _default_emotion_result(str(e))
+    finally:
+        frame_sampler.end(len(analyzing))
+    
+    for index, source in sorted(duplicate_of.items()):
+        results[index] = {**results[source], "reused": True}
+    
+    # Replay the batch into the sampler frame by frame, as the streaming path would have
+    for indices in groups.values():
+        for index in indices:
+            if index in thumbs and "error" not in results[index]:
+                frame_sampler.record(session_ids[index], thumbs[index], results[index])
+            elif index in duplicate_of:
+                frame_sampler.reused(session_ids[index])
+    
+    results = [
+        {**result, "reused": result.get("reused", False),
+         "next_interval_ms": frame_sampler.recommend_interval_ms(session_ids[index])}
+        for index, result in enumerate(results)
+    ]
+    
+    logger.info(f"Analyzed batch of {len(frames)} frames across {len(groups)} groups ({len(faces)} faces scored)")
+    return results
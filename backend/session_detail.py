@@ -0,0 +1,169 @@
+import os
+import json
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from models import InterviewSession, EmotionSnapshot
+from blob_store import blob_store
+from schemas import (
+    InterviewSession as InterviewSessionSchema, InterviewSessionDetail, EmotionSummaryPoint,
+    SessionQuestion as SessionQuestionSchema, EmotionSnapshot as EmotionSnapshotSchema
+)
+
+logger = logging.getLogger(__name__)
+
+# Session detail configuration from environment variables
+SESSION_DETAIL_MAX_SNAPSHOTS = int(os.environ.get("SESSION_DETAIL_MAX_SNAPSHOTS", "200"))  # embedded snapshots per response
+SESSION_DETAIL_SUMMARY_POINTS = int(os.environ.get("SESSION_DETAIL_SUMMARY_POINTS", "60"))  # slices in the downsampled summary
+SESSION_DETAIL_STREAM_BATCH = 1000  # snapshot rows fetched at a time while summarizing
+
+SESSION_INCLUDES = ("questions", "snapshots", "summary")
+DEFAULT_SESSION_INCLUDES = ("questions", "snapshots")
+SESSION_FIELDS = tuple(InterviewSessionSchema.model_fields)
+SESSION_QUESTION_FIELDS = tuple(name for name in SessionQuestionSchema.model_fields if name != "test_results")
+
+# Response keys contributed by each include
+_INCLUDE_KEYS = {
+    "questions": {"session_questions"},
+    "snapshots": {"emotion_snapshots", "emotion_snapshot_count", "emotion_snapshots_truncated", "emotion_snapshots_url"},
+    "summary": {"emotion_snapshot_count", "emotion_summary", "emotion_snapshots_url"},
+}
+
+
+def parse_list_param(value: Optional[str], allowed: Iterable[str], name: str) -> Optional[Set[str]]:
+    """
+    Parse a comma-separated query parameter.
+
+    Raises:
+        ValueError: if a value is not one of allowed
+    """
+    if value is None:
+        return None
+    items = {item.strip() for item in value.split(",") if item.strip()}
+    unknown = items - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+    return items
+
+
+def summarize_snapshots(db: Session, session_id: int, count: int, points: int = SESSION_DETAIL_SUMMARY_POINTS) -> List[EmotionSummaryPoint]:
+    """
+    Downsample a session's snapshots into at most `points` consecutive slices.
+
+    Only the metric columns are streamed in batches, so memory stays bounded
+    by the number of slices rather than the number of snapshots.
+    """
+    if count <= 0 or points <= 0:
+        return []
+    per_slice = -(-count // points)
+    rows = db.query(
+        EmotionSnapshot.timestamp, EmotionSnapshot.attention_level, EmotionSnapshot.positivity_level,
+        EmotionSnapshot.arousal_level, EmotionSnapshot.dominant_emotion, EmotionSnapshot.face_detected
+    ).filter(
+        EmotionSnapshot.session_id == session_id
+    ).order_by(EmotionSnapshot.id).yield_per(SESSION_DETAIL_STREAM_BATCH)
+
+    summary: List[EmotionSummaryPoint] = []
+    current = None
+    for index, row in enumerate(rows):
+        if index % per_slice == 0:
+            if current is not None:
+                summary.append(_finish_slice(current))
+            current = {"start": row.timestamp, "end": row.timestamp, "n": 0, "faces": 0, "emotions": Counter(),
+                       "sums": [0.0, 0.0, 0.0], "counts": [0, 0, 0]}
+        current["end"] = row.timestamp
+        current["n"] += 1
+        current["faces"] += 1 if row.face_detected else 0
+        if row.dominant_emotion:
+            current["emotions"][row.dominant_emotion] += 1
+        for i, value in enumerate((row.attention_level, row.positivity_level, row.arousal_level)):
+            if value is not None:
+                current["sums"][i] += value
+                current["counts"][i] += 1
+    if current is not None:
+        summary.append(_finish_slice(current))
+    return summary
+
+
+def _finish_slice(current) -> EmotionSummaryPoint:
+    averages = [s / c if c else None for s, c in zip(current["sums"], current["counts"])]
+    return EmotionSummaryPoint(
+        start_time=current["start"],
+        end_time=current["end"],
+        snapshots=current["n"],
+        attention_level=averages[0],
+        positivity_level=averages[1],
+        arousal_level=averages[2],
+        dominant_emotion=current["emotions"].most_common(1)[0][0] if current["emotions"] else None,
+        face_detected_ratio=current["faces"] / current["n"],
+    )
+
+
+def _decode_results(results: Dict[str, bytes], blob_hash: str):
+    data = results.get(blob_hash)
+    return json.loads(data) if data is not None else None
+
+
+def load_session_detail(
+    db: Session,
+    session_id: int,
+    include: Iterable[str] = DEFAULT_SESSION_INCLUDES,
+    snapshot_limit: int = SESSION_DETAIL_MAX_SNAPSHOTS,
+) -> Optional[InterviewSessionDetail]:
+    """
+    Load a session with the requested relations using a fixed number of queries.
+
+    Session questions are eager-loaded with selectinload and their test
+    result blobs fetched in one batch. Snapshots are never loaded through the
+    relationship: at most snapshot_limit of the most recent ones are embedded
+    (oldest first), with the total count and a link to the paginated
+    snapshots endpoint when there are more.
+    """
+    include = set(include)
+    query = db.query(InterviewSession).filter(InterviewSession.id == session_id)
+    if "questions" in include:
+        query = query.options(selectinload(InterviewSession.session_questions))
+    session = query.first()
+    if session is None:
+        return None
+
+    detail = {name: getattr(session, name) for name in SESSION_FIELDS}
+    if "questions" in include:
+        questions = sorted(session.session_questions, key=lambda q: (q.order_index or 0, q.id))
+        # Resolve all test result blobs at once rather than through each row's test_results property
+        results = blob_store.get_many(db, (q.test_results_hash for q in questions))
+        detail["session_questions"] = [
+            SessionQuestionSchema.model_validate({
+                **{name: getattr(q, name) for name in SESSION_QUESTION_FIELDS},
+                "test_results": _decode_results(results, q.test_results_hash) if q.test_results_hash else q.test_results_inline,
+            })
+            for q in questions
+        ]
+
+    if include & {"snapshots", "summary"}:
+        count = db.query(func.count(EmotionSnapshot.id)).filter(EmotionSnapshot.session_id == session_id).scalar() or 0
+        detail["emotion_snapshot_count"] = count
+        detail["emotion_snapshots_url"] = f"/sessions/{session_id}/emotions/"
+        if "snapshots" in include:
+            limit = max(0, min(snapshot_limit, SESSION_DETAIL_MAX_SNAPSHOTS))
+            recent = db.query(EmotionSnapshot).filter(
+                EmotionSnapshot.session_id == session_id
+            ).order_by(EmotionSnapshot.id.desc()).limit(limit).all() if limit else []
+            detail["emotion_snapshots"] = [EmotionSnapshotSchema.model_validate(s, from_attributes=True) for s in reversed(recent)]
+            detail["emotion_snapshots_truncated"] = count > len(recent)
+        if "summary" in include:
+            detail["emotion_summary"] = summarize_snapshots(db, session_id, count)
+
+    return InterviewSessionDetail(**detail)
+
+
+def dump_session_detail(detail: InterviewSessionDetail, include: Iterable[str], fields: Optional[Set[str]] = None) -> bytes:
+    """Serialize the requested session fields (all when fields is None) and the keys of each include."""
+    keys = set(fields) | {"id"} if fields else set(SESSION_FIELDS)
+    for name in include:
+        keys |= _INCLUDE_KEYS[name]
+    return detail.model_dump_json(include=keys)
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# Configure the app for a throwaway SQLite database before any backend module is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["MOCK_MODE"] = "true"
+os.environ["QUESTION_POOL_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database import engine
+from models import Base
+
+
+@pytest.fixture(scope="session", autouse=True)
+def create_tables():
+    """Tests that do not import main still need the tables it creates on import."""
+    Base.metadata.create_all(bind=engine)
@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import pytest
+
+import edit_timeline
+from database import SessionLocal
+from edit_timeline import (
+    EditTimeline, apply_edit, chunk_edits, decode_edits, decode_varint, encode_edit, encode_varint, seek,
+    timeline_chunks,
+)
+from models import EditTimelineSegment
+
+_next_id = iter(range(1000, 1000000))
+
+
+def patch(start, end, text):
+    return SimpleNamespace(start=start, end=end, text=text)
+
+
+def type_text(timeline, sqid, code, text, revision, at_ms, step_ms=10):
+    """Record text typed one character at a time at the end of code; returns the code, revision and time after it."""
+    for ch in text:
+        timeline.record(sqid, code, [patch(len(code), len(code), ch)], revision + 1, at_ms)
+        code += ch
+        revision += 1
+        at_ms += step_ms
+    return code, revision, at_ms
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def sqid():
+    """A session question id no other test records edits for."""
+    return next(_next_id)
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 16383, 16384, 2 ** 32, 2 ** 63 - 1])
+def test_varint_round_trip(value):
+    out = bytearray(b"\x07")
+    encode_varint(value, out)
+    decoded, pos = decode_varint(bytes(out), 1)
+    assert decoded == value
+    assert pos == len(out)
+
+
+def test_varint_lengths():
+    for value, length in ((0, 1), (127, 1), (128, 2), (16383, 2), (16384, 3)):
+        out = bytearray()
+        encode_varint(value, out)
+        assert len(out) == length
+
+
+def test_edit_stream_round_trip():
+    out = bytearray()
+    encode_edit(out, 0, 0, 0, "def f():")
+    encode_edit(out, 250, 8, 0, "\n    return 'é'")
+    encode_edit(out, 1000, 4, 1, "g")
+    edits = list(decode_edits(bytes(out), 5000))
+    assert edits == [(5000, 0, 0, "def f():"), (5250, 8, 0, "\n    return 'é'"), (6250, 4, 1, "g")]
+
+
+def test_persist_appends_one_segment_per_flush(db, sqid):
+    timeline = EditTimeline(enabled=True)
+    code, revision, at = type_text(timeline, sqid, "", "abc", 0, 1000)
+    timeline.persist(db, sqid)
+    code, revision, at = type_text(timeline, sqid, code, "de", revision, at)
+    timeline.persist(db, sqid)
+    timeline.persist(db, sqid)  # nothing new: no empty segment
+
+    [chunk] = timeline_chunks(db, sqid)
+    segments = db.query(EditTimelineSegment).filter(EditTimelineSegment.chunk_id == chunk.id).order_by(EditTimelineSegment.end_op).all()
+    assert [s.end_op for s in segments] == [3, 5]
+    assert chunk.op_count == 5
+    # Each segment holds only the edits recorded since the previous flush
+    assert [text for _, _, _, text in decode_edits(segments[1].ops, 0)] == ["d", "e"]
+
+    rebuilt = ""
+    for _, start, deleted, text in chunk_edits(db, chunk):
+        rebuilt = apply_edit(rebuilt, start, deleted, text)
+    assert rebuilt == code == "abcde"
+
+
+def test_seek_at_chunk_boundaries(db, sqid, monkeypatch):
+    monkeypatch.setattr(edit_timeline, "TIMELINE_CHUNK_OPS", 3)
+    timeline = EditTimeline(enabled=True)
+    code, revision, at = type_text(timeline, sqid, "", "abcdefg", 0, 1000, step_ms=100)
+    timeline.persist(db, sqid)
+
+    chunks = timeline_chunks(db, sqid)
+    assert [(c.seq, c.start_ms, c.op_count) for c in chunks] == [(1, 1000, 3), (2, 1300, 3), (3, 1600, 1)]
+
+    # Exactly at the start of the second chunk: its snapshot with its first edit applied
+    result = seek(db, sqid, 1300)
+    assert (result["chunk"], result["code"], result["edits_applied"]) == (2, "abcd", 1)
+    # Just before it: the end of the first chunk
+    result = seek(db, sqid, 1299)
+    assert (result["chunk"], result["code"], result["edits_applied"]) == (1, "abc", 3)
+    # Before anything was recorded
+    assert seek(db, sqid, 999) is None
+    # Latest code
+    assert seek(db, sqid)["code"] == code == "abcdefg"
+
+
+def test_seek_events_span_chunks(db, sqid, monkeypatch):
+    monkeypatch.setattr(edit_timeline, "TIMELINE_CHUNK_OPS", 3)
+    timeline = EditTimeline(enabled=True)
+    code, revision, at = type_text(timeline, sqid, "", "abcde", 0, 1000, step_ms=100)
+    # A full replacement starts a chunk from a snapshot
+    timeline.reset(sqid, "xyz", revision + 1, at)
+    type_text(timeline, sqid, "xyz", "!", revision + 1, at + 100)
+    timeline.persist(db, sqid)
+
+    result = seek(db, sqid, 1150, events=10)
+    assert result["code"] == "ab"
+    assert result["events"] == [
+        {"at_ms": 1200, "start": 2, "deleted": 0, "text": "c"},
+        {"at_ms": 1300, "start": 3, "deleted": 0, "text": "d"},
+        {"at_ms": 1400, "start": 4, "deleted": 0, "text": "e"},
+        {"at_ms": 1500, "snapshot": "xyz"},
+        {"at_ms": 1600, "start": 3, "deleted": 0, "text": "!"},
+    ]
+
+    # The number of events is capped across chunks
+    assert len(seek(db, sqid, 1150, events=2)["events"]) == 2
@@ -0,0 +1,121 @@
+import pytest
+
+import main
+from execution_scheduler import ExecutionScheduler, SchedulerRejected
+
+
+def make_scheduler(**kwargs):
+    options = {"max_concurrent": 1, "session_inflight": 1, "session_queue": 10, "max_queue": 100, "queue_timeout": 5}
+    options.update(kwargs)
+    return ExecutionScheduler(**options)
+
+
+def drain(scheduler, running, waiting):
+    """Release running tickets one at a time and return the waiting tickets in the order they were granted."""
+    order = []
+    while waiting:
+        scheduler.release(running)
+        [running] = [t for t in waiting if t.granted]
+        waiting.remove(running)
+        order.append(running)
+    return order
+
+
+def test_new_session_goes_before_a_flooding_session():
+    scheduler = make_scheduler()
+    blocker = scheduler.enqueue("blocker")
+    assert blocker.granted
+
+    flood = [scheduler.enqueue("flood", cost=5) for _ in range(4)]
+    newcomer = scheduler.enqueue("newcomer", cost=5)
+    assert not any(t.granted for t in flood + [newcomer])
+
+    order = drain(scheduler, blocker, flood + [newcomer])
+    # Only the flood's first evaluation was tagged before the newcomer's
+    assert order == [flood[0], newcomer] + flood[1:]
+
+
+def test_submit_is_dispatched_before_run():
+    scheduler = make_scheduler()
+    blocker = scheduler.enqueue("blocker")
+    runs = [scheduler.enqueue(f"run-{i}", priority="run") for i in range(2)]
+    submit = scheduler.enqueue("late", priority="submit", cost=10)
+    assert submit.queued_position == 1
+
+    assert drain(scheduler, blocker, runs + [submit]) == [submit] + runs
+
+
+def test_session_inflight_limit_leaves_a_free_slot_to_others():
+    scheduler = make_scheduler(max_concurrent=2)
+    first = scheduler.enqueue("a")
+    second = scheduler.enqueue("a")
+    other = scheduler.enqueue("b")
+    assert first.granted and not second.granted and other.granted
+
+    scheduler.release(first)
+    assert second.granted
+
+
+def test_session_queue_limit_is_429_per_priority():
+    scheduler = make_scheduler(session_queue=2)
+    scheduler.enqueue("a")
+    scheduler.enqueue("a")
+    scheduler.enqueue("a")
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.enqueue("a")
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    # A backlog of runs never turns away the final submission
+    assert not scheduler.enqueue("a", priority="submit").granted
+
+
+def test_full_queue_is_503():
+    scheduler = make_scheduler(max_queue=2)
+    scheduler.enqueue("a")
+    scheduler.enqueue("b")
+    scheduler.enqueue("c")
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.enqueue("d")
+    assert rejected.value.status_code == 503
+    assert rejected.value.retry_after >= 1
+    assert scheduler.status()["rejected"] == 1
+
+
+def test_wait_timeout_is_503():
+    scheduler = make_scheduler()
+    scheduler.enqueue("a")
+    waiting = scheduler.enqueue("b")
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.wait(waiting, timeout=0.01)
+    assert rejected.value.status_code == 503
+    scheduler.release(waiting)
+    assert scheduler.status()["waiting"] == 0
+
+
+def test_rejection_maps_to_retry_after_header():
+    error = main.scheduler_http_error(SchedulerRejected("busy", 429, 7))
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "7"}
+
+
+def test_release_of_waiting_ticket_restores_finish_tag():
+    scheduler = make_scheduler()
+    running = scheduler.enqueue("a", cost=2)
+    waiting = scheduler.enqueue("a", cost=3)
+    assert waiting.start_tag == 2
+
+    scheduler.release(waiting)
+    assert scheduler._sessions["a"].finish_tag == 2
+    assert scheduler.enqueue("a").start_tag == 2
+    scheduler.release(running)
+
+
+def test_release_keeps_finish_tag_behind_later_tickets():
+    scheduler = make_scheduler()
+    scheduler.enqueue("a", cost=2)
+    withdrawn = scheduler.enqueue("a", cost=3)
+    later = scheduler.enqueue("a", cost=1)
+    assert later.start_tag == 5
+
+    scheduler.release(withdrawn)
+    assert scheduler._sessions["a"].finish_tag == 6
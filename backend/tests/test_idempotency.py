@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from idempotency import IdempotencyMiddleware, IdempotencyStore, SingleFlight
+
+
+def make_app():
+    app = FastAPI()
+    calls = {"count": 0}
+
+    @app.post("/items")
+    async def create_item(payload: dict):
+        calls["count"] += 1
+        return {"call": calls["count"], "payload": payload}
+
+    @app.post("/slow")
+    async def slow():
+        calls["count"] += 1
+        await asyncio.sleep(0.3)
+        return {"call": calls["count"]}
+
+    @app.post("/status/{status_code}")
+    async def fixed_status(status_code: int):
+        calls["count"] += 1
+        return JSONResponse({"call": calls["count"]}, status_code=status_code)
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(), enabled=True)
+    return app, calls
+
+
+@pytest.fixture
+def client_and_calls():
+    app, calls = make_app()
+    with TestClient(app) as client:
+        yield client, calls
+
+
+def key():
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+def test_retry_is_replayed(client_and_calls):
+    client, calls = client_and_calls
+    headers = key()
+    first = client.post("/items", json={"name": "a"}, headers=headers)
+    retry = client.post("/items", json={"name": "a"}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() == {"call": 1, "payload": {"name": "a"}}
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert calls["count"] == 1
+
+
+def test_key_reused_with_different_body_is_422(client_and_calls):
+    client, calls = client_and_calls
+    headers = key()
+    client.post("/items", json={"name": "a"}, headers=headers)
+    reused = client.post("/items", json={"name": "b"}, headers=headers)
+
+    assert reused.status_code == 422
+    assert calls["count"] == 1
+
+
+def test_requests_without_key_always_run(client_and_calls):
+    client, calls = client_and_calls
+    client.post("/items", json={})
+    client.post("/items", json={})
+    assert calls["count"] == 2
+
+
+@pytest.mark.parametrize("status_code", [500, 503, 429])
+def test_claim_is_released_on_server_error_and_rate_limit(client_and_calls, status_code):
+    client, calls = client_and_calls
+    headers = key()
+    first = client.post(f"/status/{status_code}", headers=headers)
+    retry = client.post(f"/status/{status_code}", headers=headers)
+
+    assert first.status_code == retry.status_code == status_code
+    assert "idempotent-replayed" not in retry.headers
+    assert retry.json() == {"call": 2}
+    assert calls["count"] == 2
+
+
+def test_client_error_is_replayed(client_and_calls):
+    client, calls = client_and_calls
+    headers = key()
+    client.post("/status/404", headers=headers)
+    retry = client.post("/status/404", headers=headers)
+
+    assert retry.status_code == 404
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert calls["count"] == 1
+
+
+def test_concurrent_requests_share_one_execution(client_and_calls):
+    client, calls = client_and_calls
+    headers = key()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = list(pool.map(lambda _: client.post("/slow", headers=headers), range(3)))
+
+    assert calls["count"] == 1
+    assert [r.json() for r in responses] == [{"call": 1}] * 3
+    assert sorted(r.headers.get("idempotent-replayed", "false") for r in responses) == ["false", "true", "true"]
+
+
+def test_single_flight_shares_result():
+    flights = SingleFlight()
+    started, finish = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", work)
+        started.wait(5)
+        follower = pool.submit(flights.do, "k", work)
+        _wait_for(lambda: flights.stats["shared"] == 1)
+        finish.set()
+        assert leader.result(5) == follower.result(5) == "result"
+    assert len(calls) == 1
+
+
+def test_single_flight_reraises_leader_exception_to_followers():
+    flights = SingleFlight()
+    started, finish = threading.Event(), threading.Event()
+    error = ValueError("judge0 unavailable")
+
+    def work():
+        started.set()
+        finish.wait(5)
+        raise error
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", work)
+        started.wait(5)
+        follower = pool.submit(flights.do, "k", lambda: "not called")
+        _wait_for(lambda: flights.stats["shared"] == 1)
+        finish.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError) as raised:
+                future.result(5)
+            assert raised.value is error
+
+    # Nothing is cached once the call finished
+    assert flights.do("k", lambda: "again") == "again"
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+
+import main
+from blob_store import blob_store
+from database import SessionLocal
+from models import SessionQuestion
+
+
+def test_session_detail_with_question_and_snapshot():
+    with TestClient(main.app) as client:
+        question = client.post("/questions/", json={"difficulty": "easy"})
+        assert question.status_code == 200
+        session = client.post("/sessions/", json={"session_name": "detail"})
+        assert session.status_code == 200
+        session_id = session.json()["id"]
+
+        added = client.post(f"/sessions/{session_id}/questions/", json={
+            "question_id": question.json()["id"], "order_index": 0
+        })
+        assert added.status_code == 200
+        snapshot = client.post(f"/sessions/{session_id}/emotions/", json={
+            "attention_level": 0.5, "positivity_level": 0.6, "arousal_level": 0.4,
+            "dominant_emotion": "neutral", "question_id": question.json()["id"]
+        })
+        assert snapshot.status_code == 200
+
+        response = client.get(f"/sessions/{session_id}")
+        assert response.status_code == 200
+        detail = response.json()
+        assert [q["id"] for q in detail["session_questions"]] == [added.json()["id"]]
+        assert [s["id"] for s in detail["emotion_snapshots"]] == [snapshot.json()["id"]]
+        assert detail["emotion_snapshot_count"] == 1
+        assert detail["emotion_snapshots_truncated"] is False
+
+
+def test_session_detail_resolves_stored_test_results():
+    with TestClient(main.app) as client:
+        question = client.post("/questions/", json={"difficulty": "easy"}).json()
+        session_id = client.post("/sessions/", json={"session_name": "results"}).json()["id"]
+        first = client.post(f"/sessions/{session_id}/questions/", json={"question_id": question["id"], "order_index": 0}).json()
+        second = client.post(f"/sessions/{session_id}/questions/", json={"question_id": question["id"], "order_index": 1}).json()
+
+        db = SessionLocal()
+        try:
+            db.get(SessionQuestion, first["id"]).test_results_hash = blob_store.put_json(db, {"passed": 2})
+            db.get(SessionQuestion, second["id"]).test_results_hash = "0" * 64  # blob that is missing
+            db.commit()
+        finally:
+            db.close()
+
+        response = client.get(f"/sessions/{session_id}", params={"include": "questions"})
+        assert response.status_code == 200
+        results = [q["test_results"] for q in response.json()["session_questions"]]
+        assert results == [{"passed": 2}, None]